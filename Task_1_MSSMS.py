@@ -1,20 +1,33 @@
-import json
+import functools
+import itertools
 import logging
-from lxml import etree
+import time
 import os
-import configparser
+from catalog import QueryCatalog
+from json_stream import batched, iter_json_records
+from sharding import load_shards, log_shards
+from incremental import HASH_TABLE, ROOM_COLUMNS, STUDENT_COLUMNS, SUMMARY_KEYS, RowDiff
+from reports import default_jobs, run_reports
+from pool import ConnectionPool, PoolTimeoutError
+from metrics import Metrics, TimedIterator
+from records import Quarantine, RecordDecoder
+from exporters import (EXPORTERS, FETCH_SIZE, JSON_FORMATS, export_batches, fetch_batches, get_exporter,
+                       output_variant)
 import pyodbc
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 global connected
 connected = True
+
+
 class MyDatabase:
     """Class to interact with a SQL database"""
 
-    def __init__(self, port, server, database, username, password):
+    def __init__(self, port, server, database, username, password, pool_min_size=1, pool_max_size=5, cache=None,
+                 metrics=None, quarantine_file=None):
         """
-        Initialize the database connection.
+        Initialize the connection pool and the main database connection.
 
         Args:
             port (str): Port number.
@@ -22,37 +35,98 @@ class MyDatabase:
             database (str): Database name.
             username (str): Username.
             password (str): Password.
+            pool_min_size (int): Number of connections kept open in the pool.
+            pool_max_size (int): Maximum number of connections open at the same time.
+            cache (ResultCache): Result cache for reports, None to always query the database.
+            metrics (Metrics): Collector of per-phase timings, a new one by default.
+            quarantine_file (str): NDJSON file collecting the records rejected by loads, None to only log them.
         """
         self.port = port
         self.server = server
         self.database = database
         self.username = username
         self.password = password
+        self.cache = cache
+        self.metrics = metrics or Metrics()
+        self.catalog = QueryCatalog('mssql')
+        self.quarantine_file = quarantine_file
+        self.cache_scope = f'mssql://{server}:{port}/{database}'
         try:
+            self.pool = ConnectionPool(self.open_connection, pool_min_size, pool_max_size)
             self.conn = self.connect()
         except:
+            global connected
+            connected = False
             logger.critical("Ошибка при подключении к серверу базы данных")
 
+    def open_connection(self):
+        """
+        Open a new connection to the database, used by the pool.
+
+        Returns:
+            pyodbc.Connection: Database connection object.
+        """
+        conn_str = f'DRIVER={{SQL Server}};PORT={self.port};SERVER={self.server};DATABASE={self.database};UID={self.username};PWD={self.password};'
+        return pyodbc.connect(conn_str)
+
     def connect(self):
         """
-        Connect to the database.
+        Take a connection to the database from the pool.
 
         Returns:
             pyodbc.Connection or None: Database connection object or None if connection failed.
         """
         try:
-            conn_str = f'DRIVER={{SQL Server}};PORT={self.port};SERVER={self.server};DATABASE={self.database};UID={self.username};PWD={self.password};'
-            conn = pyodbc.connect(conn_str)
+            conn = self.pool.checkout()
             logger.info("Успешное подключение к базе данных")
             return conn
-        except pyodbc.Error as e:
+        except (pyodbc.Error, PoolTimeoutError) as e:
             global connected
             connected = False
             logger.critical(f"Ошибка при подключении к базе данных: {e}")
         return None
 
-    def create_tables(self):
-        """Create necessary tables if they don't exist."""
+    def cache_key(self, sql, output_format):
+        """
+        Build the result cache key of a report for the current data version.
+
+        Args:
+            sql (str): SQL text of the report.
+            output_format (str): Output format of the report.
+
+        Returns:
+            str or None: Cache key, None if the result cache is disabled.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.key(sql, self.cache_scope, output_format, self.cache.data_version(self.cache_scope))
+
+    def bump_data_version(self):
+        """Invalidate cached reports after the data was changed by a load."""
+        if self.cache is not None:
+            self.cache.bump_version(self.cache_scope)
+
+    def record_decoder(self):
+        """
+        Create the decoder of one load.
+
+        Returns:
+            RecordDecoder: Decoder putting rejected records into quarantine_file.
+        """
+        return RecordDecoder(Quarantine(self.quarantine_file))
+
+    def create_tables(self, summary=False):
+        """
+        Create necessary tables if they don't exist.
+
+        Also creates the index on students.room used by the report joins and,
+        if summary is set, the room_summary table with per-room aggregates
+        (student count, min/max/sum of birth years, number of distinct sexes)
+        that every load refreshes.
+
+        Args:
+            summary (bool): Create the room_summary table.
+        """
         cursor = self.conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'rooms'")
         if cursor.fetchone()[0] == 0:
@@ -73,18 +147,98 @@ class MyDatabase:
             logger.info('Таблица Students создана!')
         else:
             print('Таблицы "Students" already exists!')
+        cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = ?", HASH_TABLE)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f'''CREATE TABLE {HASH_TABLE}
+                            (table_name VARCHAR(64),
+                            id INT,
+                            hash BIGINT,
+                            PRIMARY KEY(table_name, id))''')
+            logger.info(f'Таблица {HASH_TABLE} создана!')
+        cursor.execute("SELECT COUNT(*) FROM sys.indexes WHERE name = 'students_room_idx'")
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("CREATE INDEX students_room_idx ON students (room) INCLUDE (birthday, sex)")
+        if summary:
+            cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'room_summary'")
+            if cursor.fetchone()[0] == 0:
+                cursor.execute('''CREATE TABLE room_summary
+                                (room_id INT PRIMARY KEY,
+                                name VARCHAR(255),
+                                student_count INT,
+                                min_birth_year INT,
+                                max_birth_year INT,
+                                sum_birth_year BIGINT,
+                                sex_count INT)''')
+                logger.info('Таблица room_summary создана!')
+            self.refresh_room_summary(cursor)
         cursor.commit()
 
-    def load_data_from_json(self, rooms_file, students_file) -> int:
+    def refresh_room_summary(self, cursor, rooms=None):
+        """
+        Rebuild the room_summary table from rooms and students if it exists.
+
+        Called by every loader inside its transaction, so the summary always
+        matches the loaded data. The incremental load passes the rooms it
+        touched; they are staged in a temporary table and only their rows
+        are recomputed.
+
+        Args:
+            cursor: Cursor object for executing SQL commands.
+            rooms (set): Ids of the rooms whose summary changed, None to rebuild the whole table.
+
+        Returns:
+            bool: True if the summary was refreshed, False if the table does not exist.
+        """
+        cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'room_summary'")
+        if cursor.fetchone()[0] == 0:
+            return False
+        stage = '#summary_rooms'
+        if rooms is None:
+            condition = ''
+            cursor.execute("DELETE FROM room_summary")
+        elif rooms:
+            condition = f'WHERE r.id IN (SELECT id FROM {stage})'
+            cursor.execute(f"CREATE TABLE {stage} (id INT PRIMARY KEY)")
+            self.insert_rows(cursor, stage, ('id',), ((room,) for room in rooms))
+            cursor.execute(f"DELETE FROM room_summary WHERE room_id IN (SELECT id FROM {stage})")
+        else:
+            logger.info('Таблица room_summary не изменилась')
+            return True
+        cursor.execute(f'''INSERT INTO room_summary
+                            (room_id, name, student_count, min_birth_year, max_birth_year, sum_birth_year, sex_count)
+                          SELECT r.id, r.name, COUNT(s.id),
+                                 MIN(YEAR(s.birthday)),
+                                 MAX(YEAR(s.birthday)),
+                                 SUM(CAST(YEAR(s.birthday) AS BIGINT)),
+                                 COUNT(DISTINCT s.sex)
+                          FROM rooms r LEFT JOIN students s ON r.id = s.room
+                          {condition}
+                          GROUP BY r.id, r.name''')
+        if rooms is None:
+            logger.info('Таблица room_summary обновлена!')
+        else:
+            cursor.execute(f"DROP TABLE {stage}")
+            logger.info(f'Таблица room_summary обновлена для комнат: {len(rooms)}')
+        return True
+
+    def load_data_from_json(self, rooms_file, students_file, bulk=False, batch_size=10000,
+                            incremental=False, delete_missing=False, workers=1, shard_by='hash', swap=False) -> int:
         """
         Load data from JSON files into the database.
 
         Args:
-            rooms_file (str): Path to the JSON file containing rooms data.
-            students_file (str): Path to the JSON file containing students data.
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            bulk (bool): Send batched parameterized inserts with fast_executemany instead of one INSERT per row.
+            batch_size (int): Number of rows sent to the server per batch in bulk or incremental mode.
+            incremental (bool): Apply only new and changed rows, see incremental_load_data_from_json.
+            delete_missing (bool): In incremental mode, delete rows that are not in the files.
+            workers (int): Load students over this many connections in parallel, see parallel_load_data_from_json.
+            shard_by (str): 'hash' or 'range', how students are split between the workers.
+            swap (bool): Fill staging tables and swap them with the live ones, see swap_load_data_from_json.
 
         Returns:
-            int: 0 if data loaded successfully, 1 if any file is not found.
+            int: 0 if data loaded successfully, 1 if any file is not found or the load was rolled back.
         """
         check_wrong_ways = 0
         if not os.path.isfile(rooms_file):
@@ -95,69 +249,579 @@ class MyDatabase:
             check_wrong_ways = 1
         if check_wrong_ways == 1:
             return check_wrong_ways
+        if incremental:
+            return self.incremental_load_data_from_json(rooms_file, students_file, delete_missing, batch_size)
+        if swap:
+            return self.swap_load_data_from_json(rooms_file, students_file, batch_size)
+        if workers > 1:
+            return self.parallel_load_data_from_json(rooms_file, students_file, workers, shard_by, batch_size)
+        if bulk:
+            return self.bulk_load_data_from_json(rooms_file, students_file, batch_size)
+        decoder = self.record_decoder()
         cursor = self.conn.cursor()
         try:
-            with open(rooms_file, 'r') as file:
-                rooms_data = json.load(file)
-                for room in rooms_data:
-                    cursor.execute("INSERT INTO rooms (id, name) VALUES (?, ?)", (room['id'], room['name']))
-                logger.info('Данные по комнатам занесены!')
-
-            with open(students_file, 'r') as file:
-                students_data = json.load(file)
-                for student in students_data:
-                    birthday = student['birthday'][:10]
-                    cursor.execute("INSERT INTO Students (id, name, birthday, room, sex) VALUES (?, ?, ?, ?, ?)",
-                                   (student['id'], student['name'], birthday, student['room'], student['sex']))
-                logger.info('Данные по студентам занесены!')
+            rooms = TimedIterator(decoder.rooms(iter_json_records(rooms_file)))
+            started = time.perf_counter()
+            for room in rooms:
+                cursor.execute("INSERT INTO rooms (id, name) VALUES (?, ?)", room)
+            self.metrics.record_load('rooms', rooms, time.perf_counter() - started)
+            logger.info('Данные по комнатам занесены!')
+
+            students = TimedIterator(decoder.students(iter_json_records(students_file)))
+            started = time.perf_counter()
+            for student in students:
+                cursor.execute("INSERT INTO Students (id, name, birthday, room, sex) VALUES (?, ?, ?, ?, ?)", student)
+            self.metrics.record_load('students', students, time.perf_counter() - started)
+            logger.info('Данные по студентам занесены!')
+            self.refresh_room_summary(cursor)
         except pyodbc.Error as e:
             logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
-        cursor.commit()
+            cursor.rollback()
+            return 1
+        with self.metrics.phase('commit', 'load'):
+            cursor.commit()
+        self.bump_data_version()
+        return 0
+
+    def bulk_load_data_from_json(self, rooms_file, students_file, batch_size=10000) -> int:
+        """
+        Load data from JSON files into the database with batched fast_executemany inserts.
+
+        Rows are bound as parameter arrays of batch_size rows, so the whole load
+        takes one round trip per batch instead of one per row.
+
+        Args:
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            batch_size (int): Number of rows sent to the server per batch.
+
+        Returns:
+            int: 0 if data loaded successfully, 1 if loading failed.
+        """
+        decoder = self.record_decoder()
+        cursor = self.conn.cursor()
+        cursor.fast_executemany = True
+        try:
+            rooms = decoder.rooms(iter_json_records(rooms_file))
+            self.insert_rows(cursor, 'rooms', ROOM_COLUMNS, rooms, batch_size)
+            logger.info('Данные по комнатам занесены!')
+            students = decoder.students(iter_json_records(students_file))
+            self.insert_rows(cursor, 'students', STUDENT_COLUMNS, students, batch_size)
+            logger.info('Данные по студентам занесены!')
+            self.refresh_room_summary(cursor)
+        except pyodbc.Error as e:
+            logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
+            cursor.rollback()
+            return 1
+        with self.metrics.phase('commit', 'load'):
+            cursor.commit()
+        self.bump_data_version()
+        return 0
+
+    def swap_load_data_from_json(self, rooms_file, students_file, batch_size=10000, lock_timeout=5000) -> int:
+        """
+        Load data into staging tables and swap them with rooms and students in one transaction.
+
+        The staging heaps have no keys while fast_executemany fills them. Then
+        the primary keys, the report index and the foreign key are built and
+        checked once for the whole table. The last transaction drops the live
+        tables and renames the staging ones in their place with sp_rename.
+        Reports read the old data until that commit, and a failed load leaves
+        the live tables untouched.
+
+        Args:
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            batch_size (int): Number of rows sent to the server per batch.
+            lock_timeout (int): Maximum wait in milliseconds for the locks of the swap.
+
+        Returns:
+            int: 0 if data loaded and swapped, 1 if loading or the swap failed.
+        """
+        decoder = self.record_decoder()
+        cursor = self.conn.cursor()
+        cursor.fast_executemany = True
+        try:
+            cursor.execute("DROP TABLE IF EXISTS students_staging, rooms_staging")
+            cursor.execute('''CREATE TABLE rooms_staging
+                            (id INT NOT NULL,
+                            name VARCHAR(255))''')
+            cursor.execute('''CREATE TABLE students_staging
+                            (id INT NOT NULL,
+                            name VARCHAR(255),
+                            birthday DATETIME,
+                            room INT,
+                            sex CHAR(1))''')
+            rooms = decoder.rooms(iter_json_records(rooms_file))
+            self.insert_rows(cursor, 'rooms_staging', ROOM_COLUMNS, rooms, batch_size)
+            logger.info('Данные по комнатам занесены!')
+            students = decoder.students(iter_json_records(students_file))
+            self.insert_rows(cursor, 'students_staging', STUDENT_COLUMNS, students, batch_size)
+            logger.info('Данные по студентам занесены!')
+            with self.metrics.phase('index', 'load'):
+                cursor.execute("ALTER TABLE rooms_staging ADD CONSTRAINT PK_rooms_staging PRIMARY KEY (id)")
+                cursor.execute("ALTER TABLE students_staging ADD CONSTRAINT PK_students_staging PRIMARY KEY (id)")
+                cursor.execute("CREATE INDEX students_staging_room_idx ON students_staging (room) INCLUDE (birthday, sex)")
+                cursor.execute('''ALTER TABLE students_staging WITH CHECK ADD CONSTRAINT FK_students_staging_room
+                                  FOREIGN KEY (room) REFERENCES rooms_staging (id)''')
+            cursor.commit()
+            logger.info('Промежуточные таблицы проиндексированы и проверены!')
+            with self.metrics.phase('swap', 'load'):
+                cursor.execute(f"SET LOCK_TIMEOUT {int(lock_timeout)}")
+                cursor.execute("DROP TABLE IF EXISTS students, rooms")
+                cursor.execute("EXEC sp_rename 'rooms_staging', 'rooms'")
+                cursor.execute("EXEC sp_rename 'students_staging', 'students'")
+                cursor.execute("EXEC sp_rename 'PK_rooms_staging', 'PK_rooms'")
+                cursor.execute("EXEC sp_rename 'PK_students_staging', 'PK_students'")
+                cursor.execute("EXEC sp_rename 'FK_students_staging_room', 'FK_students_room'")
+                cursor.execute("EXEC sp_rename 'students.students_staging_room_idx', 'students_room_idx', 'INDEX'")
+                cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = ?", HASH_TABLE)
+                if cursor.fetchone()[0]:
+                    cursor.execute(f"DELETE FROM {HASH_TABLE} WHERE table_name IN ('rooms', 'students')")
+                self.refresh_room_summary(cursor)
+            with self.metrics.phase('commit', 'load'):
+                cursor.commit()
+            cursor.execute("SET LOCK_TIMEOUT -1")
+        except pyodbc.Error as e:
+            logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
+            cursor.rollback()
+            try:
+                cursor.execute("SET LOCK_TIMEOUT -1")
+            except pyodbc.Error as reset_error:
+                logger.error(f"Не удалось сбросить LOCK_TIMEOUT: {reset_error}")
+            return 1
+        logger.info('Таблицы rooms и students заменены!')
+        self.bump_data_version()
+        return 0
+
+    def parallel_load_data_from_json(self, rooms_file, students_file, workers=4, shard_by='hash',
+                                     batch_size=10000) -> int:
+        """
+        Load data from JSON files with fast_executemany over several connections at once.
+
+        Rooms are inserted and committed first on the main connection, so the
+        foreign key of students is satisfied on every worker connection. Then
+        students are split into workers shards by id and each shard is
+        inserted and committed on its own pooled connection. A failed shard is
+        rolled back and reported without affecting the others. The pool needs
+        at least workers + 1 connections.
+
+        Args:
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            workers (int): Number of worker connections.
+            shard_by (str): 'hash' or 'range', see sharding.shard_function.
+            batch_size (int): Number of rows sent to the server per batch.
+
+        Returns:
+            int: 0 if every shard was loaded, 1 if rooms or any shard failed.
+        """
+        if workers >= self.pool.max_size:
+            raise ValueError(f"Для {workers} потоков нужен пул минимум из {workers + 1} соединений")
+        decoder = self.record_decoder()
+        cursor = self.conn.cursor()
+        cursor.fast_executemany = True
+        try:
+            rooms = decoder.rooms(iter_json_records(rooms_file))
+            self.insert_rows(cursor, 'rooms', ROOM_COLUMNS, rooms, batch_size)
+            cursor.commit()
+            logger.info('Данные по комнатам занесены!')
+        except pyodbc.Error as e:
+            logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
+            cursor.rollback()
+            return 1
+
+        def load_shard(shard, batches):
+            with self.pool.connection() as conn:
+                shard_cursor = conn.cursor()
+                shard_cursor.fast_executemany = True
+                count = self.insert_rows(shard_cursor, 'students', STUDENT_COLUMNS,
+                                         itertools.chain.from_iterable(batches), batch_size)
+                with self.metrics.phase('commit', f'students[{shard}]'):
+                    conn.commit()
+                return count
+
+        started = time.perf_counter()
+        students = decoder.students(iter_json_records(students_file))
+        try:
+            results = load_shards(students, workers, load_shard, shard_by, batch_size)
+        except ValueError as e:
+            logger.critical(f"Ошибка при чтении файла {students_file}: {e}")
+            return 1
+        finally:
+            self.bump_data_version()
+        log_shards('students', results, time.perf_counter() - started)
+        try:
+            self.refresh_room_summary(cursor)
+            cursor.commit()
+        except pyodbc.Error as e:
+            logger.critical(f"Ошибка при обновлении room_summary: {e}")
+            cursor.rollback()
+            return 1
+        return 1 if any(result.status for result in results) else 0
 
-    def execute_sql_query_json(self, input_file, output_file):
+    def incremental_load_data_from_json(self, rooms_file, students_file, delete_missing=False, batch_size=10000) -> int:
+        """
+        Apply only new and changed rooms and students to the database.
+
+        The content hash of every loaded row is kept in the row_hashes table.
+        Incoming rows whose hash did not change are skipped, the rest are
+        staged in a temporary table and applied with one MERGE per table.
+        Only the room_summary rows of the rooms that were written, deleted,
+        or that a written or deleted student left or joined are recomputed.
+
+        Args:
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            delete_missing (bool): Delete loaded rows that are not in the files, including rows
+                loaded in other modes, see load_row_hashes.
+            batch_size (int): Number of rows sent to the server per batch.
+
+        Returns:
+            int: 0 if data loaded successfully, 1 if loading failed.
+        """
+        decoder = self.record_decoder()
+        cursor = self.conn.cursor()
+        cursor.fast_executemany = True
+        touched = set()
+        try:
+            rooms = RowDiff(self.load_row_hashes(cursor, 'rooms'))
+            records = decoder.rooms(iter_json_records(rooms_file))
+            changed_rooms = self.upsert_rows(cursor, 'rooms', ROOM_COLUMNS, rooms.changed(records), batch_size,
+                                             touched=touched)
+            self.save_row_hashes(cursor, 'rooms', rooms.hashes, batch_size)
+            students = RowDiff(self.load_row_hashes(cursor, 'students'))
+            records = decoder.students(iter_json_records(students_file))
+            changed_students = self.upsert_rows(cursor, 'students', STUDENT_COLUMNS, students.changed(records),
+                                                batch_size, touched=touched)
+            self.save_row_hashes(cursor, 'students', students.hashes, batch_size)
+            logger.info(f"Новых или измененных комнат: {changed_rooms}, студентов: {changed_students}")
+            if delete_missing:
+                rejected = decoder.quarantine.ids
+                deleted_students = self.delete_rows(cursor, 'students', students.missing(rejected['students']),
+                                                    batch_size, touched)
+                deleted_rooms = self.delete_rows(cursor, 'rooms', rooms.missing(rejected['rooms']), batch_size,
+                                                 touched)
+                logger.info(f"Удалено комнат: {deleted_rooms}, студентов: {deleted_students}")
+            self.refresh_room_summary(cursor, touched)
+        except pyodbc.Error as e:
+            logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
+            cursor.rollback()
+            return 1
+        with self.metrics.phase('commit', 'load'):
+            cursor.commit()
+        self.bump_data_version()
+        return 0
+
+    def load_row_hashes(self, cursor, table):
+        """
+        Read the content hashes of the loaded rows of a table.
+
+        Every row of the table is listed, so rows written by the row, bulk or
+        parallel modes, which keep no hashes, are known to the incremental
+        load too: their hash is None, they are rewritten once and
+        delete_missing deletes them if they are not in the input.
+
+        Args:
+            cursor: Cursor object for executing SQL commands.
+            table (str): Table name.
+
+        Returns:
+            dict: Hash by row id, None for rows without a hash.
+        """
+        cursor.execute(f"SELECT t.id, h.hash FROM {table} t LEFT JOIN {HASH_TABLE} h "
+                       f"ON h.table_name = ? AND h.id = t.id", table)
+        return {row_id: digest for row_id, digest in cursor.fetchall()}
+
+    def save_row_hashes(self, cursor, table, hashes, batch_size=10000):
+        """
+        Store the content hashes of written rows.
+
+        Args:
+            cursor: Cursor object with fast_executemany enabled.
+            table (str): Table the rows were written to.
+            hashes (list): (id, hash) tuples.
+            batch_size (int): Number of rows sent to the server per batch.
+        """
+        rows = ((table, row_id, digest) for row_id, digest in hashes)
+        self.upsert_rows(cursor, HASH_TABLE, ('table_name', 'id', 'hash'), rows, batch_size, key=('table_name', 'id'))
+
+    def upsert_rows(self, cursor, table, columns, rows, batch_size=10000, key=('id',), touched=None) -> int:
+        """
+        Insert rows or update the existing ones with MERGE.
+
+        Rows are first inserted into a temporary staging table with
+        fast_executemany, then merged into the target in one statement.
+
+        Args:
+            cursor: Cursor object with fast_executemany enabled.
+            table (str): Target table name.
+            columns (tuple): Target column names.
+            rows (iterable): Tuples of values in the order of columns.
+            batch_size (int): Number of rows sent to the server per batch.
+            key (tuple): Columns of the primary key.
+            touched (set): Collects the rooms the written rows belonged to before and after, see SUMMARY_KEYS.
+
+        Returns:
+            int: Number of written rows.
+        """
+        stage = f'#{table}_stage'
+        names = ', '.join(columns)
+        cursor.execute(f"SELECT TOP 0 {names} INTO {stage} FROM {table}")
+        total = self.insert_rows(cursor, stage, columns, rows, batch_size)
+        if total and touched is not None:
+            column = SUMMARY_KEYS[table]
+            cursor.execute(f"""SELECT {column} FROM {stage}
+                            UNION SELECT target.{column} FROM {table} AS target JOIN {stage} AS source
+                                ON target.id = source.id""")
+            touched.update(room for room, in cursor.fetchall())
+        if total:
+            condition = ' AND '.join(f'target.{column} = source.{column}' for column in key)
+            assignments = ', '.join(f'{column} = source.{column}' for column in columns if column not in key)
+            values = ', '.join(f'source.{column}' for column in columns)
+            cursor.execute(f"""MERGE {table} AS target
+                            USING {stage} AS source ON {condition}
+                            WHEN MATCHED THEN UPDATE SET {assignments}
+                            WHEN NOT MATCHED THEN INSERT ({names}) VALUES ({values});""")
+        cursor.execute(f"DROP TABLE {stage}")
+        return total
+
+    def delete_rows(self, cursor, table, ids, batch_size=10000, touched=None) -> int:
+        """
+        Delete rows and their content hashes by id.
+
+        The ids are staged in a temporary table with fast_executemany and
+        the rows are deleted in one statement, so the server reports how
+        many of them actually existed.
+
+        Args:
+            cursor: Cursor object with fast_executemany enabled.
+            table (str): Table name.
+            ids (list): Ids of the rows to be deleted.
+            batch_size (int): Number of ids sent to the server per batch.
+            touched (set): Collects the rooms the deleted rows belonged to, see SUMMARY_KEYS.
+
+        Returns:
+            int: Number of deleted rows.
+        """
+        stage = f'#{table}_delete'
+        cursor.execute(f"CREATE TABLE {stage} (id INT PRIMARY KEY)")
+        total = 0
+        if self.insert_rows(cursor, stage, ('id',), ((row_id,) for row_id in ids), batch_size):
+            if touched is not None:
+                cursor.execute(f"SELECT DISTINCT {SUMMARY_KEYS[table]} FROM {table} "
+                               f"WHERE id IN (SELECT id FROM {stage})")
+                touched.update(room for room, in cursor.fetchall())
+            cursor.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM {stage})")
+            total = cursor.rowcount
+            cursor.execute(f"DELETE FROM {HASH_TABLE} WHERE table_name = ? AND id IN (SELECT id FROM {stage})", table)
+        cursor.execute(f"DROP TABLE {stage}")
+        return total
+
+    def insert_rows(self, cursor, table, columns, rows, batch_size=10000) -> int:
+        """
+        Insert rows into a table with parameterized executemany in batches.
+
+        Args:
+            cursor: Cursor object with fast_executemany enabled.
+            table (str): Target table name.
+            columns (tuple): Target column names.
+            rows (iterable): Tuples of values in the order of columns.
+            batch_size (int): Number of rows sent to the server per batch.
+
+        Returns:
+            int: Number of inserted rows.
+        """
+        statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        started = time.perf_counter()
+        total = 0
+        batches = TimedIterator(batched(rows, batch_size))
+        for batch in batches:
+            cursor.executemany(statement, batch)
+            total += len(batch)
+        elapsed = time.perf_counter() - started
+        self.metrics.record_load(table, batches, elapsed)
+        rate = total / elapsed if elapsed > 0 else float(total)
+        logger.info(f"{table}: {total} строк за {elapsed:.2f} с ({rate:.0f} строк/с)")
+        return total
+
+    def execute_sql_query_json(self, input_file, output_file, output_format='json', chunk_size=FETCH_SIZE,
+                               pretty=True, part_size=None):
         """
         Execute SQL queries from input file and save results to output file in JSON format.
 
+        Rows are read in chunks of chunk_size and written as JSON objects keyed
+        by column names as soon as they are fetched.
+
         Args:
             input_file (str): Path to the file containing SQL queries.
-            output_file (str): Path to the output JSON file.
+            output_file (str): Path to the output JSON file, compressed if it ends in .gz or .zst.
+            output_format (str): 'json' for a JSON array, 'ndjson' for one object per line
+                or 'legacy' for the old "Result of ..." text format.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact JSON.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed.
         """
-        cursor = self.conn.cursor()
-        with open(input_file, 'r') as f:
-            queries = f.read()
+        if output_format not in JSON_FORMATS:
+            raise ValueError(f"Неизвестный формат: {output_format}")
+        return self.export_query(input_file, output_file, output_format, chunk_size, pretty, part_size)
+
+    def export_query(self, input_file, output_file, output_format='json', chunk_size=FETCH_SIZE, pretty=True,
+                     part_size=None):
+        """
+        Execute SQL queries from input file and save results with a registered exporter.
+
+        Rows are read in chunks of chunk_size and passed to the exporter as
+        soon as they are fetched, see exporters.register_exporter. Split
+        reports are not cached.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            output_file (str): Path to the output file, compressed if it ends in .gz or .zst.
+            output_format (str): Name of a registered exporter, e.g. 'json', 'csv' or 'parquet'.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact output for formats that have both.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest,
+                see exporters.export_batches.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed.
+        """
+        exporter = get_exporter(output_format)
+        queries = self.catalog.get(input_file)
+        key = None if part_size else self.cache_key(queries, output_variant(output_format, output_file, pretty))
+        if key and self.cache.get(key, output_file):
+            logger.info('Файл ' + output_file + ' взят из кэша')
+            return 0
+        with self.pool.connection() as conn:
             try:
+                started = time.perf_counter()
+                cursor = conn.cursor()
                 cursor.execute(queries)
-                rows = cursor.fetchall()
-                with open(output_file, 'w') as f:
-                    f.write(f"Result of {input_file}: \n")
-                    for row in rows:
-                        f.write(str(row) + '\n')
+                self.record_execute(input_file, queries, time.perf_counter() - started)
+                if not cursor.description:
+                    logger.critical(f"Запрос не вернул результатов: {input_file}")
+                    return 1
+                columns = [column[0] for column in cursor.description]
+                batches = fetch_batches(cursor, chunk_size)
+                write = functools.partial(export_batches, exporter, columns, output_file=output_file,
+                                          input_file=input_file, pretty=pretty, part_size=part_size)
+                self.metrics.export(input_file, write, batches, output_file, started)
+                if key:
+                    self.cache.put(key, output_file)
             except (pyodbc.Error, FileNotFoundError) as e:
                 logger.critical(f"Ошибка выполнения запроса: {output_file}\n{e}\n\n")
+                return 1
+        return 0
 
-    def query_processing(self, input_file, output_file):
+    def query_processing(self, input_file, output_file, chunk_size=FETCH_SIZE, pretty=True, part_size=None):
         """
         Execute SQL queries from input file, process results, and save to output file in XML format.
 
+        Rows are read with fetchmany in chunks of chunk_size and each record is
+        written to the file as soon as it is fetched.
+
         Args:
             input_file (str): Path to the file containing SQL queries.
-            output_file (str): Path to the output XML file.
+            output_file (str): Path to the output XML file, compressed if it ends in .gz or .zst.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Indent the records, False for compact XML.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed or returned no rows.
         """
         try:
-            with open(input_file, 'r') as f:
-                sql_query = f.read()
-            cursor = self.conn.cursor()
-            cursor.execute(sql_query)
-            columns = [column[0] for column in cursor.description]
-            rows = cursor.fetchall()
-            if columns and rows:
-                xml_data = self.convert_result_to_xml(columns, rows)
-                self.save_xml_to_file(xml_data, output_file)
-                logger.info('Создан файл ' + output_file)
-            else:
-                logger.critical("Не удалось выполнить запрос или получить результаты.")
+            sql_query = self.catalog.get(input_file)
+            key = None if part_size else self.cache_key(sql_query, output_variant('xml', output_file, pretty))
+            if key and self.cache.get(key, output_file):
+                logger.info('Файл ' + output_file + ' взят из кэша')
+                return 0
+            with self.pool.connection() as conn:
+                started = time.perf_counter()
+                cursor = conn.cursor()
+                cursor.execute(sql_query)
+                self.record_execute(input_file, sql_query, time.perf_counter() - started)
+                columns = [column[0] for column in cursor.description] if cursor.description else []
+                rows = cursor.fetchmany(chunk_size) if columns else []
+                if columns and rows:
+                    batches = itertools.chain([rows], fetch_batches(cursor, chunk_size))
+                    write = functools.partial(export_batches, get_exporter('xml'), columns, output_file=output_file,
+                                              pretty=pretty, part_size=part_size)
+                    self.metrics.export(input_file, write, batches, output_file, started)
+                    logger.info('Создан файл ' + output_file)
+                    if key:
+                        self.cache.put(key, output_file)
+                else:
+                    logger.critical("Не удалось выполнить запрос или получить результаты.")
+                    return 1
         except pyodbc.Error as e:
             print(f"Ошибка при выполнении SQL запроса: {e}")
+            return 1
+        return 0
+
+    def record_execute(self, input_file, sql, seconds):
+        """
+        Record the execution time of a report query and capture the plan of slow ones.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            sql (str): Executed SQL text.
+            seconds (float): Time of cursor.execute.
+        """
+        self.metrics.record('execute', input_file, seconds)
+        if self.metrics.is_slow(seconds):
+            self.metrics.slow_query(input_file, sql, seconds, self.explain(sql))
+
+    def explain(self, sql):
+        """
+        Return the SHOWPLAN_TEXT plan of a query.
+
+        Uses a separate pooled connection, because the report connection is
+        still busy with the pending result set.
+
+        Args:
+            sql (str): SQL text.
+
+        Returns:
+            str or None: Plan text, None if the plan could not be captured.
+        """
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SET SHOWPLAN_TEXT ON')
+                try:
+                    cursor.execute(sql)
+                    plan = []
+                    while True:
+                        if cursor.description:
+                            plan.extend(str(row[0]) for row in cursor.fetchall())
+                        if not cursor.nextset():
+                            break
+                finally:
+                    cursor.execute('SET SHOWPLAN_TEXT OFF')
+                return '\n'.join(plan)
+        except (pyodbc.Error, PoolTimeoutError) as e:
+            logger.error(f"Не удалось получить план запроса: {e}")
+            return None
+
+    def run_reports(self, jobs, max_workers=4, **options):
+        """
+        Run several reports concurrently on separate pooled connections.
+
+        Args:
+            jobs (list): (sql file, output path, format) tuples, format is 'xml', 'json', 'ndjson' or 'legacy'.
+            max_workers (int): Maximum number of reports running at the same time,
+                should not exceed pool_max_size minus the main connection.
+            **options: pretty and part_size passed to every report.
+
+        Returns:
+            list: ReportResult for every job, in the order of jobs.
+        """
+        return run_reports(self, jobs, max_workers, **options)
 
     def convert_result_to_xml(self, columns, rows):
         """
@@ -170,6 +834,7 @@ class MyDatabase:
         Returns:
             etree.Element: XML data.
         """
+        from lxml import etree
         root = etree.Element('data')
         for row in rows:
             record = etree.Element('record')
@@ -189,16 +854,19 @@ class MyDatabase:
             xml_data (etree.Element): XML data.
             xml_filename (str): Output XML file name.
         """
+        from lxml import etree
         xml_tree = etree.ElementTree(xml_data)
         xml_tree.write(xml_filename, pretty_print=True)
 
     def close(self):
         """Close the database connection."""
         logger.info("Programm is finished!")
-        self.conn.close()
+        self.pool.checkin(self.conn)
+        self.pool.close()
 
 
 if __name__ == "__main__":
+    import configparser
     config = configparser.ConfigParser()
     config.read("config.ini")
     port = config.get('Task_1', 'Port')
@@ -229,23 +897,10 @@ if __name__ == "__main__":
                 db.load_data_from_json(rooms_way, students_way)
             break
         print('Введите один из предложенных вариантов')
-    print('Выберите формат выходного файла:json или xml')
-    form = input()
-    while True:
-        if form.find('json') != -1:
-            form = 'json'
-            db.execute_sql_query_json('SQLQuery1.sql', 'SQLQuery1_result.' + str(form))
-            db.execute_sql_query_json('SQLQuery2.sql', 'SQLQuery2_result.' + str(form))
-            db.execute_sql_query_json('SQLQuery3.sql', 'SQLQuery3_result.' + str(form))
-            db.execute_sql_query_json('SQLQuery4.sql', 'SQLQuery4_result.' + str(form))
-            break
-        elif form.find('xml') != -1:
-            form = 'xml'
-            db.query_processing('SQLQuery1.sql', 'SQLQuery1_result.' + str(form))
-            db.query_processing('SQLQuery2.sql', 'SQLQuery2_result.' + str(form))
-            db.query_processing('SQLQuery3.sql', 'SQLQuery3_result.' + str(form))
-            db.query_processing('SQLQuery4.sql', 'SQLQuery4_result.' + str(form))
-            break
-        print('Введите один из двух предложенных форматов!')
-        form = input()
+    print('Выберите формат выходного файла: ' + ', '.join(EXPORTERS))
+    form = input().strip().lower()
+    while form not in EXPORTERS:
+        print('Введите один из предложенных форматов!')
+        form = input().strip().lower()
+    db.run_reports(default_jobs(form))
     db.close()
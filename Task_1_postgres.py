@@ -1,12 +1,60 @@
-import json
+import functools
+import hashlib
+import io
+import itertools
 import logging
-from lxml import etree
+import time
 import os
 import psycopg2
-import configparser
+import psycopg2.extensions
+import psycopg2.extras
+from catalog import QueryCatalog
+from json_stream import batched, iter_json_records
+from sharding import load_shards, log_shards
+from incremental import HASH_TABLE, ROOM_COLUMNS, STUDENT_COLUMNS, SUMMARY_KEYS, RowDiff
+from reports import default_jobs, run_reports
+from pool import ConnectionPool
+from metrics import Metrics, TimedIterator
+from records import Quarantine, RecordDecoder
+from exporters import (EXPORTERS, FETCH_SIZE, JSON_FORMATS, export_batches, fetch_batches, get_exporter,
+                       output_variant)
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
+connected = True
+
+
+def copy_value(value):
+    """
+    Format a value for the text format of COPY ... FROM STDIN.
+
+    Args:
+        value: Python value to be copied.
+
+    Returns:
+        str: Escaped value, or \\N for NULL.
+    """
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class ReportConnection(psycopg2.extensions.connection):
+    """
+    Connection that remembers the statements prepared on it.
+
+    Prepared statements live as long as the server session, so the names are
+    kept on the connection and a reconnected one starts with an empty set.
+
+    Attributes:
+        prepared (set): Names of the statements prepared on this connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
 
 class MyDatabase:
     """
@@ -18,13 +66,18 @@ class MyDatabase:
         database (str): Database name.
         username (str): Username.
         password (str): Password.
+        pool (ConnectionPool): Pool of connections shared by reports.
+        metrics (Metrics): Per-phase timings, row counts and bytes.
+        catalog (QueryCatalog): Parsed report files with their Postgres statements.
+        prepare_statements (bool): Run reports as PREPARE/EXECUTE instead of through a server-side cursor.
         cursor: Cursor object for executing SQL commands.
         connection: Connection object for the database connection.
     """
 
-    def __init__(self, port, server, database, username, password):
+    def __init__(self, port, server, database, username, password, pool_min_size=1, pool_max_size=5, cache=None,
+                 metrics=None, prepare_statements=False, quarantine_file=None):
         """
-        Initialize the database connection.
+        Initialize the connection pool and the main database connection.
 
         Args:
             port (str): Port number.
@@ -32,34 +85,61 @@ class MyDatabase:
             database (str): Database name.
             username (str): Username.
             password (str): Password.
+            pool_min_size (int): Number of connections kept open in the pool.
+            pool_max_size (int): Maximum number of connections open at the same time.
+            cache (ResultCache): Result cache for reports, None to always query the database.
+            metrics (Metrics): Collector of per-phase timings, a new one by default.
+            prepare_statements (bool): Prepare every report once per connection and run it with EXECUTE
+                instead of streaming it through a server-side cursor. This saves planning on repeated runs,
+                but the whole result is buffered on the client, so only use it for reports with small results.
+            quarantine_file (str): NDJSON file collecting the records rejected by loads, None to only log them.
         """
         self.port = port
         self.server = server
         self.database = database
         self.username = username
         self.password = password
+        self.cache = cache
+        self.metrics = metrics or Metrics()
+        self.catalog = QueryCatalog('postgres')
+        self.prepare_statements = prepare_statements
+        self.quarantine_file = quarantine_file
+        self.cache_scope = f'postgres://{server}:{port}/{database}'
         try:
+            self.pool = ConnectionPool(self.open_connection, pool_min_size, pool_max_size)
             self.cursor, self.connection = self.connect()
             print('cursor were created')
         except:
+            global connected
+            connected = False
             logger.critical("Ошибка при подключении к серверу базы данных")
 
+    def open_connection(self):
+        """
+        Open a new connection to the database, used by the pool.
+
+        Returns:
+            connection: Connection object for the database connection.
+        """
+        return psycopg2.connect(
+            host=self.server,
+            database=self.database,
+            user=self.username,
+            password=self.password,
+            port=self.port,
+            connection_factory=ReportConnection
+        )
+
     def connect(self):
         """
-        Connect to the database.
+        Take a connection to the database from the pool.
 
         Returns:
             cursor: Cursor object for executing SQL commands.
             connection: Connection object for the database connection.
         """
         try:
-            connection = psycopg2.connect(
-                host=self.server,
-                database=self.database,
-                user=self.username,
-                password=self.password,
-                port=self.port
-            )
+            connection = self.pool.checkout()
             logger.info("Успешное подключение к базе данных")
             cursor = connection.cursor()
             return cursor, connection
@@ -69,8 +149,47 @@ class MyDatabase:
             logger.critical(f"Ошибка при подключении к базе данных: {e}")
         return None
 
-    def create_tables(self):
-        """Create necessary tables if they don't exist."""
+    def cache_key(self, sql, output_format):
+        """
+        Build the result cache key of a report for the current data version.
+
+        Args:
+            sql (str): SQL text of the report.
+            output_format (str): Output format of the report.
+
+        Returns:
+            str or None: Cache key, None if the result cache is disabled.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.key(sql, self.cache_scope, output_format, self.cache.data_version(self.cache_scope))
+
+    def bump_data_version(self):
+        """Invalidate cached reports after the data was changed by a load."""
+        if self.cache is not None:
+            self.cache.bump_version(self.cache_scope)
+
+    def record_decoder(self):
+        """
+        Create the decoder of one load.
+
+        Returns:
+            RecordDecoder: Decoder putting rejected records into quarantine_file.
+        """
+        return RecordDecoder(Quarantine(self.quarantine_file))
+
+    def create_tables(self, summary=False):
+        """
+        Create necessary tables if they don't exist.
+
+        Also creates the index on students.room used by the report joins and,
+        if summary is set, the room_summary table with per-room aggregates
+        (student count, min/max/sum of birth years, number of distinct sexes)
+        that every load refreshes.
+
+        Args:
+            summary (bool): Create the room_summary table.
+        """
         cursor = self.cursor
         cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'rooms'")
         if cursor.fetchone()[0] == 0:
@@ -91,18 +210,89 @@ class MyDatabase:
             logger.info('Таблица Students создана!')
         else:
             print('Таблицы "Students" already exists!')
+        cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = %s", (HASH_TABLE,))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f'''CREATE TABLE {HASH_TABLE}
+                            (table_name VARCHAR(64),
+                            id INT,
+                            hash BIGINT,
+                            PRIMARY KEY(table_name, id))''')
+            logger.info(f'Таблица {HASH_TABLE} создана!')
+        cursor.execute("CREATE INDEX IF NOT EXISTS students_room_idx ON students (room) INCLUDE (birthday, sex)")
+        if summary:
+            cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'room_summary'")
+            if cursor.fetchone()[0] == 0:
+                cursor.execute('''CREATE TABLE room_summary
+                                (room_id INT PRIMARY KEY,
+                                name VARCHAR(255),
+                                student_count INT,
+                                min_birth_year INT,
+                                max_birth_year INT,
+                                sum_birth_year BIGINT,
+                                sex_count INT)''')
+                logger.info('Таблица room_summary создана!')
+            self.refresh_room_summary(cursor)
         self.connection.commit()
 
-    def load_data_from_json(self, rooms_file, students_file) -> int:
+    def refresh_room_summary(self, cursor, rooms=None):
+        """
+        Rebuild the room_summary table from rooms and students if it exists.
+
+        Called by every loader inside its transaction, so the summary always
+        matches the loaded data. The incremental load passes the rooms it
+        touched and only their rows are recomputed.
+
+        Args:
+            cursor: Cursor object for executing SQL commands.
+            rooms (set): Ids of the rooms whose summary changed, None to rebuild the whole table.
+
+        Returns:
+            bool: True if the summary was refreshed, False if the table does not exist.
+        """
+        cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'room_summary'")
+        if cursor.fetchone()[0] == 0:
+            return False
+        if rooms is None:
+            condition, parameters = '', ()
+            cursor.execute("DELETE FROM room_summary")
+        elif rooms:
+            condition, parameters = 'WHERE r.id = ANY(%s)', (list(rooms),)
+            cursor.execute("DELETE FROM room_summary WHERE room_id = ANY(%s)", parameters)
+        else:
+            logger.info('Таблица room_summary не изменилась')
+            return True
+        cursor.execute(f'''INSERT INTO room_summary
+                            (room_id, name, student_count, min_birth_year, max_birth_year, sum_birth_year, sex_count)
+                          SELECT r.id, r.name, COUNT(s.id),
+                                 MIN(EXTRACT(year FROM s.birthday))::INT,
+                                 MAX(EXTRACT(year FROM s.birthday))::INT,
+                                 SUM(EXTRACT(year FROM s.birthday))::BIGINT,
+                                 COUNT(DISTINCT s.sex)
+                          FROM rooms r LEFT JOIN students s ON r.id = s.room
+                          {condition}
+                          GROUP BY r.id, r.name''', parameters)
+        logger.info('Таблица room_summary обновлена!' if rooms is None
+                    else f'Таблица room_summary обновлена для комнат: {len(rooms)}')
+        return True
+
+    def load_data_from_json(self, rooms_file, students_file, bulk=False, batch_size=10000,
+                            incremental=False, delete_missing=False, workers=1, shard_by='hash', swap=False) -> int:
         """
         Load data from JSON files into the database.
 
         Args:
-            rooms_file (str): Path to the JSON file containing rooms data.
-            students_file (str): Path to the JSON file containing students data.
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            bulk (bool): Stream rows through COPY ... FROM STDIN instead of one INSERT per row.
+            batch_size (int): Number of rows sent to the server per COPY in bulk or incremental mode.
+            incremental (bool): Apply only new and changed rows, see incremental_load_data_from_json.
+            delete_missing (bool): In incremental mode, delete rows that are not in the files.
+            workers (int): Load students over this many connections in parallel, see parallel_load_data_from_json.
+            shard_by (str): 'hash' or 'range', how students are split between the workers.
+            swap (bool): Fill staging tables and swap them with the live ones, see swap_load_data_from_json.
 
         Returns:
-            int: 0 if data loaded successfully, 1 if any file is not found.
+            int: 0 if data loaded successfully, 1 if any file is not found or the load was rolled back.
         """
         check_wrong_ways = 0
         if not os.path.isfile(rooms_file):
@@ -113,69 +303,615 @@ class MyDatabase:
             check_wrong_ways = 1
         if check_wrong_ways == 1:
             return check_wrong_ways
+        if incremental:
+            return self.incremental_load_data_from_json(rooms_file, students_file, delete_missing, batch_size)
+        if swap:
+            return self.swap_load_data_from_json(rooms_file, students_file, batch_size)
+        if workers > 1:
+            return self.parallel_load_data_from_json(rooms_file, students_file, workers, shard_by, batch_size)
+        if bulk:
+            return self.bulk_load_data_from_json(rooms_file, students_file, batch_size)
+        decoder = self.record_decoder()
         cursor = self.cursor
         try:
-            with open(rooms_file, 'r') as file:
-                rooms_data = json.load(file)
-                for room in rooms_data:
-                    query = "INSERT INTO rooms (id, name) VALUES (%s, '%s')" % (room['id'], room['name'])
-                    cursor.execute(query)
-                logger.info('Данные по комнатам занесены!')
-
-            with open(students_file, 'r') as file:
-                students_data = json.load(file)
-                for student in students_data:
-                    birthday = student['birthday'][:10]
-                    cursor.execute("INSERT INTO Students (id, name, birthday, room, sex) VALUES (%s, '%s', '%s', '%s', '%s')" % (student['id'], student['name'], birthday, student['room'], student['sex']))
-                logger.info('Данные по студентам занесены!')
+            rooms = TimedIterator(decoder.rooms(iter_json_records(rooms_file)))
+            started = time.perf_counter()
+            for room in rooms:
+                cursor.execute("INSERT INTO rooms (id, name) VALUES (%s, %s)", room)
+            self.metrics.record_load('rooms', rooms, time.perf_counter() - started)
+            logger.info('Данные по комнатам занесены!')
+
+            students = TimedIterator(decoder.students(iter_json_records(students_file)))
+            started = time.perf_counter()
+            for student in students:
+                cursor.execute("INSERT INTO Students (id, name, birthday, room, sex) VALUES (%s, %s, %s, %s, %s)",
+                               student)
+            self.metrics.record_load('students', students, time.perf_counter() - started)
+            logger.info('Данные по студентам занесены!')
+            self.refresh_room_summary(cursor)
         except psycopg2.Error as e:
             logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
-        self.connection.commit()
+            self.connection.rollback()
+            return 1
+        with self.metrics.phase('commit', 'load'):
+            self.connection.commit()
+        self.bump_data_version()
+        return 0
+
+    def bulk_load_data_from_json(self, rooms_file, students_file, batch_size=10000) -> int:
+        """
+        Load data from JSON files into the database with COPY ... FROM STDIN.
+
+        Rows are sent to the server in batches of batch_size, so the whole load
+        takes one round trip per batch instead of one per row.
+
+        Args:
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            batch_size (int): Number of rows sent to the server per COPY.
+
+        Returns:
+            int: 0 if data loaded successfully, 1 if loading failed.
+        """
+        decoder = self.record_decoder()
+        cursor = self.cursor
+        try:
+            rooms = decoder.rooms(iter_json_records(rooms_file))
+            self.copy_rows(cursor, 'rooms', ROOM_COLUMNS, rooms, batch_size)
+            logger.info('Данные по комнатам занесены!')
+            students = decoder.students(iter_json_records(students_file))
+            self.copy_rows(cursor, 'students', STUDENT_COLUMNS, students, batch_size)
+            logger.info('Данные по студентам занесены!')
+            self.refresh_room_summary(cursor)
+        except psycopg2.Error as e:
+            logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
+            self.connection.rollback()
+            return 1
+        with self.metrics.phase('commit', 'load'):
+            self.connection.commit()
+        self.bump_data_version()
+        return 0
+
+    def swap_load_data_from_json(self, rooms_file, students_file, batch_size=10000, lock_timeout='5s') -> int:
+        """
+        Load data into staging tables and swap them with rooms and students in one transaction.
+
+        The staging tables are UNLOGGED and have no keys while COPY fills them.
+        Then they are made logged, and the primary keys, the report index and
+        the foreign key are built and checked once for the whole table. The
+        last transaction drops the live tables and renames the staging ones in
+        their place. Reports read the old data until that commit, and a failed
+        load leaves the live tables untouched.
+
+        Args:
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            batch_size (int): Number of rows sent to the server per COPY.
+            lock_timeout (str): Maximum wait for the exclusive lock of the swap, e.g. behind a long report.
+
+        Returns:
+            int: 0 if data loaded and swapped, 1 if loading or the swap failed.
+        """
+        decoder = self.record_decoder()
+        cursor = self.cursor
+        try:
+            cursor.execute("DROP TABLE IF EXISTS students_staging, rooms_staging")
+            cursor.execute('''CREATE UNLOGGED TABLE rooms_staging
+                            (id INT,
+                            name VARCHAR(255))''')
+            cursor.execute('''CREATE UNLOGGED TABLE students_staging
+                            (id INT,
+                            name VARCHAR(255),
+                            birthday timestamp,
+                            room INT,
+                            sex CHAR(1))''')
+            rooms = decoder.rooms(iter_json_records(rooms_file))
+            self.copy_rows(cursor, 'rooms_staging', ROOM_COLUMNS, rooms, batch_size)
+            logger.info('Данные по комнатам занесены!')
+            students = decoder.students(iter_json_records(students_file))
+            self.copy_rows(cursor, 'students_staging', STUDENT_COLUMNS, students, batch_size)
+            logger.info('Данные по студентам занесены!')
+            with self.metrics.phase('index', 'load'):
+                cursor.execute("ALTER TABLE rooms_staging SET LOGGED")
+                cursor.execute("ALTER TABLE students_staging SET LOGGED")
+                cursor.execute("ALTER TABLE rooms_staging ADD CONSTRAINT rooms_staging_pkey PRIMARY KEY (id)")
+                cursor.execute("ALTER TABLE students_staging ADD CONSTRAINT students_staging_pkey PRIMARY KEY (id)")
+                cursor.execute("CREATE INDEX students_staging_room_idx ON students_staging (room) INCLUDE (birthday, sex)")
+                cursor.execute('''ALTER TABLE students_staging ADD CONSTRAINT students_staging_room_fkey
+                                  FOREIGN KEY (room) REFERENCES rooms_staging (id)''')
+                cursor.execute("ANALYZE rooms_staging")
+                cursor.execute("ANALYZE students_staging")
+            self.connection.commit()
+            logger.info('Промежуточные таблицы проиндексированы и проверены!')
+            with self.metrics.phase('swap', 'load'):
+                cursor.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+                cursor.execute("DROP TABLE IF EXISTS students, rooms")
+                cursor.execute("ALTER TABLE rooms_staging RENAME TO rooms")
+                cursor.execute("ALTER TABLE students_staging RENAME TO students")
+                cursor.execute("ALTER TABLE rooms RENAME CONSTRAINT rooms_staging_pkey TO rooms_pkey")
+                cursor.execute("ALTER TABLE students RENAME CONSTRAINT students_staging_pkey TO students_pkey")
+                cursor.execute("ALTER TABLE students RENAME CONSTRAINT students_staging_room_fkey TO students_room_fkey")
+                cursor.execute("ALTER INDEX students_staging_room_idx RENAME TO students_room_idx")
+                cursor.execute("SELECT to_regclass(%s)", (HASH_TABLE,))
+                if cursor.fetchone()[0] is not None:
+                    cursor.execute(f"DELETE FROM {HASH_TABLE} WHERE table_name IN ('rooms', 'students')")
+                self.refresh_room_summary(cursor)
+            with self.metrics.phase('commit', 'load'):
+                self.connection.commit()
+        except psycopg2.Error as e:
+            logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
+            self.connection.rollback()
+            return 1
+        logger.info('Таблицы rooms и students заменены!')
+        self.bump_data_version()
+        return 0
+
+    def parallel_load_data_from_json(self, rooms_file, students_file, workers=4, shard_by='hash',
+                                     batch_size=10000) -> int:
+        """
+        Load data from JSON files with COPY over several connections at once.
+
+        Rooms are copied and committed first on the main connection, so the
+        foreign key of students is satisfied on every worker connection. Then
+        students are split into workers shards by id and each shard is copied
+        and committed on its own pooled connection. A failed shard is rolled
+        back and reported without affecting the others. The pool needs at
+        least workers + 1 connections.
+
+        Args:
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            workers (int): Number of worker connections.
+            shard_by (str): 'hash' or 'range', see sharding.shard_function.
+            batch_size (int): Number of rows sent to the server per COPY.
+
+        Returns:
+            int: 0 if every shard was loaded, 1 if rooms or any shard failed.
+        """
+        if workers >= self.pool.max_size:
+            raise ValueError(f"Для {workers} потоков нужен пул минимум из {workers + 1} соединений")
+        decoder = self.record_decoder()
+        cursor = self.cursor
+        try:
+            rooms = decoder.rooms(iter_json_records(rooms_file))
+            self.copy_rows(cursor, 'rooms', ROOM_COLUMNS, rooms, batch_size)
+            self.connection.commit()
+            logger.info('Данные по комнатам занесены!')
+        except psycopg2.Error as e:
+            logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
+            self.connection.rollback()
+            return 1
 
-    def execute_sql_query_json(self,input_file,output_file):
+        def load_shard(shard, batches):
+            with self.pool.connection() as connection:
+                shard_cursor = connection.cursor()
+                count = self.copy_rows(shard_cursor, 'students', STUDENT_COLUMNS,
+                                       itertools.chain.from_iterable(batches), batch_size)
+                with self.metrics.phase('commit', f'students[{shard}]'):
+                    connection.commit()
+                return count
+
+        started = time.perf_counter()
+        students = decoder.students(iter_json_records(students_file))
+        try:
+            results = load_shards(students, workers, load_shard, shard_by, batch_size)
+        except ValueError as e:
+            logger.critical(f"Ошибка при чтении файла {students_file}: {e}")
+            return 1
+        finally:
+            self.bump_data_version()
+        log_shards('students', results, time.perf_counter() - started)
+        try:
+            self.refresh_room_summary(cursor)
+            self.connection.commit()
+        except psycopg2.Error as e:
+            logger.critical(f"Ошибка при обновлении room_summary: {e}")
+            self.connection.rollback()
+            return 1
+        return 1 if any(result.status for result in results) else 0
+
+    def incremental_load_data_from_json(self, rooms_file, students_file, delete_missing=False, batch_size=10000) -> int:
+        """
+        Apply only new and changed rooms and students to the database.
+
+        The content hash of every loaded row is kept in the row_hashes table.
+        Incoming rows whose hash did not change are skipped, the rest are
+        written with INSERT ... ON CONFLICT DO UPDATE. Only the room_summary
+        rows of the rooms that were written, deleted, or that a written or
+        deleted student left or joined are recomputed.
+
+        Args:
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            delete_missing (bool): Delete loaded rows that are not in the files, including rows
+                loaded in other modes, see load_row_hashes.
+            batch_size (int): Number of rows sent to the server per statement.
+
+        Returns:
+            int: 0 if data loaded successfully, 1 if loading failed.
+        """
+        decoder = self.record_decoder()
+        cursor = self.cursor
+        touched = set()
+        try:
+            rooms = RowDiff(self.load_row_hashes(cursor, 'rooms'))
+            records = decoder.rooms(iter_json_records(rooms_file))
+            changed_rooms = self.upsert_rows(cursor, 'rooms', ROOM_COLUMNS, rooms.changed(records), batch_size,
+                                             touched=touched)
+            self.save_row_hashes(cursor, 'rooms', rooms.hashes, batch_size)
+            students = RowDiff(self.load_row_hashes(cursor, 'students'))
+            records = decoder.students(iter_json_records(students_file))
+            changed_students = self.upsert_rows(cursor, 'students', STUDENT_COLUMNS, students.changed(records),
+                                                batch_size, touched=touched)
+            self.save_row_hashes(cursor, 'students', students.hashes, batch_size)
+            logger.info(f"Новых или измененных комнат: {changed_rooms}, студентов: {changed_students}")
+            if delete_missing:
+                rejected = decoder.quarantine.ids
+                deleted_students = self.delete_rows(cursor, 'students', students.missing(rejected['students']),
+                                                    batch_size, touched)
+                deleted_rooms = self.delete_rows(cursor, 'rooms', rooms.missing(rejected['rooms']), batch_size,
+                                                 touched)
+                logger.info(f"Удалено комнат: {deleted_rooms}, студентов: {deleted_students}")
+            self.refresh_room_summary(cursor, touched)
+        except psycopg2.Error as e:
+            logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
+            self.connection.rollback()
+            return 1
+        with self.metrics.phase('commit', 'load'):
+            self.connection.commit()
+        self.bump_data_version()
+        return 0
+
+    def load_row_hashes(self, cursor, table):
+        """
+        Read the content hashes of the loaded rows of a table.
+
+        Every row of the table is listed, so rows written by the row, bulk or
+        parallel modes, which keep no hashes, are known to the incremental
+        load too: their hash is None, they are rewritten once and
+        delete_missing deletes them if they are not in the input.
+
+        Args:
+            cursor: Cursor object for executing SQL commands.
+            table (str): Table name.
+
+        Returns:
+            dict: Hash by row id, None for rows without a hash.
+        """
+        cursor.execute(f"SELECT t.id, h.hash FROM {table} t LEFT JOIN {HASH_TABLE} h "
+                       f"ON h.table_name = %s AND h.id = t.id", (table,))
+        return {row_id: digest for row_id, digest in cursor.fetchall()}
+
+    def save_row_hashes(self, cursor, table, hashes, batch_size=10000):
+        """
+        Store the content hashes of written rows.
+
+        Args:
+            cursor: Cursor object for executing SQL commands.
+            table (str): Table the rows were written to.
+            hashes (list): (id, hash) tuples.
+            batch_size (int): Number of rows sent to the server per statement.
+        """
+        rows = ((table, row_id, digest) for row_id, digest in hashes)
+        self.upsert_rows(cursor, HASH_TABLE, ('table_name', 'id', 'hash'), rows, batch_size, key=('table_name', 'id'))
+
+    def upsert_rows(self, cursor, table, columns, rows, batch_size=10000, key=('id',), touched=None) -> int:
+        """
+        Insert rows or update the existing ones with INSERT ... ON CONFLICT DO UPDATE.
+
+        Args:
+            cursor: Cursor object for executing SQL commands.
+            table (str): Target table name.
+            columns (tuple): Target column names.
+            rows (iterable): Tuples of values in the order of columns.
+            batch_size (int): Number of rows sent to the server per statement.
+            key (tuple): Columns of the primary key.
+            touched (set): Collects the rooms the written rows belonged to before and after, see SUMMARY_KEYS.
+
+        Returns:
+            int: Number of written rows.
+        """
+        assignments = ', '.join(f'{column} = EXCLUDED.{column}' for column in columns if column not in key)
+        statement = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s "
+                     f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {assignments}")
+        started = time.perf_counter()
+        total = 0
+        batches = TimedIterator(batched(rows, batch_size))
+        for batch in batches:
+            if touched is not None:
+                self.collect_rooms(cursor, table, columns, batch, touched)
+            psycopg2.extras.execute_values(cursor, statement, batch, page_size=batch_size)
+            total += len(batch)
+        self.metrics.record_load(table, batches, time.perf_counter() - started)
+        return total
+
+    def collect_rooms(self, cursor, table, columns, rows, touched):
+        """
+        Add the rooms that rows are about to leave or join to a set.
+
+        Args:
+            cursor: Cursor object for executing SQL commands.
+            table (str): 'rooms' or 'students'.
+            columns (tuple): Column names of the rows.
+            rows (list): Row tuples with the id first.
+            touched (set): Ids of the rooms whose summary changes.
+        """
+        column = SUMMARY_KEYS[table]
+        position = columns.index(column)
+        touched.update(row[position] for row in rows)
+        if column != 'id':
+            cursor.execute(f"SELECT DISTINCT {column} FROM {table} WHERE id = ANY(%s)", ([row[0] for row in rows],))
+            touched.update(room for room, in cursor.fetchall())
+
+    def delete_rows(self, cursor, table, ids, batch_size=10000, touched=None) -> int:
+        """
+        Delete rows and their content hashes by id.
+
+        Args:
+            cursor: Cursor object for executing SQL commands.
+            table (str): Table name.
+            ids (list): Ids of the rows to be deleted.
+            batch_size (int): Number of ids sent to the server per statement.
+            touched (set): Collects the rooms the deleted rows belonged to, see SUMMARY_KEYS.
+
+        Returns:
+            int: Number of deleted rows.
+        """
+        total = 0
+        returning = f' RETURNING {SUMMARY_KEYS[table]}' if touched is not None else ''
+        for batch in batched(ids, batch_size):
+            cursor.execute(f"DELETE FROM {table} WHERE id = ANY(%s)" + returning, (batch,))
+            total += cursor.rowcount
+            if touched is not None:
+                touched.update(room for room, in cursor.fetchall())
+            cursor.execute(f"DELETE FROM {HASH_TABLE} WHERE table_name = %s AND id = ANY(%s)", (table, batch))
+        return total
+
+    def copy_rows(self, cursor, table, columns, rows, batch_size=10000) -> int:
+        """
+        Copy rows into a table with COPY ... FROM STDIN in batches.
+
+        Args:
+            cursor: Cursor object for executing SQL commands.
+            table (str): Target table name.
+            columns (tuple): Target column names.
+            rows (iterable): Tuples of values in the order of columns.
+            batch_size (int): Number of rows sent to the server per COPY.
+
+        Returns:
+            int: Number of copied rows.
+        """
+        statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+        started = time.perf_counter()
+        total = 0
+        size = 0
+        batches = TimedIterator(batched(rows, batch_size))
+        for batch in batches:
+            buffer = io.StringIO()
+            for row in batch:
+                buffer.write('\t'.join(copy_value(value) for value in row) + '\n')
+            size += buffer.tell()
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+            total += len(batch)
+        elapsed = time.perf_counter() - started
+        self.metrics.record_load(table, batches, elapsed, size)
+        rate = total / elapsed if elapsed > 0 else float(total)
+        logger.info(f"{table}: {total} строк за {elapsed:.2f} с ({rate:.0f} строк/с)")
+        return total
+
+    def execute_sql_query_json(self, input_file, output_file, output_format='json', chunk_size=FETCH_SIZE,
+                               pretty=True, part_size=None):
         """
         Execute SQL queries from input file and save results to output file in JSON format.
 
+        Rows are read in chunks of chunk_size and written as JSON objects keyed
+        by column names as soon as they are fetched.
+
         Args:
             input_file (str): Path to the file containing SQL queries.
-            output_file (str): Path to the output JSON file.
+            output_file (str): Path to the output JSON file, compressed if it ends in .gz or .zst.
+            output_format (str): 'json' for a JSON array, 'ndjson' for one object per line
+                or 'legacy' for the old "Result of ..." text format.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact JSON.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed.
         """
-        cursor = self.cursor
-        with open(input_file, 'r') as f:
-            queries = f.read()
+        if output_format not in JSON_FORMATS:
+            raise ValueError(f"Неизвестный формат: {output_format}")
+        return self.export_query(input_file, output_file, output_format, chunk_size, pretty, part_size)
+
+    def export_query(self, input_file, output_file, output_format='json', chunk_size=FETCH_SIZE, pretty=True,
+                     part_size=None):
+        """
+        Execute SQL queries from input file and save results with a registered exporter.
+
+        Rows are read in chunks of chunk_size and passed to the exporter as
+        soon as they are fetched, see exporters.register_exporter. Split
+        reports are not cached.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            output_file (str): Path to the output file, compressed if it ends in .gz or .zst.
+            output_format (str): Name of a registered exporter, e.g. 'json', 'csv' or 'parquet'.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact output for formats that have both.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest,
+                see exporters.export_batches.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed.
+        """
+        exporter = get_exporter(output_format)
+        queries = self.catalog.get(input_file)
+        key = None if part_size else self.cache_key(queries, output_variant(output_format, output_file, pretty))
+        if key and self.cache.get(key, output_file):
+            logger.info('Файл ' + output_file + ' взят из кэша')
+            return 0
+        with self.pool.connection() as connection:
             try:
-                cursor.execute(queries)
-                rows = cursor.fetchall()
-                with open(output_file, 'w') as f:
-                    f.write(f"Result of {input_file}: \n")
-                    for row in rows:
-                        f.write(str(row) + '\n')
+                started = time.perf_counter()
+                cursor = self.open_report_cursor(connection, queries, 'export_query', chunk_size)
+                rows = cursor.fetchmany(chunk_size)
+                self.record_execute(input_file, queries, time.perf_counter() - started, len(rows), connection)
+                columns = [column[0] for column in cursor.description]
+                batches = itertools.chain([rows], fetch_batches(cursor, chunk_size))
+                write = functools.partial(export_batches, exporter, columns, output_file=output_file,
+                                          input_file=input_file, pretty=pretty, part_size=part_size)
+                self.metrics.export(input_file, write, batches, output_file, started)
+                cursor.close()
+                connection.commit()
+                if key:
+                    self.cache.put(key, output_file)
             except (psycopg2.Error, FileNotFoundError) as e:
                 logger.critical(f"Ошибка выполнения запроса: {output_file}\n{e}\n\n")
+                return 1
+        return 0
 
-    def query_processing(self, input_file, output_file):
+    def query_processing(self, input_file, output_file, chunk_size=FETCH_SIZE, pretty=True, part_size=None):
         """
         Execute SQL queries from input file, process results, and save to output file in XML format.
 
+        Rows are read through a server-side cursor in chunks of chunk_size and
+        each record is written to the file as soon as it is fetched.
+
         Args:
             input_file (str): Path to the file containing SQL queries.
-            output_file (str): Path to the output XML file.
+            output_file (str): Path to the output XML file, compressed if it ends in .gz or .zst.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Indent the records, False for compact XML.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed or returned no rows.
         """
         try:
-            with open(input_file, 'r') as f:
-                sql_query = f.read()
-            cursor = self.connect()
-            cursor.execute(sql_query)
-            columns = [column[0] for column in cursor.description]
-            rows = cursor.fetchall()
-            if columns and rows:
-                xml_data = self.convert_result_to_xml(columns, rows)
-                self.save_xml_to_file(xml_data, output_file)
-                logger.info('Создан файл '+output_file)
-            else:
-                logger.critical("Не удалось выполнить запрос или получить результаты.")
+            sql_query = self.catalog.get(input_file)
+            key = None if part_size else self.cache_key(sql_query, output_variant('xml', output_file, pretty))
+            if key and self.cache.get(key, output_file):
+                logger.info('Файл ' + output_file + ' взят из кэша')
+                return 0
+            with self.pool.connection() as connection:
+                started = time.perf_counter()
+                cursor = self.open_report_cursor(connection, sql_query, 'query_processing', chunk_size)
+                rows = cursor.fetchmany(chunk_size)
+                self.record_execute(input_file, sql_query, time.perf_counter() - started, len(rows), connection)
+                columns = [column[0] for column in cursor.description] if cursor.description else []
+                if columns and rows:
+                    batches = itertools.chain([rows], fetch_batches(cursor, chunk_size))
+                    write = functools.partial(export_batches, get_exporter('xml'), columns, output_file=output_file,
+                                              pretty=pretty, part_size=part_size)
+                    self.metrics.export(input_file, write, batches, output_file, started)
+                    logger.info('Создан файл '+output_file)
+                    if key:
+                        self.cache.put(key, output_file)
+                else:
+                    logger.critical("Не удалось выполнить запрос или получить результаты.")
+                    return 1
+                cursor.close()
+                connection.commit()
         except psycopg2.Error as e:
             print(f"Ошибка при выполнении SQL запроса: {e}")
+            return 1
+        return 0
+
+    def open_report_cursor(self, connection, sql, name, chunk_size):
+        """
+        Start a report query and return the cursor to fetch its rows from.
+
+        By default the query runs through a named server-side cursor that
+        streams the rows. With prepare_statements it is prepared once per
+        connection, so repeated runs skip parsing and planning, but EXECUTE
+        cannot be declared as a cursor and its whole result is fetched at once.
+
+        Args:
+            connection: Connection the query runs on.
+            sql (str): SQL text of the report.
+            name (str): Name of the server-side cursor.
+            chunk_size (int): Number of rows fetched from the server at a time.
+
+        Returns:
+            cursor: Cursor with the executed query.
+        """
+        if not self.prepare_statements:
+            cursor = connection.cursor(name=name)
+            cursor.itersize = chunk_size
+            cursor.execute(sql)
+            return cursor
+        statement = 'report_' + hashlib.sha1(sql.encode('utf-8')).hexdigest()[:16]
+        cursor = connection.cursor()
+        if statement not in connection.prepared:
+            cursor.execute(f'PREPARE {statement} AS {sql}')
+            connection.prepared.add(statement)
+        cursor.execute(f'EXECUTE {statement}')
+        return cursor
+
+    def record_execute(self, input_file, sql, seconds, rows, connection):
+        """
+        Record the execution time of a report query and capture the plan of slow ones.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            sql (str): Executed SQL text.
+            seconds (float): Time until the first chunk of rows was fetched.
+            rows (int): Number of rows in the first chunk.
+            connection: Connection the query runs on.
+        """
+        self.metrics.record('execute', input_file, seconds, rows)
+        if self.metrics.is_slow(seconds):
+            self.metrics.slow_query(input_file, sql, seconds, self.explain(sql, connection))
+
+    def explain(self, sql, connection):
+        """
+        Return the EXPLAIN plan of a query.
+
+        Runs inside a savepoint, so a failing EXPLAIN does not abort the
+        transaction of the report that is still being fetched.
+
+        Args:
+            sql (str): SQL text.
+            connection: Connection the query runs on.
+
+        Returns:
+            str or None: Plan text, None if EXPLAIN failed.
+        """
+        cursor = connection.cursor()
+        saved = False
+        try:
+            cursor.execute('SAVEPOINT explain_plan')
+            saved = True
+            cursor.execute('EXPLAIN ' + sql)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute('RELEASE SAVEPOINT explain_plan')
+            return plan
+        except psycopg2.Error as e:
+            logger.error(f"Не удалось получить план запроса: {e}")
+            if saved:
+                try:
+                    cursor.execute('ROLLBACK TO SAVEPOINT explain_plan')
+                except psycopg2.Error as rollback_error:
+                    logger.error(f"Не удалось откатиться к точке сохранения: {rollback_error}")
+            return None
+        finally:
+            cursor.close()
+
+    def run_reports(self, jobs, max_workers=4, **options):
+        """
+        Run several reports concurrently on separate pooled connections.
+
+        Args:
+            jobs (list): (sql file, output path, format) tuples, format is 'xml', 'json', 'ndjson' or 'legacy'.
+            max_workers (int): Maximum number of reports running at the same time,
+                should not exceed pool_max_size minus the main connection.
+            **options: pretty and part_size passed to every report.
+
+        Returns:
+            list: ReportResult for every job, in the order of jobs.
+        """
+        return run_reports(self, jobs, max_workers, **options)
 
     def convert_result_to_xml(self, columns, rows):
         """
@@ -188,6 +924,7 @@ class MyDatabase:
         Returns:
             etree.Element: XML data.
         """
+        from lxml import etree
         root = etree.Element('data')
         for row in rows:
             record = etree.Element('record')
@@ -207,17 +944,20 @@ class MyDatabase:
             xml_data (etree.Element): XML data to be saved.
             xml_filename (str): Path to the output XML file.
         """
+        from lxml import etree
         xml_tree = etree.ElementTree(xml_data)
         xml_tree.write(xml_filename, pretty_print=True)
 
     def close(self):
         """Close the database connection."""
         logger.info("Programm is finished!")
-        self.connection.close()
         self.cursor.close()
+        self.pool.checkin(self.connection)
+        self.pool.close()
 
 
 if __name__ == "__main__":
+    import configparser
     config = configparser.ConfigParser()
     config.read("config.ini")
     port=config.get('Task_1','Port')
@@ -248,23 +988,7 @@ if __name__ == "__main__":
                 db.load_data_from_json(rooms_way,students_way)
             break
         print('Введите один из предложенных вариантов')
-    print('Выберите формат выходного файла:json или xml')
+    print('Выберите формат выходного файла: ' + ', '.join(EXPORTERS))
     form='json'
-    while True:
-        if form.find('json')!=-1:
-            form='json'
-            db.execute_sql_query_json('SQLQuery1.sql','SQLQuery1_result.'+str(form))
-            db.execute_sql_query_json('SQLQuery2.sql','SQLQuery2_result.'+str(form))
-            db.execute_sql_query_json('SQLQuery3.sql','SQLQuery3_result.'+str(form))
-            db.execute_sql_query_json('SQLQuery4.sql','SQLQuery4_result.'+str(form))
-            break
-        elif form.find('xml')!=-1:
-            form='xml'
-            db.query_processing('SQLQuery1.sql', 'SQLQuery1_result.'+str(form))
-            db.query_processing('SQLQuery2.sql','SQLQuery2_result.'+str(form))
-            db.query_processing('SQLQuery3.sql','SQLQuery3_result.'+str(form))
-            db.query_processing('SQLQuery4.sql','SQLQuery4_result.'+str(form))
-            break
-        print('Введите один из двух предложенных форматов!')
-        form='json'
+    db.run_reports(default_jobs(form))
     db.close()
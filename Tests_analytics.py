@@ -0,0 +1,61 @@
+import datetime
+import decimal
+import json
+import os
+import tempfile
+import unittest
+from reports import default_jobs, run_reports
+from analytics import OfflineReports, pg_numeric_div
+##Тесты офлайн-отчетов, база данных не нужна.
+class TestOfflineReports(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.rooms_file = self.write('rooms.json', [{'id': i, 'name': f'Room #{i}'} for i in (1, 2, 3)])
+        self.students_file = self.write('students.json', [
+            {'id': 1, 'name': 'a', 'birthday': '2000-06-01T00:00:00.000000', 'room': 1, 'sex': 'M'},
+            {'id': 2, 'name': 'b', 'birthday': '1990-01-01T00:00:00.000000', 'room': 1, 'sex': 'F'},
+            {'id': 3, 'name': 'c', 'birthday': '2001-01-01T00:00:00.000000', 'room': 2, 'sex': 'F'},
+        ])
+    def tearDown(self):
+        self.directory.cleanup()
+    def write(self, name, records):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+        return path
+    def reports(self, dialect='postgres'):
+        return OfflineReports(self.rooms_file, self.students_file, dialect, today=datetime.date(2020, 3, 1))
+    def test_postgres(self):
+        reports = self.reports()
+        self.assertEqual(reports.report('SQLQuery1.sql'), (['name', 'count'], [('Room #1', 2), ('Room #2', 1), ('Room #3', 0)]))
+        self.assertEqual(reports.youngest_rooms()[0][0], 'Room #2')
+        self.assertEqual(reports.widest_age_spread()[0], ('Room #1', decimal.Decimal(11)))
+        self.assertEqual(reports.mixed_sex_rooms(), [('Room #1',)])
+    def test_mssql(self):
+        self.assertEqual(self.reports('mssql').youngest_rooms(), [('Room #2', 19), ('Room #1', 25)])
+    def test_pg_numeric_div(self):
+        self.assertEqual(pg_numeric_div(10, 3), decimal.Decimal('3.3333333333333333'))
+        self.assertEqual(pg_numeric_div(3, 2), decimal.Decimal('1.5000000000000000'))
+    def test_export(self):
+        output_file = os.path.join(self.directory.name, 'out.json')
+        self.assertEqual(self.reports().execute_sql_query_json('SQLQuery4.sql', output_file), 0)
+        with open(output_file) as f:
+            self.assertEqual(json.load(f), [{'name': 'Room #1'}])
+    def test_run_reports(self):
+        jobs = default_jobs('json', compression='gz', output_dir=self.directory.name) + \
+            default_jobs('xml', output_dir=self.directory.name)
+        results = run_reports(self.reports(), jobs, pretty=False, part_size=1024)
+        self.assertEqual([result.status for result in results], [0] * 8, [result.error for result in results])
+        with open(os.path.join(self.directory.name, 'SQLQuery1_result.json.manifest.json')) as f:
+            self.assertEqual(json.load(f)['rows'], 3)
+    def test_non_latin_sex(self):
+        self.students_file = self.write('students.json', [
+            {'id': 1, 'name': 'a', 'birthday': '2000-06-01T00:00:00', 'room': 1, 'sex': 'Ж'},
+            {'id': 2, 'name': 'b', 'birthday': '1990-01-01T00:00:00', 'room': 1, 'sex': 'М'},
+            {'id': 3, 'name': 'c', 'birthday': '2001-01-01T00:00:00', 'room': 2, 'sex': 'Ж'},
+            {'id': 4, 'name': 'd', 'birthday': '2001-01-01T00:00:00', 'room': 3, 'sex': 'Female'},
+            {'id': 5, 'name': 'e', 'birthday': '2001-01-01T00:00:00', 'room': 3, 'sex': 'F'},
+        ])
+        self.assertEqual(self.reports().mixed_sex_rooms(), [('Room #1',), ('Room #3',)])
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import datetime
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+import cache as cache_module
+from cache import ResultCache
+##Тесты кэша отчетов, база данных не нужна.
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.report = self.path('report.json')
+        self.output = self.path('out.json')
+        with open(self.report, 'w') as f:
+            f.write('[1, 2, 3]')
+    def tearDown(self):
+        self.directory.cleanup()
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+    def test_hit_and_version(self):
+        cache = ResultCache(self.path('cache'))
+        key = cache.key('SELECT 1', 'postgres://host:5432/db', 'json', cache.data_version('db'))
+        self.assertFalse(cache.get(key, self.output))
+        cache.put(key, self.report)
+        self.assertTrue(cache.get(key, self.output))
+        with open(self.output) as f:
+            self.assertEqual(f.read(), '[1, 2, 3]')
+        cache.bump_version('db')
+        self.assertNotEqual(cache.key('SELECT 1', 'postgres://host:5432/db', 'json', cache.data_version('db')), key)
+    def test_ttl_counts_from_creation(self):
+        cache = ResultCache(self.path('cache'), ttl=60)
+        cache.put('key', self.report)
+        entry = os.path.join(cache.directory, 'entries', 'key')
+        created = time.time() - 50
+        os.utime(entry, (created, created))
+        self.assertTrue(cache.get('key', self.output))
+        self.assertEqual(os.path.getmtime(entry), created)
+        os.utime(entry, (time.time(), time.time() - 61))
+        self.assertFalse(cache.get('key', self.output))
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(self.path('cache'), max_bytes=20)
+        cache.put('old', self.report)
+        cache.put('used', self.report)
+        entries = os.path.join(cache.directory, 'entries')
+        for name in ('old', 'used'):
+            os.utime(os.path.join(entries, name), (time.time() - 100, time.time() - 100))
+        self.assertTrue(cache.get('used', self.output))
+        cache.put('new', self.report)
+        self.assertEqual(sorted(os.listdir(entries)), ['new', 'used'])
+    def test_key_scope_and_date(self):
+        cache = ResultCache(self.path('cache'))
+        self.assertNotEqual(cache.key('SELECT 1', 'postgres://a:5432/db', 'json', '0'),
+                            cache.key('SELECT 1', 'postgres://b:5432/db', 'json', '0'))
+        sql = 'SELECT AGE(CURRENT_DATE, birthday) FROM students'
+        keys = []
+        for day in (datetime.date(2020, 3, 1), datetime.date(2020, 3, 2)):
+            with mock.patch.object(cache_module.datetime, 'date', mock.Mock(today=mock.Mock(return_value=day))):
+                keys.append((cache.key(sql, 'db', 'json', '0'), cache.key('SELECT 1', 'db', 'json', '0')))
+        self.assertNotEqual(keys[0][0], keys[1][0])
+        self.assertEqual(keys[0][1], keys[1][1])
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+from catalog import QueryCatalog, parse_query_file
+##Тесты разбора файлов запросов, база данных не нужна.
+class TestQueryCatalog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'query.sql')
+    def tearDown(self):
+        self.directory.cleanup()
+    def write(self, text, modified):
+        with open(self.path, 'w') as f:
+            f.write(text)
+        os.utime(self.path, (modified, modified))
+    def test_sections(self):
+        text = '#Для postgres\nSELECT 1;\n#Для MSSMS\nSELECT TOP 1 1;\n'
+        self.assertEqual(parse_query_file(text), {'postgres': 'SELECT 1', 'mssql': 'SELECT TOP 1 1'})
+        shared = '#Для postgres и MSSMS\nSELECT name\nFROM rooms;\n'
+        self.assertEqual(parse_query_file(shared), {'postgres': 'SELECT name\nFROM rooms', 'mssql': 'SELECT name\nFROM rooms'})
+        self.assertEqual(parse_query_file('SELECT 2;'), {'postgres': 'SELECT 2', 'mssql': 'SELECT 2'})
+    def test_repository_queries(self):
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for number in range(1, 5):
+            with open(os.path.join(directory, f'SQLQuery{number}.sql')) as f:
+                statements = parse_query_file(f.read())
+            self.assertEqual(sorted(statements), ['mssql', 'postgres'])
+    def test_reparse_on_change(self):
+        catalog = QueryCatalog('mssql')
+        self.write('#Для MSSMS\nSELECT 1;', 1000)
+        self.assertEqual(catalog.get(self.path), 'SELECT 1')
+        self.write('#Для MSSMS\nSELECT 2;', 1000)
+        self.assertEqual(catalog.get(self.path), 'SELECT 1')
+        self.write('#Для MSSMS\nSELECT 2;', 2000)
+        self.assertEqual(catalog.get(self.path), 'SELECT 2')
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            QueryCatalog('oracle')
+        self.write('#Для postgres\nSELECT 1;', 1000)
+        with self.assertRaises(KeyError):
+            QueryCatalog('mssql').get(self.path)
+if __name__ == '__main__':
+    unittest.main()
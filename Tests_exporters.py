@@ -0,0 +1,80 @@
+import datetime
+import gzip
+import decimal
+import json
+import os
+import tempfile
+import unittest
+import exporters
+##Тесты форматов выгрузки, база данных не нужна.
+class TestExporters(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+    def tearDown(self):
+        self.directory.cleanup()
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+    def read(self, name):
+        with open(self.path(name), encoding='utf-8') as f:
+            return f.read()
+    def test_json_value(self):
+        self.assertEqual(exporters.json_value(decimal.Decimal('1.50')), '1.50')
+        self.assertEqual(exporters.json_value(datetime.date(2020, 3, 1)), '"2020-03-01"')
+        self.assertEqual(exporters.json_value(float('nan')), 'null')
+        self.assertEqual(exporters.json_value(decimal.Decimal('-inf')), 'null')
+        self.assertEqual(exporters.json_value('Комната'), '"Комната"')
+    def test_json(self):
+        rows = [[('a', 1), ('b', None)]]
+        exporters.write_json(['name', 'count'], rows, self.path('out.json'))
+        self.assertEqual(self.read('out.json'), '[\n{"name": "a", "count": 1},\n{"name": "b", "count": null}\n]\n')
+        exporters.write_json(['name', 'count'], rows, self.path('out.ndjson'), ndjson=True)
+        self.assertEqual(self.read('out.ndjson'), '{"name": "a", "count": 1}\n{"name": "b", "count": null}\n')
+    def test_extensions_are_distinct(self):
+        extensions = [exporter.extension for exporter in exporters.EXPORTERS.values()]
+        self.assertEqual(len(extensions), len(set(extensions)))
+    def test_record_batches(self):
+        rows = [[(None, decimal.Decimal('1.5')), (None, decimal.Decimal('123456789012345678901234567890'))]]
+        batches = list(exporters.record_batches(['empty', 'amount'], rows))
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(str(batches[0].schema.field('empty').type), 'string')
+        self.assertEqual(batches[0].schema.field('amount').type.precision, exporters.DECIMAL_PRECISION)
+        self.assertEqual(batches[0].column(1).to_pylist()[1], decimal.Decimal('123456789012345678901234567890'))
+    def test_compact_and_compressed(self):
+        exporter = exporters.get_exporter('json')
+        rows = [[('a', 1), ('b', None)]]
+        exporters.export_batches(exporter, ['name', 'count'], rows, self.path('out.json.gz'), pretty=False)
+        with gzip.open(self.path('out.json.gz'), 'rt', encoding='utf-8') as f:
+            self.assertEqual(f.read(), '[{"name":"a","count":1},{"name":"b","count":null}]\n')
+        self.assertEqual(exporters.output_variant('json', 'out.json.gz', pretty=False), 'json:gz:compact')
+    def test_parts(self):
+        rows = [[(i, 'x' * 5000)] for i in range(10)]
+        output_file = self.path('out.csv')
+        count = exporters.export_batches(exporters.get_exporter('csv'), ['id', 'text'], rows, output_file, part_size=10000)
+        self.assertEqual(count, 10)
+        with open(exporters.manifest_file(output_file)) as f:
+            manifest = json.load(f)
+        self.assertGreater(len(manifest['parts']), 1)
+        self.assertEqual(sum(part['rows'] for part in manifest['parts']), 10)
+        for part in manifest['parts']:
+            self.assertEqual(os.path.getsize(self.path(part['file'])), part['bytes'])
+        self.assertFalse(os.path.exists(output_file))
+    def test_xml_matches_element_tree(self):
+        from lxml import etree
+        columns = ['id', 'name', '']
+        rows = [(1, 'Room #1 & <Комната>', 'x'), (2, None, 'y'), (3, decimal.Decimal('1.50'), 'z')]
+        root = etree.Element('data')
+        for row in rows:
+            record = etree.SubElement(root, 'record')
+            for column, value in zip(columns, row):
+                if column:
+                    etree.SubElement(record, column).text = str(value)
+        etree.ElementTree(root).write(self.path('old.xml'), pretty_print=True)
+        self.assertEqual(exporters.write_xml(columns, [rows[:2], rows[2:]], self.path('new.xml')), 3)
+        with open(self.path('old.xml'), 'rb') as old, open(self.path('new.xml'), 'rb') as new:
+            self.assertEqual(new.read(), old.read())
+        etree.ElementTree(etree.Element('data')).write(self.path('old.xml'), pretty_print=True)
+        self.assertEqual(exporters.write_xml(columns, [[]], self.path('new.xml')), 0)
+        with open(self.path('old.xml'), 'rb') as old, open(self.path('new.xml'), 'rb') as new:
+            self.assertEqual(new.read(), old.read())
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+from incremental import RowDiff, row_hash, student_row
+##Тесты поиска измененных строк, база данных не нужна.
+class TestRowDiff(unittest.TestCase):
+    def test_changed_and_missing(self):
+        old = RowDiff({})
+        list(old.changed([(1, 'a'), (2, 'b'), (3, 'c')]))
+        diff = RowDiff(dict(old.hashes))
+        self.assertEqual(list(diff.changed([(1, 'a'), (2, 'x'), (4, 'd')])), [(2, 'x'), (4, 'd')])
+        self.assertEqual([row_id for row_id, _ in diff.hashes], [2, 4])
+        self.assertEqual(diff.missing(), [3])
+        self.assertEqual(diff.missing(keep={3}), [])
+    def test_rows_without_hash(self):
+        diff = RowDiff({1: None, 2: None, 3: row_hash((3, 'c'))})
+        self.assertEqual(list(diff.changed([(1, 'a'), (3, 'c')])), [(1, 'a')])
+        self.assertEqual(diff.missing(), [2])
+    def test_row_hash(self):
+        student = {'id': 1, 'name': 'a', 'birthday': '2000-01-01T00:00:00', 'room': 1, 'sex': 'M'}
+        digest = row_hash(student_row(student))
+        self.assertEqual(digest, row_hash((1, 'a', '2000-01-01', 1, 'M')))
+        self.assertTrue(-2 ** 63 <= digest < 2 ** 63)
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import json
+import os
+import tempfile
+import unittest
+from json_stream import batched, iter_json_records
+##Тесты потокового чтения JSON, база данных не нужна.
+class TestJsonStream(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+    def tearDown(self):
+        self.directory.cleanup()
+    def write(self, text):
+        path = os.path.join(self.directory.name, 'records.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+    def test_array(self):
+        path = self.write('[{"id": 1}, {"id": 2}]')
+        self.assertEqual(list(iter_json_records(path, chunk_size=4)), [{'id': 1}, {'id': 2}])
+    def test_ndjson(self):
+        path = self.write('{"id": 1}\n{"id": 2}\n\n{"id": 3}\n')
+        self.assertEqual([record['id'] for record in iter_json_records(path, chunk_size=5)], [1, 2, 3])
+    def test_truncated_array(self):
+        path = self.write('[{"id":1},{"id":2},')
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_records(path, chunk_size=4))
+    def test_invalid(self):
+        for text in ('[{"a":1} {"b":2}]', '[1,,,2]', '[,1]', '[1,]', '[1,2] junk', '[1,2]\n[3,4]', '{"a":1} {"b":2}'):
+            path = self.write(text)
+            for chunk_size in (1, 3, 64):
+                with self.assertRaises(json.JSONDecodeError, msg=text):
+                    list(iter_json_records(path, chunk_size=chunk_size))
+    def test_error_is_raised_early(self):
+        path = self.write('[{"id": 1 "name": "a"}' + ', {"id": 2}' * 100000 + ']')
+        with self.assertRaises(json.JSONDecodeError) as context:
+            list(iter_json_records(path, chunk_size=64))
+        self.assertLess(len(context.exception.doc), 1024)
+    def test_long_record(self):
+        path = self.write('[{"name": "' + 'x' * 100000 + '"}, true]\n')
+        self.assertEqual(list(iter_json_records(path, chunk_size=16)), [{'name': 'x' * 100000}, True])
+    def test_batched(self):
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import functools
+import json
+import os
+import tempfile
+import time
+import unittest
+import exporters
+from metrics import Metrics, TimedIterator
+##Тесты сбора метрик, база данных не нужна.
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+    def tearDown(self):
+        self.directory.cleanup()
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+    def totals(self, metrics):
+        return {(entry['phase'], entry['target']): entry for entry in metrics.summary()['phases']}
+    def test_timed_iterator(self):
+        source = TimedIterator([[1, 2], [3], 'x'])
+        self.assertEqual(list(source), [[1, 2], [3], 'x'])
+        self.assertEqual(source.rows, 4)
+    def test_record_and_hooks(self):
+        metrics = Metrics()
+        seen = []
+        metrics.add_hook(lambda *measurement: 1 / 0)
+        metrics.add_hook(lambda *measurement: seen.append(measurement))
+        metrics.record('insert', 'rooms', 1.5, rows=10, size=100)
+        with metrics.phase('insert', 'rooms') as counters:
+            counters['rows'] = 5
+        entry = self.totals(metrics)[('insert', 'rooms')]
+        self.assertEqual((entry['calls'], entry['rows'], entry['bytes']), (2, 15, 100))
+        self.assertEqual(len(seen), 2)
+    def test_record_load(self):
+        metrics = Metrics()
+        source = TimedIterator([[1, 2, 3]])
+        list(source)
+        metrics.record_load('students', source, source.seconds + 1.0, size=50)
+        totals = self.totals(metrics)
+        self.assertEqual(totals[('parse', 'students')]['rows'], 3)
+        self.assertAlmostEqual(totals[('insert', 'students')]['seconds'], 1.0)
+    def test_export(self):
+        metrics = Metrics()
+        output_file = self.path('out.json')
+        write = functools.partial(exporters.write_json, ['id'], output_file=output_file)
+        self.assertEqual(metrics.export('q.sql', write, [[(1,), (2,)]], output_file, time.perf_counter()), 2)
+        totals = self.totals(metrics)
+        self.assertEqual(totals[('fetch', 'q.sql')]['rows'], 2)
+        self.assertEqual(totals[('report', 'q.sql')]['bytes'], os.path.getsize(output_file))
+    def test_export_parts(self):
+        metrics = Metrics()
+        output_file = self.path('out.csv')
+        exporter = exporters.get_exporter('csv')
+        write = functools.partial(exporters.export_batches, exporter, ['id', 'text'], output_file=output_file, part_size=10000)
+        batches = [[(i, 'x' * 5000)] for i in range(10)]
+        metrics.export('q.sql', write, batches, output_file, time.perf_counter())
+        with open(exporters.manifest_file(output_file)) as f:
+            parts = json.load(f)['parts']
+        self.assertGreater(len(parts), 1)
+        size = sum(os.path.getsize(self.path(part['file'])) for part in parts)
+        self.assertEqual(self.totals(metrics)[('report', 'q.sql')]['bytes'], size)
+    def test_slow_queries_and_files(self):
+        metrics = Metrics(slow_query_seconds=1)
+        self.assertFalse(Metrics().is_slow(100))
+        self.assertTrue(metrics.is_slow(2))
+        metrics.slow_query('q.sql', 'SELECT 1', 2, 'Seq Scan')
+        metrics.record('report', 'q "1".sql', 0.5)
+        metrics.write_json(self.path('metrics.json'))
+        with open(self.path('metrics.json')) as f:
+            self.assertEqual(json.load(f)['slow_queries'][0]['plan'], 'Seq Scan')
+        metrics.write_prometheus(self.path('metrics.prom'))
+        with open(self.path('metrics.prom')) as f:
+            text = f.read()
+        self.assertIn('task1_phase_seconds_total{phase="report",target="q \\"1\\".sql"} 0.5\n', text)
+        self.assertIn('task1_slow_queries_total 1\n', text)
+if __name__ == '__main__':
+    unittest.main()
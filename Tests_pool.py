@@ -0,0 +1,84 @@
+import threading
+import unittest
+from pool import ConnectionPool, PoolTimeoutError, ping
+##Тесты пула соединений на поддельных соединениях, база данных не нужна.
+class FakeConnection:
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.closed = False
+        self.rollbacks = 0
+    def rollback(self):
+        if self.broken:
+            raise RuntimeError('connection lost')
+        self.rollbacks += 1
+    def cursor(self):
+        if self.broken:
+            raise RuntimeError('connection lost')
+        return FakeCursor()
+    def close(self):
+        self.closed = True
+class FakeCursor:
+    def execute(self, sql):
+        pass
+    def fetchone(self):
+        return (1,)
+    def close(self):
+        pass
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.opened = []
+    def factory(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+    def test_sizes(self):
+        with self.assertRaises(ValueError):
+            ConnectionPool(self.factory, min_size=2, max_size=1)
+        ConnectionPool(self.factory, min_size=2, max_size=3)
+        self.assertEqual(len(self.opened), 2)
+    def test_reuse_and_rollback(self):
+        pool = ConnectionPool(self.factory, min_size=1, max_size=2)
+        with pool.connection() as connection:
+            self.assertIs(connection, self.opened[0])
+        self.assertEqual(connection.rollbacks, 1)
+        with pool.connection() as again:
+            self.assertIs(again, connection)
+        self.assertEqual(len(self.opened), 1)
+    def test_timeout(self):
+        pool = ConnectionPool(self.factory, min_size=0, max_size=1, timeout=0.05)
+        connection = pool.checkout()
+        with self.assertRaises(PoolTimeoutError):
+            pool.checkout()
+        threading.Timer(0.05, pool.checkin, [connection]).start()
+        pool.timeout = 5
+        self.assertIs(pool.checkout(), connection)
+    def test_broken_connection_is_replaced(self):
+        pool = ConnectionPool(self.factory, min_size=0, max_size=1, timeout=0.05)
+        connection = pool.checkout()
+        connection.broken = True
+        pool.checkin(connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertEqual(len(self.opened), 2)
+    def test_failed_check(self):
+        pool = ConnectionPool(self.factory, min_size=1, max_size=1, check_interval=-1)
+        self.opened[0].broken = True
+        connection = pool.checkout()
+        self.assertIs(connection, self.opened[1])
+        self.assertTrue(self.opened[0].closed)
+        self.assertTrue(ping(connection))
+        self.assertFalse(ping(self.opened[0]))
+    def test_close(self):
+        pool = ConnectionPool(self.factory, min_size=1, max_size=2)
+        busy = pool.checkout()
+        idle = pool.checkout()
+        pool.checkin(idle)
+        pool.close()
+        self.assertTrue(idle.closed)
+        self.assertFalse(busy.closed)
+        pool.checkin(busy)
+        self.assertTrue(busy.closed)
+        with self.assertRaises(RuntimeError):
+            pool.checkout()
+if __name__ == '__main__':
+    unittest.main()
@@ -21,6 +21,9 @@ class TestMyDatabase(unittest.TestCase):
         students_file = "test_students.json"
         result = self.db.load_data_from_json(rooms_file, students_file)
         self.assertEqual(result, 0)
+    def test_bulk_load_data_from_json(self):
+        result = self.db.load_data_from_json("test_rooms.json", "test_students.json", bulk=True, batch_size=100)
+        self.assertEqual(result, 0)
     def test_query_processing(self):
         input_file = "SQLQuery2.sql"
         expected_result = "expected_result.json"
@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import unittest
+from incremental import student_row
+from records import Quarantine, RecordDecoder
+##Тесты проверки входных записей, база данных не нужна.
+class TestRecordDecoder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.quarantine_file = os.path.join(self.directory.name, 'rejected.ndjson')
+    def tearDown(self):
+        self.directory.cleanup()
+    def test_valid_rows(self):
+        decoder = RecordDecoder()
+        rooms = list(decoder.rooms([{'id': 1, 'name': 'Room #1'}]))
+        student = {'id': 7, 'name': 'Ann', 'birthday': '2001-02-03T00:00:00.000000', 'room': 1, 'sex': 'F'}
+        self.assertEqual(rooms, [(1, 'Room #1')])
+        self.assertEqual(list(decoder.students([student])), [student_row(student)])
+    def test_rejects(self):
+        quarantine = Quarantine(self.quarantine_file)
+        decoder = RecordDecoder(quarantine)
+        list(decoder.rooms([{'id': 1, 'name': 'a'}, {'id': 1, 'name': 'b'}, {'id': 2 ** 31, 'name': 'c'}, []]))
+        students = [
+            {'id': 1, 'name': 'a', 'birthday': '2000-01-01', 'room': 1, 'sex': 'M'},
+            {'id': 1, 'name': 'b', 'birthday': '2000-01-01', 'room': 1, 'sex': 'F'},
+            {'id': 2, 'name': 'c', 'birthday': '2000-02-30', 'room': 1, 'sex': 'F'},
+            {'id': 3, 'name': 'd', 'birthday': '2000-01-01', 'room': 5, 'sex': 'F'},
+            {'id': 4, 'name': 'e', 'birthday': '2000-01-01', 'room': 1},
+            {'id': 5, 'name': ['e'], 'birthday': '2000-01-01', 'room': 1, 'sex': 'F'},
+        ]
+        self.assertEqual([row[0] for row in decoder.students(students)], [1])
+        self.assertEqual(quarantine.counts, {'rooms': 3, 'students': 5})
+        self.assertEqual(quarantine.ids['students'], {1, 2, 3, 4, 5})
+        with open(self.quarantine_file, encoding='utf-8') as f:
+            errors = [json.loads(line)['error'] for line in f]
+        self.assertEqual(len(errors), 8)
+        self.assertIn('повторный id 1', errors)
+        self.assertIn('нет полей: sex', errors)
+    def test_without_file(self):
+        decoder = RecordDecoder()
+        self.assertEqual(list(decoder.rooms([{'id': 'x', 'name': 'a'}])), [])
+        self.assertEqual(decoder.quarantine.counts['rooms'], 1)
+        self.assertFalse(os.listdir(self.directory.name))
+if __name__ == '__main__':
+    unittest.main()
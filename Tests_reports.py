@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+import unittest
+from reports import REPORT_FILES, default_jobs, run_report, run_reports
+##Тесты запуска отчетов на поддельной базе, база данных не нужна.
+class FakeDatabase:
+    def __init__(self):
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+    def call(self, method, input_file, options):
+        with self.lock:
+            self.calls.append((method, input_file, options))
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        if input_file == 'broken.sql':
+            raise ValueError('syntax error')
+        return 1 if input_file == 'empty.sql' else 0
+    def query_processing(self, input_file, output_file, **options):
+        return self.call('xml', input_file, options)
+    def execute_sql_query_json(self, input_file, output_file, output_format='json', **options):
+        return self.call('json:' + output_format, input_file, options)
+    def export_query(self, input_file, output_file, output_format='json', **options):
+        return self.call('export:' + output_format, input_file, options)
+class TestReports(unittest.TestCase):
+    def test_default_jobs(self):
+        jobs = default_jobs('json', compression='gz', output_dir='out')
+        self.assertEqual(len(jobs), len(REPORT_FILES))
+        self.assertEqual(jobs[0], ('SQLQuery1.sql', os.path.join('out', 'SQLQuery1_result.json.gz'), 'json'))
+        self.assertEqual(default_jobs('csv')[3][1], 'SQLQuery4_result.csv')
+        with self.assertRaises(ValueError):
+            default_jobs('json', compression='zip')
+    def test_dispatch(self):
+        db = FakeDatabase()
+        self.assertEqual(run_report(db, 'a.sql', 'a.xml', 'xml').status, 0)
+        run_report(db, 'a.sql', 'a.ndjson', 'ndjson', pretty=False)
+        run_report(db, 'a.sql', 'a.csv', 'csv', part_size=100)
+        self.assertEqual(db.calls, [('xml', 'a.sql', {}), ('json:ndjson', 'a.sql', {'pretty': False}),
+                                    ('export:csv', 'a.sql', {'part_size': 100})])
+    def test_failures(self):
+        db = FakeDatabase()
+        result = run_report(db, 'broken.sql', 'b.xml', 'xml')
+        self.assertEqual((result.status, result.error), (1, 'ValueError: syntax error'))
+        result = run_report(db, 'empty.sql', 'e.xml', 'xml')
+        self.assertEqual(result.status, 1)
+        self.assertIn('empty.sql', result.error)
+    def test_run_reports(self):
+        db = FakeDatabase()
+        jobs = [(f'{i}.sql', f'{i}.json', 'json') for i in range(6)] + [('broken.sql', 'b.json', 'json')]
+        results = run_reports(db, jobs, max_workers=2)
+        self.assertEqual([result.input_file for result in results], [job[0] for job in jobs])
+        self.assertEqual([result.status for result in results], [0] * 6 + [1])
+        self.assertLessEqual(db.peak, 2)
+if __name__ == '__main__':
+    unittest.main()
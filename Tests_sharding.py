@@ -0,0 +1,60 @@
+import collections
+import threading
+import unittest
+from sharding import ShardAborted, load_shards, shard_function
+##Тесты параллельной загрузки по шардам, база данных не нужна.
+class TestSharding(unittest.TestCase):
+    def test_shard_function(self):
+        shard_of = shard_function('range', 4, block_size=10)
+        self.assertEqual([shard_of(row_id) for row_id in (0, 9, 10, 39, 40)], [0, 0, 1, 3, 0])
+        counts = collections.Counter(map(shard_function('hash', 4), range(4000)))
+        self.assertEqual(sorted(counts), [0, 1, 2, 3])
+        self.assertTrue(all(count > 800 for count in counts.values()))
+        with self.assertRaises(ValueError):
+            shard_function('random', 4)
+    def test_load(self):
+        loaded = collections.defaultdict(list)
+        lock = threading.Lock()
+        def load(shard, batches):
+            count = 0
+            for batch in batches:
+                self.assertLessEqual(len(batch), 7)
+                with lock:
+                    loaded[shard].extend(row[0] for row in batch)
+                count += len(batch)
+            return count
+        rows = [(row_id, 'x') for row_id in range(100)]
+        results = load_shards(rows, 3, load, method='range', batch_size=7, queue_depth=1)
+        self.assertEqual([result.status for result in results], [0, 0, 0])
+        self.assertEqual(sum(result.rows for result in results), 100)
+        self.assertEqual(sorted(row_id for ids in loaded.values() for row_id in ids), list(range(100)))
+        shard_of = shard_function('range', 3, 7)
+        self.assertTrue(all(shard_of(row_id) == shard for shard, ids in loaded.items() for row_id in ids))
+    def test_failed_shard(self):
+        def load(shard, batches):
+            for batch in batches:
+                if shard == 1:
+                    raise RuntimeError('deadlock')
+            return 0
+        results = load_shards(((row_id,) for row_id in range(1000)), 2, load, method='range', batch_size=10, queue_depth=1)
+        self.assertEqual([result.status for result in results], [0, 1])
+        self.assertEqual(results[1].error, 'RuntimeError: deadlock')
+    def test_input_error(self):
+        aborted = []
+        def load(shard, batches):
+            try:
+                for batch in batches:
+                    pass
+            except ShardAborted:
+                aborted.append(shard)
+                raise
+            return 0
+        def rows():
+            for row_id in range(50):
+                yield (row_id,)
+            raise ValueError('bad record')
+        with self.assertRaises(ValueError):
+            load_shards(rows(), 2, load, batch_size=10, queue_depth=1)
+        self.assertEqual(sorted(aborted), [0, 1])
+if __name__ == '__main__':
+    unittest.main()
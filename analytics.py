@@ -0,0 +1,269 @@
+import array
+import datetime
+import decimal
+import logging
+import os
+import numpy as np
+from json_stream import iter_json_records
+from exporters import JSON_FORMATS, export_batches, get_exporter
+
+logger = logging.getLogger(__name__)
+
+DIALECTS = ('postgres', 'mssql')
+
+# Column names as returned by each server for SQLQuery1.sql-SQLQuery4.sql.
+# Postgres folds unquoted aliases to lower case, SQL Server leaves COUNT(...) unnamed.
+REPORT_COLUMNS = {
+    'postgres': {
+        'SQLQuery1.sql': ['name', 'count'],
+        'SQLQuery2.sql': ['name', 'average_age'],
+        'SQLQuery3.sql': ['name', 'age_diff'],
+        'SQLQuery4.sql': ['name'],
+    },
+    'mssql': {
+        'SQLQuery1.sql': ['name', ''],
+        'SQLQuery2.sql': ['name', 'Average_Age'],
+        'SQLQuery3.sql': ['name', 'Age_diff'],
+        'SQLQuery4.sql': ['name'],
+    },
+}
+
+
+def pg_numeric_div(dividend, divisor):
+    """
+    Divide two non-negative integers the way Postgres divides numeric values.
+
+    The result scale follows select_div_scale() in numeric.c: at least 16
+    significant digits, rounded half away from zero. This is what AVG over
+    a numeric column returns.
+
+    Args:
+        dividend (int): Sum of the values.
+        divisor (int): Number of values, greater than zero.
+
+    Returns:
+        decimal.Decimal: Quotient with the scale Postgres would display.
+    """
+    def weight_and_first_digit(value):
+        weight = 0
+        while value >= 10000:
+            value //= 10000
+            weight += 1
+        return weight, value
+
+    weight1, first1 = weight_and_first_digit(dividend)
+    weight2, first2 = weight_and_first_digit(divisor)
+    qweight = weight1 - weight2
+    if first1 <= first2:
+        qweight -= 1
+    scale = min(max(16 - qweight * 4, 0), 1000)
+    context = decimal.Context(prec=len(str(dividend)) + scale + 2)
+    quotient = context.divide(decimal.Decimal(dividend), decimal.Decimal(divisor))
+    return quotient.quantize(decimal.Decimal(1).scaleb(-scale), rounding=decimal.ROUND_HALF_UP, context=context)
+
+
+class OfflineReports:
+    """
+    In-process engine for the four reports that reads rooms.json and students.json directly.
+
+    The input is decoded into NumPy columns once and every report is a
+    vectorized group-by over those columns, so no database load is needed.
+    The methods mirror MyDatabase, so the engine also works with run_reports.
+
+    Attributes:
+        dialect (str): 'postgres' or 'mssql', selects column names and age/average semantics.
+        today (datetime.date): Date used as CURRENT_DATE/GETDATE().
+        room_names (numpy.ndarray): Distinct room names, sorted.
+        room_counts (numpy.ndarray): Number of students per room name.
+        student_group (numpy.ndarray): Index into room_names for every student.
+        student_age (numpy.ndarray): Age of every student in years.
+        student_sex (numpy.ndarray): Code of the distinct sex value of every student.
+    """
+
+    def __init__(self, rooms_file, students_file, dialect='postgres', today=None):
+        """
+        Read the JSON inputs and build the columnar arrays.
+
+        Args:
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            dialect (str): 'postgres' or 'mssql'.
+            today (datetime.date): Date used as CURRENT_DATE, today by default.
+        """
+        if dialect not in DIALECTS:
+            raise ValueError(f"Неизвестный диалект: {dialect}")
+        self.dialect = dialect
+        self.today = today or datetime.date.today()
+
+        room_ids = array.array('q')
+        room_names = []
+        for room in iter_json_records(rooms_file):
+            room_ids.append(room['id'])
+            room_names.append(room['name'])
+        student_rooms = array.array('q')
+        years = array.array('q')
+        month_days = array.array('q')
+        sexes = []
+        for student in iter_json_records(students_file):
+            birthday = student['birthday']
+            student_rooms.append(student['room'])
+            years.append(int(birthday[:4]))
+            month_days.append(int(birthday[5:7]) * 100 + int(birthday[8:10]))
+            sexes.append(student['sex'])
+
+        ids = np.frombuffer(room_ids, dtype=np.int64)
+        self.room_names, room_group = np.unique(np.array(room_names, dtype=object), return_inverse=True)
+        order = np.argsort(ids, kind='stable')
+        sorted_ids = ids[order]
+        rooms = np.frombuffer(student_rooms, dtype=np.int64)
+        if len(ids):
+            position = np.minimum(np.searchsorted(sorted_ids, rooms), len(ids) - 1)
+            joined = sorted_ids[position] == rooms
+        else:
+            position = np.zeros(len(rooms), dtype=np.int64)
+            joined = np.zeros(len(rooms), dtype=bool)
+        if not joined.all():
+            logger.warning(f"Студентов без комнаты: {int(np.count_nonzero(~joined))}")
+        self.student_group = room_group.reshape(-1)[order][position[joined]]
+        years = np.frombuffer(years, dtype=np.int64)[joined]
+        month_days = np.frombuffer(month_days, dtype=np.int64)[joined]
+        # COUNT(DISTINCT sex) compares whole values, so any text is factorized to codes
+        self.student_sex = np.unique(np.array(sexes, dtype=object), return_inverse=True)[1].reshape(-1)[joined]
+        if dialect == 'postgres':
+            # EXTRACT(year FROM AGE(CURRENT_DATE, birthday)) counts completed years
+            today_month_day = self.today.month * 100 + self.today.day
+            self.student_age = self.today.year - years - (month_days > today_month_day)
+        else:
+            # DATEDIFF(year, birthday, GETDATE()) counts crossed year boundaries
+            self.student_age = self.today.year - years
+        self.room_counts = np.bincount(self.student_group, minlength=len(self.room_names))
+        logger.info(f"Загружено комнат: {len(ids)}, студентов: {len(self.student_group)}")
+
+    def _group_ranges(self):
+        """Return the students ordered by room name, the names present and where each one starts."""
+        order = np.argsort(self.student_group, kind='stable')
+        groups = self.student_group[order]
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if len(groups) else np.zeros(0, dtype=np.int64)
+        return order, groups[starts], starts
+
+    def students_per_room(self):
+        """SQLQuery1.sql: number of students in every room, rooms without students included."""
+        return [(str(name), int(count)) for name, count in zip(self.room_names, self.room_counts)]
+
+    def youngest_rooms(self):
+        """SQLQuery2.sql: five rooms with the lowest average age."""
+        sums = np.bincount(self.student_group, weights=self.student_age, minlength=len(self.room_names))
+        rows = []
+        for group in np.flatnonzero(self.room_counts):
+            total, count = int(round(sums[group])), int(self.room_counts[group])
+            if self.dialect == 'postgres':
+                average = pg_numeric_div(total, count)
+            else:
+                # AVG over INT truncates toward zero on SQL Server
+                average = total // count if total >= 0 else -(-total // count)
+            rows.append((str(self.room_names[group]), average))
+        rows.sort(key=lambda row: (row[1], row[0]))
+        return rows[:5]
+
+    def widest_age_spread(self):
+        """SQLQuery3.sql: five rooms with the largest difference between oldest and youngest student."""
+        order, groups, starts = self._group_ranges()
+        if not len(groups):
+            return []
+        ages = self.student_age[order]
+        spread = np.maximum.reduceat(ages, starts) - np.minimum.reduceat(ages, starts)
+        if self.dialect == 'postgres':
+            rows = [(str(self.room_names[g]), decimal.Decimal(int(d))) for g, d in zip(groups, spread)]
+        else:
+            rows = [(str(self.room_names[g]), int(d)) for g, d in zip(groups, spread)]
+        rows.sort(key=lambda row: (-row[1], row[0]))
+        return rows[:5]
+
+    def mixed_sex_rooms(self):
+        """SQLQuery4.sql: rooms with students of more than one sex."""
+        order, groups, starts = self._group_ranges()
+        if not len(groups):
+            return []
+        sexes = self.student_sex[order]
+        mixed = np.maximum.reduceat(sexes, starts) != np.minimum.reduceat(sexes, starts)
+        return [(str(self.room_names[g]),) for g in groups[mixed]]
+
+    def report(self, input_file):
+        """
+        Compute one of the SQLQuery1.sql-SQLQuery4.sql reports.
+
+        Args:
+            input_file (str): Path or name of the report query file.
+
+        Returns:
+            tuple: Column names and list of rows, as the database would return them.
+        """
+        name = os.path.basename(input_file)
+        reports = {
+            'SQLQuery1.sql': self.students_per_room,
+            'SQLQuery2.sql': self.youngest_rooms,
+            'SQLQuery3.sql': self.widest_age_spread,
+            'SQLQuery4.sql': self.mixed_sex_rooms,
+        }
+        if name not in reports:
+            raise ValueError(f"Нет офлайн-реализации для отчета {input_file}")
+        return REPORT_COLUMNS[self.dialect][name], reports[name]()
+
+    def execute_sql_query_json(self, input_file, output_file, output_format='json', pretty=True, part_size=None):
+        """
+        Compute a report and save it in JSON format, like MyDatabase.execute_sql_query_json.
+
+        Args:
+            input_file (str): Path or name of the report query file.
+            output_file (str): Path to the output JSON file, compressed if it ends in .gz or .zst.
+            output_format (str): 'json', 'ndjson' or 'legacy'.
+            pretty (bool): Pretty or compact JSON.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written.
+        """
+        if output_format not in JSON_FORMATS:
+            raise ValueError(f"Неизвестный формат: {output_format}")
+        return self.export_query(input_file, output_file, output_format, pretty, part_size)
+
+    def export_query(self, input_file, output_file, output_format='json', pretty=True, part_size=None):
+        """
+        Compute a report and save it with a registered exporter, like MyDatabase.export_query.
+
+        Args:
+            input_file (str): Path or name of the report query file.
+            output_file (str): Path to the output file, compressed if it ends in .gz or .zst.
+            output_format (str): Name of a registered exporter, e.g. 'json', 'csv' or 'parquet'.
+            pretty (bool): Pretty or compact output for formats that have both.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written.
+        """
+        exporter = get_exporter(output_format)
+        columns, rows = self.report(input_file)
+        export_batches(exporter, columns, [rows], output_file, input_file=input_file, pretty=pretty, part_size=part_size)
+        return 0
+
+    def query_processing(self, input_file, output_file, pretty=True, part_size=None):
+        """
+        Compute a report and save it in XML format, like MyDatabase.query_processing.
+
+        Args:
+            input_file (str): Path or name of the report query file.
+            output_file (str): Path to the output XML file, compressed if it ends in .gz or .zst.
+            pretty (bool): Indent the XML records.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if it has no rows.
+        """
+        columns, rows = self.report(input_file)
+        if not rows:
+            logger.critical("Не удалось выполнить запрос или получить результаты.")
+            return 1
+        export_batches(get_exporter('xml'), columns, [rows], output_file, input_file=input_file, pretty=pretty,
+                       part_size=part_size)
+        logger.info('Создан файл ' + output_file)
+        return 0
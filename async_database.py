@@ -0,0 +1,949 @@
+import asyncio
+import concurrent.futures
+import datetime
+import functools
+import logging
+import os
+import threading
+import time
+import asyncpg
+from catalog import QueryCatalog
+from exporters import FETCH_SIZE, JSON_FORMATS, export_batches, get_exporter, output_variant
+from incremental import HASH_TABLE, ROOM_COLUMNS, STUDENT_COLUMNS
+from json_stream import batched, iter_json_records
+from metrics import Metrics, TimedIterator
+from records import Quarantine, RecordDecoder
+from reports import ReportResult
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEPTH = 4
+_DONE = object()
+
+
+class _Failure:
+    """Queue item that carries an exception from one pipeline stage to the other."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def start_thread(function, *args):
+    """
+    Run a blocking pipeline stage on its own thread.
+
+    The stages block on the queue shared with the event loop, so they must
+    not take workers of the executor that the driver calls need; with a
+    small executor that would deadlock.
+
+    Args:
+        function (callable): Blocking function.
+        *args: Arguments of function.
+
+    Returns:
+        asyncio.Future: Result or exception of function.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(result, error):
+        if not future.done():
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def run():
+        try:
+            result = function(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, None, e)
+        else:
+            loop.call_soon_threadsafe(settle, result, None)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+async def feed(batches, consume, depth=QUEUE_DEPTH):
+    """
+    Run a blocking producer of batches in a thread and an async consumer on the event loop.
+
+    At most depth batches wait between the stages. When the queue is full the
+    producer thread blocks, so a slow server slows parsing down instead of
+    filling memory.
+
+    Args:
+        batches (iterable): Blocking iterable of batches, e.g. parsed rows of a JSON file.
+        consume (callable): Coroutine function awaited with every batch.
+        depth (int): Maximum number of batches waiting in the queue.
+
+    Returns:
+        int: Number of consumed batches.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(depth)
+    stopped = threading.Event()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        try:
+            for batch in batches:
+                if stopped.is_set():
+                    break
+                put(batch)
+        except Exception as e:
+            put(_Failure(e))
+        else:
+            put(_DONE)
+
+    producer = start_thread(produce)
+    count = 0
+    finished = False
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE or isinstance(item, _Failure):
+                finished = True
+                if isinstance(item, _Failure):
+                    raise item.error
+                return count
+            await consume(item)
+            count += 1
+    finally:
+        if not finished:
+            stopped.set()
+            while True:
+                item = await queue.get()
+                if item is _DONE or isinstance(item, _Failure):
+                    break
+        await producer
+
+
+async def _put(queue, item, writer):
+    put = asyncio.ensure_future(queue.put(item))
+    await asyncio.wait({put, writer}, return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        put.cancel()
+        writer.result()
+        raise RuntimeError("Запись отчета завершилась раньше времени")
+
+
+async def drain(batches, write, depth=QUEUE_DEPTH):
+    """
+    Run an async producer of batches on the event loop and a blocking writer in a thread.
+
+    Rows are fetched from the server while the previous batches are being
+    serialized; at most depth batches wait between the stages.
+
+    Args:
+        batches: Async iterator of batches, e.g. rows fetched from the server.
+        write (callable): Blocking function called with an iterator over the batches, e.g. a partial of write_json.
+        depth (int): Maximum number of batches waiting in the queue.
+
+    Returns:
+        Result of write.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(depth)
+
+    def iterate():
+        while True:
+            item = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+
+    writer = start_thread(write, iterate())
+    try:
+        async for batch in batches:
+            await _put(queue, batch, writer)
+        await _put(queue, _DONE, writer)
+    except BaseException as e:
+        if not writer.done():
+            await _put(queue, _Failure(e), writer)
+            await asyncio.wait({writer})
+            writer.exception()
+        raise
+    return await writer
+
+
+def report_writer(columns, input_file, output_file, output_format, pretty=True, part_size=None):
+    """
+    Return the blocking writer of a registered output format.
+
+    Args:
+        columns (list): List of column names.
+        input_file (str): Path to the file containing SQL queries.
+        output_file (str): Path to the output file.
+        output_format (str): Name of a registered exporter, e.g. 'xml', 'json' or 'csv'.
+        pretty (bool): Pretty or compact output for formats that have both.
+        part_size (int): Roll the output into parts of about part_size bytes, see exporters.export_batches.
+
+    Returns:
+        callable: Writer called with an iterator over chunks of rows.
+    """
+    return functools.partial(export_batches, get_exporter(output_format), columns, output_file=output_file,
+                             input_file=input_file, pretty=pretty, part_size=part_size)
+
+
+def student_record(row):
+    """
+    Convert a decoded student row to a row tuple for binary COPY.
+
+    Args:
+        row (tuple): Student row from RecordDecoder.students.
+
+    Returns:
+        tuple: Values in the order of STUDENT_COLUMNS with the birthday as datetime.
+    """
+    return row[:2] + (datetime.datetime.fromisoformat(row[2]),) + row[3:]
+
+
+async def run_report(db, input_file, output_file, output_format, **options):
+    """
+    Run one report on an async database of either backend.
+
+    Args:
+        db (AsyncMyDatabase or AsyncMSSQLDatabase): Database the report is run on.
+        input_file (str): Path to the file containing SQL queries.
+        output_file (str): Path to the output file.
+        output_format (str): Name of a registered exporter, e.g. 'xml', 'json' or 'csv'.
+        **options: pretty and part_size passed to the report method.
+
+    Returns:
+        ReportResult: Outcome of the job.
+    """
+    started = time.perf_counter()
+    error = None
+    try:
+        if output_format == 'xml':
+            status = await db.query_processing(input_file, output_file, **options)
+        elif output_format in JSON_FORMATS:
+            status = await db.execute_sql_query_json(input_file, output_file, output_format=output_format, **options)
+        else:
+            status = await db.export_query(input_file, output_file, output_format=output_format, **options)
+        if status:
+            error = f"Отчет {input_file} не создан, подробности в логе"
+    except Exception as e:
+        status, error = 1, f"{type(e).__name__}: {e}"
+    return ReportResult(input_file, output_file, output_format, status, error, time.perf_counter() - started)
+
+
+async def run_reports(db, jobs, **options):
+    """
+    Run independent reports concurrently, at most db.max_workers at a time.
+
+    Args:
+        db (AsyncMyDatabase or AsyncMSSQLDatabase): Database the reports are run on.
+        jobs (list): (sql file, output path, format) tuples.
+        **options: pretty and part_size passed to every report.
+
+    Returns:
+        list: ReportResult for every job, in the order of jobs.
+    """
+    started = time.perf_counter()
+    slots = asyncio.Semaphore(db.max_workers)
+
+    async def run(job):
+        async with slots:
+            return await run_report(db, *job, **options)
+
+    results = await asyncio.gather(*(run(job) for job in jobs))
+    failed = sum(1 for result in results if result.status)
+    logger.info(f"Отчетов: {len(results)}, с ошибками: {failed}, время: {time.perf_counter() - started:.2f} с")
+    for result in results:
+        if result.status:
+            logger.error(f"{result.input_file}: {result.error}")
+    return list(results)
+
+
+class AsyncMyDatabase:
+    """
+    Asyncio counterpart of the Postgres MyDatabase built on asyncpg.
+
+    Loads and reports run as pipelines: JSON parsing and file writing happen
+    in their own threads while COPY and fetches await the server, so one event
+    loop can run many loads and reports at once.
+
+    Attributes:
+        pool (asyncpg.Pool): Connection pool, set by open().
+        max_workers (int): Reports run_reports runs at the same time, one per pooled connection.
+        catalog (QueryCatalog): Parsed report files with their Postgres statements.
+        metrics (Metrics): Per-phase timings, row counts and bytes.
+        queue_depth (int): Maximum number of batches waiting between two pipeline stages.
+        executor: Executor for cache file operations, the loop default if None.
+    """
+
+    def __init__(self, port, server, database, username, password, pool_min_size=1, pool_max_size=10, cache=None,
+                 metrics=None, queue_depth=QUEUE_DEPTH, executor=None, quarantine_file=None):
+        """
+        Initialize the database; the pool is opened by open() or async with.
+
+        Args:
+            port (str): Port number.
+            server (str): Server name.
+            database (str): Database name.
+            username (str): Username.
+            password (str): Password.
+            pool_min_size (int): Number of connections kept open in the pool.
+            pool_max_size (int): Maximum number of connections open at the same time.
+            cache (ResultCache): Result cache for reports, None to always query the database.
+            metrics (Metrics): Collector of per-phase timings, a new one by default.
+            queue_depth (int): Maximum number of batches waiting between two pipeline stages.
+            executor: Executor for cache file operations, the loop default if None.
+            quarantine_file (str): NDJSON file collecting the records rejected by loads, None to only log them.
+        """
+        self.port = port
+        self.server = server
+        self.database = database
+        self.username = username
+        self.password = password
+        self.pool_min_size = pool_min_size
+        self.pool_max_size = pool_max_size
+        self.max_workers = pool_max_size
+        self.cache = cache
+        self.metrics = metrics or Metrics()
+        self.queue_depth = queue_depth
+        self.executor = executor
+        self.quarantine_file = quarantine_file
+        self.catalog = QueryCatalog('postgres')
+        self.cache_scope = f'postgres://{server}:{port}/{database}'
+        self.pool = None
+
+    async def __aenter__(self):
+        if await self.open():
+            raise ConnectionError("Ошибка при подключении к базе данных")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        """
+        Open the connection pool.
+
+        Returns:
+            int: 0 if connected, 1 if the server is not reachable.
+        """
+        try:
+            self.pool = await asyncpg.create_pool(host=self.server, port=int(self.port), database=self.database,
+                                                  user=self.username, password=self.password,
+                                                  min_size=self.pool_min_size, max_size=self.pool_max_size)
+        except (OSError, asyncpg.PostgresError) as e:
+            logger.critical(f"Ошибка при подключении к базе данных: {e}")
+            return 1
+        logger.info("Успешное подключение к базе данных")
+        return 0
+
+    async def close(self):
+        """Close the connection pool."""
+        if self.pool is not None:
+            await self.pool.close()
+        logger.info("Programm is finished!")
+
+    async def in_executor(self, function, *args):
+        """Run a blocking function in the executor and return its result."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def cache_key(self, sql, output_format):
+        """
+        Build the result cache key of a report for the current data version.
+
+        Returns:
+            str or None: Cache key, None if the result cache is disabled.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.key(sql, self.cache_scope, output_format, self.cache.data_version(self.cache_scope))
+
+    async def create_tables(self, summary=False):
+        """
+        Create necessary tables and the report index if they don't exist.
+
+        Args:
+            summary (bool): Create and fill the room_summary table.
+        """
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute('''CREATE TABLE IF NOT EXISTS rooms
+                                            (id INT PRIMARY KEY,
+                                            name VARCHAR(255))''')
+                await connection.execute('''CREATE TABLE IF NOT EXISTS students
+                                            (id INT PRIMARY KEY,
+                                            name VARCHAR(255),
+                                            birthday timestamp,
+                                            room INT,
+                                            sex CHAR(1),
+                                            FOREIGN KEY(room) REFERENCES rooms(id))''')
+                await connection.execute(f'''CREATE TABLE IF NOT EXISTS {HASH_TABLE}
+                                             (table_name VARCHAR(64),
+                                             id INT,
+                                             hash BIGINT,
+                                             PRIMARY KEY(table_name, id))''')
+                await connection.execute(
+                    "CREATE INDEX IF NOT EXISTS students_room_idx ON students (room) INCLUDE (birthday, sex)")
+                if summary:
+                    await connection.execute('''CREATE TABLE IF NOT EXISTS room_summary
+                                                (room_id INT PRIMARY KEY,
+                                                name VARCHAR(255),
+                                                student_count INT,
+                                                min_birth_year INT,
+                                                max_birth_year INT,
+                                                sum_birth_year BIGINT,
+                                                sex_count INT)''')
+                    await self.refresh_room_summary(connection)
+        logger.info('Таблицы созданы!')
+
+    async def refresh_room_summary(self, connection):
+        """
+        Rebuild the room_summary table from rooms and students if it exists.
+
+        Args:
+            connection (asyncpg.Connection): Connection inside the transaction of the load.
+
+        Returns:
+            bool: True if the summary was refreshed, False if the table does not exist.
+        """
+        if await connection.fetchval("SELECT to_regclass('room_summary')") is None:
+            return False
+        await connection.execute("DELETE FROM room_summary")
+        await connection.execute('''INSERT INTO room_summary
+                                      (room_id, name, student_count, min_birth_year, max_birth_year,
+                                       sum_birth_year, sex_count)
+                                    SELECT r.id, r.name, COUNT(s.id),
+                                           MIN(EXTRACT(year FROM s.birthday))::INT,
+                                           MAX(EXTRACT(year FROM s.birthday))::INT,
+                                           SUM(EXTRACT(year FROM s.birthday))::BIGINT,
+                                           COUNT(DISTINCT s.sex)
+                                    FROM rooms r LEFT JOIN students s ON r.id = s.room
+                                    GROUP BY r.id, r.name''')
+        logger.info('Таблица room_summary обновлена!')
+        return True
+
+    async def load_data_from_json(self, rooms_file, students_file, batch_size=10000) -> int:
+        """
+        Load data from JSON files with binary COPY, parsing the next batches while the current one is sent.
+
+        Args:
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            batch_size (int): Number of rows sent to the server per COPY.
+
+        Returns:
+            int: 0 if data loaded successfully, 1 if a file is not found or loading failed.
+        """
+        check_wrong_ways = 0
+        for path in (rooms_file, students_file):
+            if not os.path.isfile(path):
+                logger.error(f"Файл '{path}' не найден.")
+                check_wrong_ways = 1
+        if check_wrong_ways == 1:
+            return check_wrong_ways
+        decoder = RecordDecoder(Quarantine(self.quarantine_file))
+        async with self.pool.acquire() as connection:
+            transaction = connection.transaction()
+            await transaction.start()
+            try:
+                rooms = decoder.rooms(iter_json_records(rooms_file))
+                await self.copy_records(connection, 'rooms', ROOM_COLUMNS, rooms, batch_size)
+                logger.info('Данные по комнатам занесены!')
+                students = map(student_record, decoder.students(iter_json_records(students_file)))
+                await self.copy_records(connection, 'students', STUDENT_COLUMNS, students, batch_size)
+                logger.info('Данные по студентам занесены!')
+                await self.refresh_room_summary(connection)
+            except (asyncpg.PostgresError, ValueError) as e:
+                logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
+                await transaction.rollback()
+                return 1
+            with self.metrics.phase('commit', 'load'):
+                await transaction.commit()
+        if self.cache is not None:
+            await self.in_executor(self.cache.bump_version, self.cache_scope)
+        return 0
+
+    async def copy_records(self, connection, table, columns, rows, batch_size=10000) -> int:
+        """
+        Copy rows into a table in batches; parsing runs in a thread ahead of the COPY calls.
+
+        Args:
+            connection (asyncpg.Connection): Connection inside the transaction of the load.
+            table (str): Target table name.
+            columns (tuple): Target column names.
+            rows (iterable): Tuples of values in the order of columns.
+            batch_size (int): Number of rows sent to the server per COPY.
+
+        Returns:
+            int: Number of copied rows.
+        """
+        source = TimedIterator(batched(rows, batch_size))
+        started = time.perf_counter()
+        counters = {'rows': 0, 'seconds': 0.0}
+
+        async def copy(batch):
+            copy_started = time.perf_counter()
+            await connection.copy_records_to_table(table, records=batch, columns=columns)
+            counters['seconds'] += time.perf_counter() - copy_started
+            counters['rows'] += len(batch)
+
+        await feed(source, copy, self.queue_depth)
+        elapsed = time.perf_counter() - started
+        total = counters['rows']
+        self.metrics.record('parse', table, source.seconds, source.rows)
+        self.metrics.record('insert', table, counters['seconds'], total)
+        rate = total / elapsed if elapsed > 0 else float(total)
+        logger.info(f"{table}: {total} строк за {elapsed:.2f} с ({rate:.0f} строк/с)")
+        return total
+
+    async def execute_sql_query_json(self, input_file, output_file, output_format='json', chunk_size=FETCH_SIZE,
+                                     pretty=True, part_size=None):
+        """
+        Execute SQL queries from input file and save results to output file in JSON format.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            output_file (str): Path to the output JSON file.
+            output_format (str): 'json', 'ndjson' or 'legacy'.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact output for formats that have both.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed.
+        """
+        if output_format not in JSON_FORMATS:
+            raise ValueError(f"Неизвестный формат: {output_format}")
+        return await self.report(input_file, output_file, output_format, chunk_size, pretty, part_size)
+
+    async def export_query(self, input_file, output_file, output_format='json', chunk_size=FETCH_SIZE, pretty=True,
+                           part_size=None):
+        """
+        Execute SQL queries from input file and save results with a registered exporter.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            output_file (str): Path to the output file.
+            output_format (str): Name of a registered exporter, e.g. 'json', 'csv' or 'parquet'.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact output for formats that have both.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed.
+        """
+        get_exporter(output_format)
+        return await self.report(input_file, output_file, output_format, chunk_size, pretty, part_size)
+
+    async def query_processing(self, input_file, output_file, chunk_size=FETCH_SIZE, pretty=True, part_size=None):
+        """
+        Execute SQL queries from input file and save results to output file in XML format.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            output_file (str): Path to the output XML file.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact output for formats that have both.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed or returned no rows.
+        """
+        return await self.report(input_file, output_file, 'xml', chunk_size, pretty, part_size)
+
+    async def report(self, input_file, output_file, output_format, chunk_size=FETCH_SIZE, pretty=True,
+                     part_size=None):
+        """
+        Run a catalogued report and stream its rows to a writer thread.
+
+        The statement is prepared on the connection (asyncpg keeps it in its
+        statement cache) and read through a cursor, so the next chunk is
+        fetched while the previous one is being written.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            output_file (str): Path to the output file.
+            output_format (str): Name of a registered exporter, e.g. 'xml', 'json' or 'csv'.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact output for formats that have both.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed or an XML report has no rows.
+        """
+        sql = self.catalog.get(input_file)
+        key = None if part_size else self.cache_key(sql, output_variant(output_format, output_file, pretty))
+        if key and await self.in_executor(self.cache.get, key, output_file):
+            logger.info('Файл ' + output_file + ' взят из кэша')
+            return 0
+        started = time.perf_counter()
+        async with self.pool.acquire() as connection:
+            try:
+                async with connection.transaction():
+                    statement = await connection.prepare(sql)
+                    cursor = await statement.cursor()
+                    rows = await cursor.fetch(chunk_size)
+                    seconds = time.perf_counter() - started
+                    self.metrics.record('execute', input_file, seconds, len(rows))
+                    if self.metrics.is_slow(seconds):
+                        self.metrics.slow_query(input_file, sql, seconds, await self.explain(sql, connection))
+                    if output_format == 'xml' and not rows:
+                        logger.critical("Не удалось выполнить запрос или получить результаты.")
+                        return 1
+                    columns = [attribute.name for attribute in statement.get_attributes()]
+                    write = report_writer(columns, input_file, output_file, output_format, pretty, part_size)
+                    count = await drain(self.fetch_batches(cursor, rows, chunk_size), write, self.queue_depth)
+            except asyncpg.PostgresError as e:
+                logger.critical(f"Ошибка выполнения запроса: {output_file}\n{e}\n\n")
+                return 1
+        self.metrics.record('report', input_file, time.perf_counter() - started, count,
+                            os.path.getsize(output_file) if os.path.exists(output_file) else 0)
+        logger.info('Создан файл ' + output_file)
+        if key:
+            await self.in_executor(self.cache.put, key, output_file)
+        return 0
+
+    async def fetch_batches(self, cursor, rows, size):
+        """
+        Yield the first chunk and then the rest of a cursor in chunks of size rows.
+
+        Yields:
+            list: Next chunk of rows as tuples.
+        """
+        while rows:
+            yield [tuple(row) for row in rows]
+            rows = await cursor.fetch(size)
+
+    async def explain(self, sql, connection):
+        """
+        Return the EXPLAIN plan of a query, run in a savepoint of the report transaction.
+
+        Returns:
+            str or None: Plan text, None if EXPLAIN failed.
+        """
+        try:
+            async with connection.transaction():
+                plan = await connection.fetch('EXPLAIN ' + sql)
+        except asyncpg.PostgresError as e:
+            logger.error(f"Не удалось получить план запроса: {e}")
+            return None
+        return '\n'.join(row[0] for row in plan)
+
+    async def run_reports(self, jobs, **options):
+        """
+        Run several reports concurrently.
+
+        Args:
+            jobs (list): (sql file, output path, format) tuples.
+            **options: pretty and part_size passed to every report.
+
+        Returns:
+            list: ReportResult for every job, in the order of jobs.
+        """
+        return await run_reports(self, jobs, **options)
+
+
+class AsyncMSSQLDatabase:
+    """
+    Asyncio wrapper of the MS SQL MyDatabase.
+
+    pyodbc has no async API, so every driver call runs in the executor. Loads
+    and reports still run as pipelines: parsing, inserts, fetches and file
+    writing are separate stages connected by bounded queues, and parsing and
+    writing run on their own threads. A load or report holds a pooled
+    connection and one executor worker at a time, so at most max_workers of
+    them run at once; the remaining worker serves open, close and the cache.
+
+    Attributes:
+        db (MyDatabase): Wrapped synchronous database, set by open().
+        metrics (Metrics): Per-phase timings, row counts and bytes, shared with db.
+        queue_depth (int): Maximum number of batches waiting between two pipeline stages.
+        executor (concurrent.futures.ThreadPoolExecutor): Executor for driver calls.
+        max_workers (int): Loads and reports holding a connection at the same time.
+    """
+
+    def __init__(self, port, server, database, username, password, pool_min_size=1, pool_max_size=5, cache=None,
+                 metrics=None, queue_depth=QUEUE_DEPTH, executor=None, quarantine_file=None):
+        """
+        Initialize the database; connections are opened by open() or async with.
+
+        Args:
+            port (str): Port number.
+            server (str): Server name.
+            database (str): Database name.
+            username (str): Username.
+            password (str): Password.
+            pool_min_size (int): Number of connections kept open in the pool.
+            pool_max_size (int): Maximum number of connections open at the same time.
+            cache (ResultCache): Result cache for reports, None to always query the database.
+            metrics (Metrics): Collector of per-phase timings, a new one by default.
+            queue_depth (int): Maximum number of batches waiting between two pipeline stages.
+            executor (concurrent.futures.ThreadPoolExecutor): Executor for driver calls, a new one with
+                pool_max_size + 1 workers by default.
+            quarantine_file (str): NDJSON file collecting the records rejected by loads, None to only log them.
+        """
+        self.settings = (port, server, database, username, password, pool_min_size, pool_max_size, cache)
+        self.quarantine_file = quarantine_file
+        self.metrics = metrics or Metrics()
+        self.queue_depth = queue_depth
+        self.own_executor = executor is None
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor(pool_max_size + 1,
+                                                                          thread_name_prefix='mssql')
+        workers = getattr(self.executor, '_max_workers', pool_max_size + 1)
+        self.max_workers = max(1, min(pool_max_size - 1, workers - 1))
+        self.slots = None
+        self.db = None
+        self.driver_error = None
+
+    async def __aenter__(self):
+        if await self.open():
+            raise ConnectionError("Ошибка при подключении к базе данных")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def in_executor(self, function, *args):
+        """Run a blocking function in the executor and return its result."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def open(self):
+        """
+        Create the wrapped MyDatabase and its connection pool.
+
+        Returns:
+            int: 0 if connected, 1 if the server is not reachable.
+        """
+        import Task_1_MSSMS
+        self.driver_error = Task_1_MSSMS.pyodbc.Error
+        self.slots = asyncio.Semaphore(self.max_workers)
+        self.db = await self.in_executor(functools.partial(Task_1_MSSMS.MyDatabase, *self.settings,
+                                                           metrics=self.metrics,
+                                                           quarantine_file=self.quarantine_file))
+        return 0 if getattr(self.db, 'conn', None) else 1
+
+    async def close(self):
+        """Return the main connection, close the pool and stop the executor created for this database."""
+        if getattr(self.db, 'conn', None):
+            await self.in_executor(self.db.close)
+        if self.own_executor:
+            self.executor.shutdown(wait=False)
+
+    async def create_tables(self, summary=False):
+        """
+        Create necessary tables if they don't exist.
+
+        Args:
+            summary (bool): Create and fill the room_summary table.
+        """
+        await self.in_executor(self.db.create_tables, summary)
+
+    async def load_data_from_json(self, rooms_file, students_file, batch_size=10000) -> int:
+        """
+        Load data from JSON files with fast_executemany, parsing the next batches while the current one is sent.
+
+        Args:
+            rooms_file (str): Path to the JSON or NDJSON file containing rooms data.
+            students_file (str): Path to the JSON or NDJSON file containing students data.
+            batch_size (int): Number of rows sent to the server per batch.
+
+        Returns:
+            int: 0 if data loaded successfully, 1 if a file is not found or loading failed.
+        """
+        check_wrong_ways = 0
+        for path in (rooms_file, students_file):
+            if not os.path.isfile(path):
+                logger.error(f"Файл '{path}' не найден.")
+                check_wrong_ways = 1
+        if check_wrong_ways == 1:
+            return check_wrong_ways
+        decoder = self.db.record_decoder()
+        async with self.slots:
+            conn = await self.in_executor(self.db.pool.checkout)
+            try:
+                cursor = conn.cursor()
+                cursor.fast_executemany = True
+                try:
+                    rooms = decoder.rooms(iter_json_records(rooms_file))
+                    await self.insert_rows(cursor, 'rooms', ROOM_COLUMNS, rooms, batch_size)
+                    logger.info('Данные по комнатам занесены!')
+                    students = decoder.students(iter_json_records(students_file))
+                    await self.insert_rows(cursor, 'students', STUDENT_COLUMNS, students, batch_size)
+                    logger.info('Данные по студентам занесены!')
+                    await self.in_executor(self.db.refresh_room_summary, cursor)
+                except (self.driver_error, ValueError) as e:
+                    logger.critical(f"Ошибка при заносе данных в базу данных: {e}")
+                    await self.in_executor(conn.rollback)
+                    return 1
+                with self.metrics.phase('commit', 'load'):
+                    await self.in_executor(conn.commit)
+            finally:
+                await self.in_executor(self.db.pool.checkin, conn)
+        await self.in_executor(self.db.bump_data_version)
+        return 0
+
+    async def insert_rows(self, cursor, table, columns, rows, batch_size=10000) -> int:
+        """
+        Insert rows into a table in batches; parsing runs in a thread ahead of the executemany calls.
+
+        Args:
+            cursor: Cursor object with fast_executemany enabled.
+            table (str): Target table name.
+            columns (tuple): Target column names.
+            rows (iterable): Tuples of values in the order of columns.
+            batch_size (int): Number of rows sent to the server per batch.
+
+        Returns:
+            int: Number of inserted rows.
+        """
+        statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        source = TimedIterator(batched(rows, batch_size))
+        started = time.perf_counter()
+        counters = {'rows': 0, 'seconds': 0.0}
+
+        async def insert(batch):
+            insert_started = time.perf_counter()
+            await self.in_executor(cursor.executemany, statement, batch)
+            counters['seconds'] += time.perf_counter() - insert_started
+            counters['rows'] += len(batch)
+
+        await feed(source, insert, self.queue_depth)
+        elapsed = time.perf_counter() - started
+        total = counters['rows']
+        self.metrics.record('parse', table, source.seconds, source.rows)
+        self.metrics.record('insert', table, counters['seconds'], total)
+        rate = total / elapsed if elapsed > 0 else float(total)
+        logger.info(f"{table}: {total} строк за {elapsed:.2f} с ({rate:.0f} строк/с)")
+        return total
+
+    async def execute_sql_query_json(self, input_file, output_file, output_format='json', chunk_size=FETCH_SIZE,
+                                     pretty=True, part_size=None):
+        """
+        Execute SQL queries from input file and save results to output file in JSON format.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            output_file (str): Path to the output JSON file.
+            output_format (str): 'json', 'ndjson' or 'legacy'.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact output for formats that have both.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed.
+        """
+        if output_format not in JSON_FORMATS:
+            raise ValueError(f"Неизвестный формат: {output_format}")
+        return await self.report(input_file, output_file, output_format, chunk_size, pretty, part_size)
+
+    async def export_query(self, input_file, output_file, output_format='json', chunk_size=FETCH_SIZE, pretty=True,
+                           part_size=None):
+        """
+        Execute SQL queries from input file and save results with a registered exporter.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            output_file (str): Path to the output file.
+            output_format (str): Name of a registered exporter, e.g. 'json', 'csv' or 'parquet'.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact output for formats that have both.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed.
+        """
+        get_exporter(output_format)
+        return await self.report(input_file, output_file, output_format, chunk_size, pretty, part_size)
+
+    async def query_processing(self, input_file, output_file, chunk_size=FETCH_SIZE, pretty=True, part_size=None):
+        """
+        Execute SQL queries from input file and save results to output file in XML format.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            output_file (str): Path to the output XML file.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact output for formats that have both.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed or returned no rows.
+        """
+        return await self.report(input_file, output_file, 'xml', chunk_size, pretty, part_size)
+
+    async def report(self, input_file, output_file, output_format, chunk_size=FETCH_SIZE, pretty=True,
+                     part_size=None):
+        """
+        Run a catalogued report on a pooled connection and stream its rows to a writer thread.
+
+        Args:
+            input_file (str): Path to the file containing SQL queries.
+            output_file (str): Path to the output file.
+            output_format (str): Name of a registered exporter, e.g. 'xml', 'json' or 'csv'.
+            chunk_size (int): Number of rows fetched from the server at a time.
+            pretty (bool): Pretty or compact output for formats that have both.
+            part_size (int): Roll the output into parts of about part_size bytes with a manifest.
+
+        Returns:
+            int: 0 if the report was written, 1 if the query failed or an XML report has no rows.
+        """
+        sql = self.db.catalog.get(input_file)
+        key = None if part_size else self.db.cache_key(sql, output_variant(output_format, output_file, pretty))
+        if key and await self.in_executor(self.db.cache.get, key, output_file):
+            logger.info('Файл ' + output_file + ' взят из кэша')
+            return 0
+        started = time.perf_counter()
+        async with self.slots:
+            conn = await self.in_executor(self.db.pool.checkout)
+            try:
+                cursor = conn.cursor()
+                await self.in_executor(cursor.execute, sql)
+                await self.in_executor(self.db.record_execute, input_file, sql, time.perf_counter() - started)
+                if not cursor.description:
+                    logger.critical(f"Запрос не вернул результатов: {input_file}")
+                    return 1
+                columns = [column[0] for column in cursor.description]
+                rows = await self.in_executor(cursor.fetchmany, chunk_size)
+                if output_format == 'xml' and not rows:
+                    logger.critical("Не удалось выполнить запрос или получить результаты.")
+                    return 1
+                write = report_writer(columns, input_file, output_file, output_format, pretty, part_size)
+                count = await drain(self.fetch_batches(cursor, rows, chunk_size), write, self.queue_depth)
+            except self.driver_error as e:
+                logger.critical(f"Ошибка выполнения запроса: {output_file}\n{e}\n\n")
+                return 1
+            finally:
+                await self.in_executor(self.db.pool.checkin, conn)
+        self.metrics.record('report', input_file, time.perf_counter() - started, count,
+                            os.path.getsize(output_file) if os.path.exists(output_file) else 0)
+        logger.info('Создан файл ' + output_file)
+        if key:
+            await self.in_executor(self.db.cache.put, key, output_file)
+        return 0
+
+    async def fetch_batches(self, cursor, rows, size):
+        """
+        Yield the first chunk and then the rest of a cursor in chunks of size rows.
+
+        Yields:
+            list: Next chunk of rows.
+        """
+        while rows:
+            yield rows
+            rows = await self.in_executor(cursor.fetchmany, size)
+
+    async def run_reports(self, jobs, **options):
+        """
+        Run several reports concurrently.
+
+        Args:
+            jobs (list): (sql file, output path, format) tuples.
+            **options: pretty and part_size passed to every report.
+
+        Returns:
+            list: ReportResult for every job, in the order of jobs.
+        """
+        return await run_reports(self, jobs, **options)
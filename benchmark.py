@@ -0,0 +1,323 @@
+import argparse
+import configparser
+import datetime
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+from json_stream import batched, iter_json_records
+from incremental import ROOM_COLUMNS, STUDENT_COLUMNS, room_row, student_row
+from exporters import FETCH_SIZE, JSON_FORMATS, fetch_batches, get_exporter, write_xml
+from reports import REPORT_FILES
+
+logger = logging.getLogger(__name__)
+
+FIRST_NAMES = ('Anna', 'Boris', 'Daria', 'Egor', 'Ivan', 'Maria', 'Nikita', 'Olga', 'Pavel', 'Sofia')
+LAST_NAMES = ('Ivanov', 'Petrov', 'Sidorov', 'Smirnov', 'Kuznetsov', 'Popov', 'Volkov', 'Orlov')
+
+# SQLite has no AGE/DATEDIFF, so the stand-in runs equivalents of the Postgres queries.
+SQLITE_AGE = ("(CAST(strftime('%Y', 'now') AS INT) - CAST(strftime('%Y', s.birthday) AS INT)"
+              " - (strftime('%m-%d', 'now') < strftime('%m-%d', s.birthday)))")
+SQLITE_QUERIES = {
+    'SQLQuery1.sql': '''SELECT r.name, COUNT(s.id) AS count
+                        FROM rooms r LEFT JOIN students s ON r.id = s.room
+                        GROUP BY r.name''',
+    'SQLQuery2.sql': f'''SELECT r.name, AVG({SQLITE_AGE}) AS average_age
+                         FROM rooms r JOIN students s ON r.id = s.room
+                         GROUP BY r.name
+                         ORDER BY average_age
+                         LIMIT 5''',
+    'SQLQuery3.sql': f'''SELECT r.name, MAX({SQLITE_AGE}) - MIN({SQLITE_AGE}) AS age_diff
+                         FROM rooms r JOIN students s ON r.id = s.room
+                         GROUP BY r.name
+                         ORDER BY age_diff DESC
+                         LIMIT 5''',
+    'SQLQuery4.sql': '''SELECT DISTINCT r.name
+                        FROM rooms r JOIN students s ON r.id = s.room
+                        GROUP BY r.name
+                        HAVING COUNT(DISTINCT s.sex) > 1''',
+}
+
+
+def generate_data(directory, students, rooms=None, seed=0):
+    """
+    Write synthetic rooms.json and students.json in the format of the real dumps.
+
+    Ages follow a normal distribution around 21 years clipped to 16-45,
+    birthdays are uniform over the year and the sexes are split about evenly.
+    Files are written record by record, so 10M students need no extra memory.
+
+    Args:
+        directory (str): Directory for the generated files.
+        students (int): Number of students.
+        rooms (int): Number of rooms, students // 10 by default.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        tuple: Paths to rooms.json and students.json.
+    """
+    rng = random.Random(seed)
+    rooms = rooms or max(1, students // 10)
+    rooms_file = os.path.join(directory, 'rooms.json')
+    students_file = os.path.join(directory, 'students.json')
+    with open(rooms_file, 'w') as f:
+        f.write('[')
+        for room_id in range(rooms):
+            f.write((',\n' if room_id else '\n') + json.dumps({'id': room_id, 'name': f'Room #{room_id}'}))
+        f.write('\n]\n')
+    today = datetime.date.today()
+    with open(students_file, 'w') as f:
+        f.write('[')
+        for student_id in range(students):
+            age = min(max(rng.gauss(21, 3), 16), 45)
+            birthday = today - datetime.timedelta(days=int(age * 365.25))
+            student = {
+                'birthday': birthday.strftime('%Y-%m-%dT00:00:00.000000'),
+                'id': student_id,
+                'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                'room': rng.randrange(rooms),
+                'sex': 'M' if rng.random() < 0.5 else 'F',
+            }
+            f.write((',\n' if student_id else '\n') + json.dumps(student))
+        f.write('\n]\n')
+    return rooms_file, students_file
+
+
+class SQLiteDatabase:
+    """
+    Embedded SQLite stand-in for MyDatabase used when no server is available.
+
+    Implements the methods the benchmark times with the same signatures and
+    return codes. Reports run SQLite versions of the Postgres queries.
+
+    Attributes:
+        path (str): Path to the SQLite database file.
+        connection: sqlite3 connection object.
+    """
+
+    def __init__(self, path):
+        """
+        Open the SQLite database.
+
+        Args:
+            path (str): Path to the SQLite database file.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+    def reset(self):
+        """Drop all benchmark tables."""
+        self.connection.executescript('DROP TABLE IF EXISTS students; DROP TABLE IF EXISTS rooms;')
+
+    def create_tables(self, summary=False):
+        """Create rooms and students with the same columns and index as the servers."""
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS rooms (id INT PRIMARY KEY, name VARCHAR(255));
+            CREATE TABLE IF NOT EXISTS students (id INT PRIMARY KEY, name VARCHAR(255), birthday TIMESTAMP,
+                                                 room INT, sex CHAR(1), FOREIGN KEY(room) REFERENCES rooms(id));
+            CREATE INDEX IF NOT EXISTS students_room_idx ON students (room, birthday, sex);''')
+
+    def load_data_from_json(self, rooms_file, students_file, bulk=False, batch_size=10000) -> int:
+        """
+        Load data from JSON files with batched executemany.
+
+        Returns:
+            int: 0 if data loaded successfully.
+        """
+        for table, columns, rows in (('rooms', ROOM_COLUMNS, map(room_row, iter_json_records(rooms_file))),
+                                     ('students', STUDENT_COLUMNS, map(student_row, iter_json_records(students_file)))):
+            statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            for batch in batched(rows, batch_size if bulk else 1):
+                self.connection.executemany(statement, batch)
+        self.connection.commit()
+        return 0
+
+    def execute_sql_query_json(self, input_file, output_file, output_format='json', chunk_size=FETCH_SIZE):
+        """
+        Run the SQLite version of a report and save it in JSON format.
+
+        Returns:
+            int: 0 if the report was written.
+        """
+        if output_format not in JSON_FORMATS:
+            raise ValueError(f"Неизвестный формат: {output_format}")
+        return self.export_query(input_file, output_file, output_format, chunk_size)
+
+    def export_query(self, input_file, output_file, output_format='json', chunk_size=FETCH_SIZE):
+        """
+        Run the SQLite version of a report and save it with a registered exporter.
+
+        Returns:
+            int: 0 if the report was written.
+        """
+        exporter = get_exporter(output_format)
+        cursor = self.connection.execute(SQLITE_QUERIES[os.path.basename(input_file)])
+        columns = [column[0] for column in cursor.description]
+        exporter.write(columns, fetch_batches(cursor, chunk_size), output_file, input_file=input_file)
+        return 0
+
+    def query_processing(self, input_file, output_file, chunk_size=FETCH_SIZE):
+        """
+        Run the SQLite version of a report and save it in XML format.
+
+        Returns:
+            int: 0 if the report was written, 1 if it has no rows.
+        """
+        cursor = self.connection.execute(SQLITE_QUERIES[os.path.basename(input_file)])
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return 1
+        write_xml(columns, itertools.chain([rows], fetch_batches(cursor, chunk_size)), output_file)
+        return 0
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
+
+
+def open_postgres(config_file, pool_max_size=5):
+    """
+    Connect to Postgres with the Task_1 section of config.ini.
+
+    Args:
+        config_file (str): Path to config.ini.
+        pool_max_size (int): Maximum number of pooled connections.
+
+    Returns:
+        MyDatabase: Connected Postgres database.
+    """
+    from Task_1_postgres import MyDatabase
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    section = config['Task_1']
+    return MyDatabase(section['Port'], section['Server'], section['Database'], section['Username'], section['Password'],
+                      pool_max_size=pool_max_size)
+
+
+def reset_tables(db):
+    """Drop all tables created by create_tables so every scale starts empty."""
+    if isinstance(db, SQLiteDatabase):
+        db.reset()
+    else:
+        connection = db.conn if hasattr(db, 'conn') else db.connection
+        cursor = connection.cursor()
+        cursor.execute('DROP TABLE IF EXISTS room_summary, row_hashes, students, rooms')
+        connection.commit()
+
+
+def timed(function, *args, **kwargs):
+    """
+    Call a function and measure its wall time.
+
+    Returns:
+        tuple: Result of the call and elapsed seconds.
+    """
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def run_scale(db, students, directory, formats, bulk=True, seed=0, workers=1):
+    """
+    Generate data of one scale, load it and time every report in every format.
+
+    Args:
+        db: MyDatabase or SQLiteDatabase.
+        students (int): Number of generated students.
+        directory (str): Working directory for data and report files.
+        formats (list): Names of registered exporters, e.g. 'xml', 'json', 'csv' or 'parquet'.
+        bulk (bool): Use the bulk load path.
+        seed (int): Seed of the data generator.
+        workers (int): Number of parallel load connections, 1 for a single connection.
+
+    Returns:
+        dict: Timings of the scale.
+    """
+    (rooms_file, students_file), generate_s = timed(generate_data, directory, students, seed=seed)
+    reset_tables(db)
+    _, create_s = timed(db.create_tables)
+    load_options = {'workers': workers} if workers > 1 else {}
+    status, load_s = timed(db.load_data_from_json, rooms_file, students_file, bulk=bulk, **load_options)
+    result = {
+        'students': students,
+        'rooms': max(1, students // 10),
+        'input_bytes': os.path.getsize(rooms_file) + os.path.getsize(students_file),
+        'generate_s': generate_s,
+        'create_tables_s': create_s,
+        'load_s': load_s,
+        'load_workers': workers,
+        'load_status': status,
+        'load_rows_per_s': students / load_s if load_s > 0 else None,
+        'reports': [],
+    }
+    for output_format in formats:
+        for input_file in REPORT_FILES:
+            output_file = os.path.join(directory, input_file.replace('.sql', '_result.' + output_format))
+            if output_format == 'xml':
+                status, seconds = timed(db.query_processing, input_file, output_file)
+            elif output_format in JSON_FORMATS:
+                status, seconds = timed(db.execute_sql_query_json, input_file, output_file, output_format=output_format)
+            else:
+                status, seconds = timed(db.export_query, input_file, output_file, output_format=output_format)
+            result['reports'].append({
+                'query': input_file,
+                'format': output_format,
+                'seconds': seconds,
+                'status': status,
+                'output_bytes': os.path.getsize(output_file) if os.path.exists(output_file) else 0,
+            })
+    logger.info(f"{students} студентов: загрузка {load_s:.2f} с, отчеты "
+                f"{sum(report['seconds'] for report in result['reports']):.2f} с")
+    return result
+
+
+def main(argv=None):
+    """Parse the command line, run the benchmark and write the results file."""
+    parser = argparse.ArgumentParser(description='Benchmark of loading and reporting on synthetic data.')
+    parser.add_argument('--backend', choices=('sqlite', 'postgres'), default='sqlite')
+    parser.add_argument('--scales', default='1000,10000,100000',
+                        help='comma-separated numbers of students, e.g. 1000,1000000,10000000')
+    parser.add_argument('--formats', default='json,ndjson,xml')
+    parser.add_argument('--row-load', action='store_true', help='time the row-by-row load instead of bulk')
+    parser.add_argument('--workers', type=int, default=1, help='parallel load connections (postgres only)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--config', default='config.ini')
+    parser.add_argument('--workdir', default=None, help='directory for generated data, temporary by default')
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args(argv)
+    if args.workers > 1 and args.backend != 'postgres':
+        parser.error('--workers requires --backend postgres')
+
+    with tempfile.TemporaryDirectory() as temporary:
+        directory = args.workdir or temporary
+        os.makedirs(directory, exist_ok=True)
+        if args.backend == 'sqlite':
+            db = SQLiteDatabase(os.path.join(directory, 'benchmark.sqlite3'))
+        else:
+            db = open_postgres(args.config, pool_max_size=max(5, args.workers + 1))
+        results = {
+            'started': datetime.datetime.now().isoformat(timespec='seconds'),
+            'backend': args.backend,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'bulk': not args.row_load,
+            'runs': [run_scale(db, int(scale), directory, args.formats.split(','), not args.row_load, args.seed,
+                               args.workers)
+                     for scale in args.scales.split(',')],
+        }
+        db.close()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
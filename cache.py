@@ -0,0 +1,179 @@
+import datetime
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Functions whose value changes from day to day; reports using them are keyed by the date as well.
+CURRENT_DATE_PATTERN = re.compile(r'\b(current_date|current_timestamp|now|getdate|sysdatetime|getutcdate)\b', re.IGNORECASE)
+
+
+class ResultCache:
+    """
+    On-disk cache of rendered report files.
+
+    An entry is keyed by the SQL text, the database scope, the output format
+    and the data version of the database. load_data_from_json bumps the data
+    version, so every entry written before a load stops matching. Reports
+    calling CURRENT_DATE, GETDATE() and the like are also keyed by the date,
+    so they are computed again after midnight. The modification
+    time of an entry is its creation time and bounds its age by ttl; the
+    access time is moved on every hit and orders the eviction.
+
+    Attributes:
+        directory (str): Directory holding the cached files.
+        max_bytes (int): Total size of cached files kept after eviction.
+        ttl (float): Seconds an entry stays valid, None for no limit.
+    """
+
+    def __init__(self, directory='.report_cache', max_bytes=512 * 1024 * 1024, ttl=24 * 60 * 60):
+        """
+        Initialize the cache and create its directories.
+
+        Args:
+            directory (str): Directory holding the cached files.
+            max_bytes (int): Total size of cached files kept after eviction.
+            ttl (float): Seconds an entry stays valid, None for no limit.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = os.path.join(directory, 'entries')
+        self._versions = os.path.join(directory, 'versions')
+        self._lock = threading.Lock()
+        os.makedirs(self._entries, exist_ok=True)
+        os.makedirs(self._versions, exist_ok=True)
+
+    def _version_file(self, scope):
+        return os.path.join(self._versions, hashlib.sha256(scope.encode('utf-8')).hexdigest())
+
+    def data_version(self, scope):
+        """
+        Return the current data version of a database.
+
+        Args:
+            scope (str): Identifier of the database, e.g. postgres://server:port/database.
+
+        Returns:
+            str: Version token, '0' if no load was recorded yet.
+        """
+        try:
+            with open(self._version_file(scope), 'r') as f:
+                return f.read().strip() or '0'
+        except FileNotFoundError:
+            return '0'
+
+    def bump_version(self, scope):
+        """
+        Record that the data of a database changed, invalidating its entries.
+
+        Args:
+            scope (str): Identifier of the database.
+
+        Returns:
+            str: New version token.
+        """
+        version = uuid.uuid4().hex
+        self._write_atomic(self._version_file(scope), version.encode('ascii'))
+        logger.info(f"Версия данных {scope} обновлена, кэш отчетов устарел")
+        return version
+
+    def key(self, sql, scope, output_format, version):
+        """
+        Build the cache key of a report.
+
+        Args:
+            sql (str): SQL text of the report.
+            scope (str): Identifier of the database, e.g. postgres://server:port/database.
+            output_format (str): Output format of the report.
+            version (str): Data version token.
+
+        Returns:
+            str: Hex digest used as entry name.
+        """
+        digest = hashlib.sha256()
+        today = datetime.date.today().isoformat() if CURRENT_DATE_PATTERN.search(sql) else ''
+        for part in (scope, output_format, version, today, sql):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key, output_file):
+        """
+        Copy a cached report to output_file.
+
+        Args:
+            key (str): Cache key built by key().
+            output_file (str): Path to the output file.
+
+        Returns:
+            bool: True on a cache hit, False if the entry is missing or expired.
+        """
+        path = os.path.join(self._entries, key)
+        try:
+            modified = os.path.getmtime(path)
+            if self.ttl is not None and time.time() - modified > self.ttl:
+                os.remove(path)
+                return False
+            shutil.copyfile(path, output_file)
+            os.utime(path, (time.time(), modified))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def put(self, key, output_file):
+        """
+        Store a written report file and evict old entries.
+
+        Args:
+            key (str): Cache key built by key().
+            output_file (str): Path to the report file to be cached.
+        """
+        descriptor, temporary = tempfile.mkstemp(dir=self._entries, prefix='.')
+        os.close(descriptor)
+        try:
+            shutil.copyfile(output_file, temporary)
+            os.replace(temporary, os.path.join(self._entries, key))
+        except OSError:
+            self._remove(temporary)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove expired entries, then the least recently used ones above max_bytes."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for entry in os.scandir(self._entries):
+                if not entry.is_file() or entry.name.startswith('.'):
+                    continue
+                stat = entry.stat()
+                if self.ttl is not None and now - stat.st_mtime > self.ttl:
+                    self._remove(entry.path)
+                else:
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _write_atomic(self, path, data):
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.')
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
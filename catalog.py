@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+DIALECT_MARKERS = {
+    'postgres': ('postgres',),
+    'mssql': ('mssms', 'mssql', 'ms sql'),
+}
+
+
+def parse_query_file(text):
+    """
+    Split a SQLQuery*.sql file into statements per dialect.
+
+    A line starting with # opens a section; the dialects named in it
+    ("#Для postgres", "#Для MSSMS", "#Для postgres и MSSMS") get the SQL that
+    follows. A section naming no dialect, or a file without headers, applies
+    to every dialect. Trailing semicolons are removed.
+
+    Args:
+        text (str): Contents of the file.
+
+    Returns:
+        dict: SQL statement by dialect.
+    """
+    sections = []
+    dialects, lines = tuple(DIALECT_MARKERS), []
+    for line in text.splitlines():
+        if line.lstrip().startswith('#'):
+            sections.append((dialects, lines))
+            header = line.lower()
+            dialects = tuple(dialect for dialect, markers in DIALECT_MARKERS.items()
+                             if any(marker in header for marker in markers)) or tuple(DIALECT_MARKERS)
+            lines = []
+        else:
+            lines.append(line)
+    sections.append((dialects, lines))
+    statements = {}
+    for dialects, lines in sections:
+        sql = '\n'.join(lines).strip().rstrip(';').strip()
+        if sql:
+            for dialect in dialects:
+                statements.setdefault(dialect, sql)
+    return statements
+
+
+class QueryCatalog:
+    """
+    Cache of parsed report files with the statement for one backend.
+
+    A file is parsed on first use and again only when its modification time
+    changes.
+
+    Attributes:
+        dialect (str): 'postgres' or 'mssql'.
+    """
+
+    def __init__(self, dialect):
+        """
+        Initialize an empty catalog.
+
+        Args:
+            dialect (str): 'postgres' or 'mssql'.
+        """
+        if dialect not in DIALECT_MARKERS:
+            raise ValueError(f"Неизвестный диалект: {dialect}")
+        self.dialect = dialect
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """
+        Return the statement of a report file for the catalog dialect.
+
+        Args:
+            path (str): Path to the SQLQuery*.sql file.
+
+        Returns:
+            str: SQL statement.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            KeyError: If the file has no statement for the dialect.
+        """
+        modified = os.path.getmtime(path)
+        with self._lock:
+            cached = self._statements.get(path)
+            if cached and cached[0] == modified:
+                return cached[1]
+        with open(path, 'r') as f:
+            statements = parse_query_file(f.read())
+        if self.dialect not in statements:
+            raise KeyError(f"В файле {path} нет запроса для {self.dialect}")
+        with self._lock:
+            self._statements[path] = (modified, statements[self.dialect])
+        logger.info(f"Запрос {path} разобран для {self.dialect}")
+        return statements[self.dialect]
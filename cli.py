@@ -0,0 +1,195 @@
+import argparse
+import configparser
+import importlib
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = {'postgres': 'Task_1_postgres', 'mssql': 'Task_1_MSSMS'}
+LOAD_MODES = ('row', 'bulk', 'incremental', 'swap')
+
+
+def read_config(config_file, section='Task_1'):
+    """
+    Read the connection settings of a config.ini section.
+
+    Args:
+        config_file (str): Path to config.ini.
+        section (str): Section with Port, Server, Database, Username, Password and an optional Backend.
+
+    Returns:
+        configparser.SectionProxy: Settings of the section.
+
+    Raises:
+        KeyError: If the file or the section does not exist.
+    """
+    config = configparser.ConfigParser()
+    if not config.read(config_file):
+        raise KeyError(f"Файл настроек {config_file} не найден")
+    if not config.has_section(section):
+        raise KeyError(f"В файле {config_file} нет раздела {section}")
+    return config[section]
+
+
+def open_database(backend, settings, **options):
+    """
+    Import the driver module of a backend and connect to the database.
+
+    Only the module of the chosen backend is imported, so a Postgres job
+    never loads pyodbc and the other way round.
+
+    Args:
+        backend (str): 'postgres' or 'mssql'.
+        settings (configparser.SectionProxy): Connection settings, see read_config.
+        **options: pool_max_size, cache, metrics and quarantine_file passed to MyDatabase.
+
+    Returns:
+        MyDatabase: Connected database, None if the connection failed.
+    """
+    module = importlib.import_module(BACKENDS[backend])
+    db = module.MyDatabase(settings['Port'], settings['Server'], settings['Database'], settings['Username'],
+                           settings['Password'], **options)
+    if module.connected is False:
+        return None
+    return db
+
+
+def build_parser():
+    """Return the argument parser of the command line."""
+    parser = argparse.ArgumentParser(description='Load rooms and students and build reports in one run.')
+    parser.add_argument('--config', default='config.ini')
+    parser.add_argument('--section', default='Task_1', help='config.ini section with the connection settings')
+    parser.add_argument('--backend', choices=tuple(BACKENDS),
+                        help='database backend, the Backend key of the config section or postgres by default')
+    parser.add_argument('--create-tables', action='store_true', help='create the tables before loading')
+    parser.add_argument('--summary', action='store_true', help='also create the room_summary table')
+    parser.add_argument('--rooms', help='rooms JSON or NDJSON file to load')
+    parser.add_argument('--students', help='students JSON or NDJSON file to load')
+    parser.add_argument('--load-mode', choices=LOAD_MODES, default='bulk')
+    parser.add_argument('--delete-missing', action='store_true', help='incremental mode: delete rows not in the files')
+    parser.add_argument('--workers', type=int, default=1, help='load students over this many connections')
+    parser.add_argument('--shard-by', choices=('hash', 'range'), default='hash')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--quarantine', default=None, help='NDJSON file collecting the rejected input records')
+    parser.add_argument('--reports', nargs='*', default=None,
+                        help='SQL files of the reports, SQLQuery1.sql-SQLQuery4.sql by default; none to skip')
+    parser.add_argument('--formats', default='json', help='comma-separated output formats, e.g. json,xml,csv')
+    parser.add_argument('--output-dir', default=None, help='directory for the reports, next to the SQL files by default')
+    parser.add_argument('--compression', choices=('gz', 'zst'), default=None)
+    parser.add_argument('--compact', action='store_true', help='write JSON and XML without indentation')
+    parser.add_argument('--part-size', type=int, default=None, help='split reports into parts of this many bytes')
+    parser.add_argument('--max-workers', type=int, default=4, help='reports running at the same time')
+    parser.add_argument('--cache-dir', default=None, help='directory of the report result cache, disabled by default')
+    parser.add_argument('--slow-query', type=float, default=None, help='log queries slower than this many seconds')
+    parser.add_argument('--metrics-json', default=None, help='save the collected metrics as JSON')
+    parser.add_argument('--metrics-prometheus', default=None, help='save the collected metrics for Prometheus')
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'))
+    return parser
+
+
+def run_job(db, args):
+    """
+    Run the schema, load and report steps requested on the command line.
+
+    Args:
+        db (MyDatabase): Connected database.
+        args (argparse.Namespace): Parsed command line.
+
+    Returns:
+        int: 0 if every step succeeded, 1 if the load or any report failed.
+    """
+    from reports import REPORT_FILES, default_jobs
+    if args.create_tables:
+        db.create_tables(summary=args.summary)
+    if args.rooms:
+        status = db.load_data_from_json(args.rooms, args.students, bulk=args.load_mode == 'bulk',
+                                        batch_size=args.batch_size, incremental=args.load_mode == 'incremental',
+                                        delete_missing=args.delete_missing, workers=args.workers,
+                                        shard_by=args.shard_by, swap=args.load_mode == 'swap')
+        if status:
+            logger.critical("Загрузка данных завершилась с ошибкой, отчеты не строятся")
+            return 1
+    report_files = REPORT_FILES if args.reports is None else args.reports
+    jobs = []
+    for output_format in args.formats.split(','):
+        jobs.extend(default_jobs(output_format, args.compression, report_files, args.output_dir))
+    if not jobs:
+        return 0
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+    results = db.run_reports(jobs, args.max_workers, pretty=not args.compact, part_size=args.part_size)
+    return 1 if any(result.status for result in results) else 0
+
+
+def main(argv=None):
+    """
+    Parse the command line and run one job.
+
+    Drivers, lxml and the other optional dependencies are imported only
+    when the job uses them.
+
+    Args:
+        argv (list): Command line arguments, sys.argv[1:] by default.
+
+    Returns:
+        int: Exit code, 0 if the job succeeded and 1 otherwise.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if bool(args.rooms) != bool(args.students):
+        parser.error('--rooms and --students must be given together')
+    if args.workers > 1 and args.load_mode != 'bulk':
+        parser.error('--workers requires --load-mode bulk')
+    from exporters import EXPORTERS
+    unknown = [name for name in args.formats.split(',') if name not in EXPORTERS]
+    if unknown:
+        parser.error(f"unknown formats {', '.join(unknown)}, choose from {', '.join(EXPORTERS)}")
+    extensions = [EXPORTERS[name].extension for name in args.formats.split(',')]
+    if len(set(extensions)) < len(extensions):
+        parser.error(f"formats {args.formats} would write to the same files, list every extension once")
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger().setLevel(args.log_level)
+
+    try:
+        settings = read_config(args.config, args.section)
+    except KeyError as e:
+        logger.critical(e.args[0])
+        return 1
+    backend = args.backend or settings.get('Backend', 'postgres').lower()
+    if backend not in BACKENDS:
+        logger.critical(f"Неизвестная база данных в {args.config}: {backend}")
+        return 1
+
+    from metrics import Metrics
+    cache = None
+    if args.cache_dir:
+        from cache import ResultCache
+        cache = ResultCache(args.cache_dir)
+    try:
+        db = open_database(backend, settings, pool_max_size=max(5, args.workers + 1, args.max_workers + 1),
+                           cache=cache, metrics=Metrics(slow_query_seconds=args.slow_query),
+                           quarantine_file=args.quarantine)
+    except ImportError as e:
+        logger.critical(f"Драйвер для {backend} не установлен: {e}")
+        return 1
+    if db is None:
+        logger.critical("Программа завершена!")
+        return 1
+    try:
+        status = run_job(db, args)
+    except ValueError as e:
+        logger.critical(e)
+        status = 1
+    finally:
+        db.close()
+    if args.metrics_json:
+        db.metrics.write_json(args.metrics_json)
+    if args.metrics_prometheus:
+        db.metrics.write_prometheus(args.metrics_prometheus)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+import argparse
+import http.server
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import urllib.parse
+import uuid
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'legacy': 'text/plain; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'xml': 'application/xml',
+    'csv': 'text/csv',
+}
+STREAM_CHUNK = 64 * 1024
+
+
+class ReportService:
+    """
+    Warm MyDatabase serving the catalogued reports to many clients.
+
+    The pool, the parsed queries and the optional result cache stay in
+    memory between requests, so a request pays only for the query itself,
+    or for a file copy when the report is cached.
+
+    Attributes:
+        db (MyDatabase): Connected database of either backend.
+        reports (dict): Path to the SQL file by report name, e.g. 'SQLQuery1'.
+        directory (str): Directory for the rendered reports while they are sent.
+    """
+
+    def __init__(self, db, report_files, directory=None):
+        """
+        Parse every report once and prepare the working directory.
+
+        Args:
+            db (MyDatabase): Connected database.
+            report_files (iterable): Paths to the files containing SQL queries.
+            directory (str): Directory for the rendered reports, a temporary one by default.
+        """
+        self.db = db
+        self.reports = {os.path.splitext(os.path.basename(path))[0]: path for path in report_files}
+        self.directory = directory or tempfile.mkdtemp(prefix='task1_daemon_')
+        os.makedirs(self.directory, exist_ok=True)
+        for path in self.reports.values():
+            db.catalog.get(path)
+
+    def render(self, name, output_format, pretty=True):
+        """
+        Run a report into a new file of the working directory.
+
+        Args:
+            name (str): Report name, the SQL file name without extension.
+            output_format (str): Name of a registered exporter.
+            pretty (bool): Indent JSON and XML.
+
+        Returns:
+            ReportResult: Outcome of the report; the caller removes output_file.
+
+        Raises:
+            KeyError: If the report is not in the catalogue.
+            ValueError: If the format is not registered.
+        """
+        from exporters import get_exporter
+        from reports import run_report
+        input_file = self.reports[name]
+        extension = get_exporter(output_format).extension
+        output_file = os.path.join(self.directory, f'{name}-{uuid.uuid4().hex}.{extension}')
+        return run_report(self.db, input_file, output_file, output_format, pretty=pretty)
+
+    def close(self):
+        """Close the database and remove the working directory."""
+        self.db.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ReportHandler(http.server.BaseHTTPRequestHandler):
+    """
+    HTTP handler of the report daemon.
+
+    GET /health answers {"status": "ok"}, GET /reports lists the reports
+    and formats, GET /reports/<name>?format=json&pretty=0 streams a report.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        self.disable_nagle_algorithm = self.server.address_family != socket.AF_UNIX
+        super().setup()
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ['health']:
+            self.send_json(200, {'status': 'ok'})
+        elif parts == ['reports']:
+            from exporters import EXPORTERS
+            self.send_json(200, {'reports': sorted(self.server.service.reports), 'formats': list(EXPORTERS)})
+        elif len(parts) == 2 and parts[0] == 'reports':
+            name = os.path.splitext(parts[1])[0]
+            output_format = query.get('format', ['json'])[0]
+            pretty = query.get('pretty', ['1'])[0] not in ('0', 'false', 'no')
+            self.send_report(name, output_format, pretty)
+        else:
+            self.send_json(404, {'error': f'Неизвестный путь: {url.path}'})
+
+    def send_report(self, name, output_format, pretty):
+        """Run a report and stream the file in chunks."""
+        service = self.server.service
+        if name not in service.reports:
+            self.send_json(404, {'error': f'Неизвестный отчет: {name}'})
+            return
+        try:
+            result = service.render(name, output_format, pretty)
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        try:
+            if result.status:
+                self.send_json(500, {'error': result.error})
+                return
+            with open(result.output_file, 'rb') as f:
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPES.get(output_format, 'application/octet-stream'))
+                self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+                self.send_header('X-Report-Seconds', f'{result.seconds:.4f}')
+                self.end_headers()
+                shutil.copyfileobj(f, self.wfile, STREAM_CHUNK)
+        finally:
+            if os.path.exists(result.output_file):
+                os.remove(result.output_file)
+
+    def send_json(self, code, body):
+        """Send a small JSON response."""
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.info(format % args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix socket handling every connection in its own thread."""
+
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+
+def make_server(service, host='127.0.0.1', port=8080, socket_path=None):
+    """
+    Create the HTTP server of the daemon.
+
+    Args:
+        service (ReportService): Service answering the requests.
+        host (str): Address to listen on for TCP.
+        port (int): Port to listen on for TCP.
+        socket_path (str): Path of a Unix socket to listen on instead of TCP.
+
+    Returns:
+        socketserver.BaseServer: Server ready for serve_forever.
+    """
+    if socket_path:
+        server = ThreadingUnixHTTPServer(socket_path, ReportHandler)
+    else:
+        server = http.server.ThreadingHTTPServer((host, port), ReportHandler)
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    """
+    Connect once and serve reports until SIGTERM or Ctrl+C.
+
+    Args:
+        argv (list): Command line arguments, sys.argv[1:] by default.
+
+    Returns:
+        int: Exit code, 0 after a clean shutdown and 1 if the daemon could not start.
+    """
+    from cli import BACKENDS, open_database, read_config
+    parser = argparse.ArgumentParser(description='Serve reports from a warm database connection pool.')
+    parser.add_argument('--config', default='config.ini')
+    parser.add_argument('--section', default='Task_1', help='config.ini section with the connection settings')
+    parser.add_argument('--backend', choices=tuple(BACKENDS),
+                        help='database backend, the Backend key of the config section or postgres by default')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--socket', default=None, help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--reports', nargs='+', default=None, help='SQL files served, SQLQuery1.sql-SQLQuery4.sql by default')
+    parser.add_argument('--pool-size', type=int, default=8, help='maximum number of reports running at the same time')
+    parser.add_argument('--cache-dir', default=None,
+                        help='report result cache, disabled by default; use it only if every load runs '
+                             'load_data_from_json with the same cache directory')
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger().setLevel(args.log_level)
+
+    try:
+        settings = read_config(args.config, args.section)
+    except KeyError as e:
+        logger.critical(e.args[0])
+        return 1
+    backend = args.backend or settings.get('Backend', 'postgres').lower()
+    if backend not in BACKENDS:
+        logger.critical(f"Неизвестная база данных в {args.config}: {backend}")
+        return 1
+    from metrics import Metrics
+    from reports import REPORT_FILES
+    cache = None
+    if args.cache_dir:
+        from cache import ResultCache
+        cache = ResultCache(args.cache_dir)
+    try:
+        db = open_database(backend, settings, pool_min_size=min(4, args.pool_size), pool_max_size=args.pool_size + 1,
+                           cache=cache, metrics=Metrics())
+    except ImportError as e:
+        logger.critical(f"Драйвер для {backend} не установлен: {e}")
+        return 1
+    if db is None:
+        logger.critical("Программа завершена!")
+        return 1
+    try:
+        service = ReportService(db, args.reports or REPORT_FILES)
+    except (OSError, KeyError) as e:
+        logger.critical(f"Не удалось разобрать отчеты: {e}")
+        db.close()
+        return 1
+
+    server = make_server(service, args.host, args.port, args.socket)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    logger.info(f"Сервер отчетов слушает {args.socket or f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        service.close()
+    logger.info("Сервер отчетов остановлен")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
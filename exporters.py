@@ -0,0 +1,538 @@
+import collections
+import csv
+import datetime
+import decimal
+import gzip
+import io
+import itertools
+import json
+import math
+import os
+
+FETCH_SIZE = 1000
+JSON_FORMATS = ('json', 'ndjson', 'legacy')
+DECIMAL_PRECISION = 76
+DECIMAL_SCALE = 16
+SCHEMA_ROWS = 100 * FETCH_SIZE
+COMPRESSIONS = ('gz', 'zst')
+
+Exporter = collections.namedtuple('Exporter', 'name write extension')
+Exporter.__doc__ = """
+Streaming writer of one output format.
+
+Attributes:
+    name (str): Format name used as output_format.
+    write (callable): Called as write(columns, batches, output_file, input_file=None, pretty=True),
+        returns the number of rows.
+    extension (str): Extension of the output file used by default_jobs.
+"""
+
+EXPORTERS = {}
+
+
+def fetch_batches(cursor, size=FETCH_SIZE):
+    """
+    Read the result of an executed query in chunks.
+
+    Args:
+        cursor: Cursor object with an executed query.
+        size (int): Maximum number of rows per chunk.
+
+    Yields:
+        list: Next chunk of rows.
+    """
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield rows
+
+
+def open_output(output_file, binary=False, newline=None):
+    """
+    Open an output file for writing, compressed according to its extension.
+
+    Files ending in .gz are written with gzip and files ending in .zst with
+    zstandard, so the bytes are compressed on the fly.
+
+    Args:
+        output_file (str): Path to the output file.
+        binary (bool): Return a binary file instead of a UTF-8 text file.
+        newline (str): Newline mode of the text file, see open().
+
+    Returns:
+        file: File object to be used in a with statement.
+    """
+    if output_file.endswith('.gz'):
+        raw = gzip.open(output_file, 'wb', compresslevel=6)
+    elif output_file.endswith('.zst'):
+        import zstandard
+        raw = zstandard.ZstdCompressor(level=3).stream_writer(open(output_file, 'wb'), closefd=True)
+    else:
+        raw = open(output_file, 'wb')
+    if binary:
+        return raw
+    return io.TextIOWrapper(raw, encoding='utf-8', newline=newline)
+
+
+def write_xml(columns, batches, output_file, pretty=True):
+    """
+    Write query results to an XML file one record at a time.
+
+    The output is the same as etree.ElementTree.write(..., pretty_print=True)
+    of the tree built by MyDatabase.convert_result_to_xml, but only one
+    record is kept in memory. An empty result is written as <data/> like
+    the tree. Without pretty the records are written without indentation
+    and line breaks.
+
+    Args:
+        columns (list): List of column names.
+        batches (iterable): Chunks of rows from the SQL query result.
+        output_file (str): Path to the output XML file, see open_output.
+        pretty (bool): Indent the records.
+
+    Returns:
+        int: Number of written records.
+    """
+    from lxml import etree
+    count = 0
+    rows = itertools.chain.from_iterable(batches)
+    first = next(rows, None)
+    with open_output(output_file, binary=True) as file:
+        if first is None:
+            file.write(b'<data/>\n')
+            return count
+        with etree.xmlfile(file, encoding='ASCII') as xf:
+            with xf.element('data'):
+                for row in itertools.chain([first], rows):
+                    record = etree.Element('record')
+                    for column, value in zip(columns, row):
+                        if column:
+                            etree.SubElement(record, column).text = str(value)
+                    if pretty:
+                        etree.indent(record, level=1)
+                        xf.write('\n  ', record)
+                    else:
+                        xf.write(record)
+                    count += 1
+                if pretty:
+                    xf.write('\n')
+        file.write(b'\n')
+    return count
+
+
+def json_value(value):
+    """
+    Encode a single column value as JSON text.
+
+    Decimals are written as JSON numbers without rounding through float,
+    dates and times as ISO 8601 strings. NaN and infinite numbers have no
+    JSON form and are written as null.
+
+    Args:
+        value: Column value returned by the database driver.
+
+    Returns:
+        str: JSON representation of the value.
+    """
+    if isinstance(value, decimal.Decimal):
+        return str(value) if value.is_finite() else 'null'
+    if isinstance(value, float) and not math.isfinite(value):
+        return 'null'
+    if isinstance(value, (datetime.date, datetime.time)):
+        return json.dumps(value.isoformat())
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def write_json(columns, batches, output_file, ndjson=False, pretty=True):
+    """
+    Write query results to a JSON file one object at a time.
+
+    Every row becomes an object keyed by the column names. The file holds a
+    JSON array, or one object per line if ndjson is set. Without pretty the
+    separators carry no spaces and the array has no line breaks.
+
+    Args:
+        columns (list): List of column names.
+        batches (iterable): Chunks of rows from the SQL query result.
+        output_file (str): Path to the output JSON file, see open_output.
+        ndjson (bool): Write NDJSON instead of a JSON array.
+        pretty (bool): Put spaces after separators and every array item on its own line.
+
+    Returns:
+        int: Number of written objects.
+    """
+    keys = [json.dumps(column, ensure_ascii=False) + (': ' if pretty else ':') for column in columns]
+    separator = ', ' if pretty else ','
+    item_separator = ',\n' if pretty else ','
+    count = 0
+    with open_output(output_file) as f:
+        if not ndjson:
+            f.write('[')
+        for rows in batches:
+            lines = []
+            for row in rows:
+                line = '{' + separator.join(key + json_value(value) for key, value in zip(keys, row)) + '}'
+                if ndjson:
+                    lines.append(line + '\n')
+                elif pretty:
+                    lines.append((item_separator if count else '\n') + line)
+                else:
+                    lines.append((item_separator if count else '') + line)
+                count += 1
+            f.write(''.join(lines))
+        if not ndjson:
+            f.write('\n]\n' if count and pretty else ']\n')
+    return count
+
+
+def write_legacy_text(input_file, batches, output_file):
+    """
+    Write query results in the old "Result of ..." text format, one row per line.
+
+    Args:
+        input_file (str): Path to the file containing SQL queries.
+        batches (iterable): Chunks of rows from the SQL query result.
+        output_file (str): Path to the output file, see open_output.
+
+    Returns:
+        int: Number of written rows.
+    """
+    count = 0
+    with open_output(output_file) as f:
+        f.write(f"Result of {input_file}: \n")
+        for rows in batches:
+            for row in rows:
+                f.write(str(row) + '\n')
+            count += len(rows)
+    return count
+
+
+def write_csv(columns, batches, output_file):
+    """
+    Write query results to a CSV file with a header row.
+
+    Decimals keep all digits, dates and times are written in ISO 8601 and
+    NULL as an empty field.
+
+    Args:
+        columns (list): List of column names.
+        batches (iterable): Chunks of rows from the SQL query result.
+        output_file (str): Path to the output CSV file, see open_output.
+
+    Returns:
+        int: Number of written rows.
+    """
+    count = 0
+    with open_output(output_file, newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in batches:
+            writer.writerows([['' if value is None else value.isoformat()
+                               if isinstance(value, (datetime.date, datetime.time)) else value
+                               for value in row] for row in rows])
+            count += len(rows)
+    return count
+
+
+def column_array(values, kind):
+    """
+    Convert the values of one column to an Arrow array of a fixed type.
+
+    Decimals with more fractional digits than the type are rounded to its
+    scale and non-finite ones become null; values of a column typed as text
+    are written as text.
+
+    Args:
+        values (sequence): Values of the column in one chunk.
+        kind (pyarrow.DataType): Type of the column.
+
+    Returns:
+        pyarrow.Array: Converted column.
+    """
+    import pyarrow as pa
+    try:
+        return pa.array(values, type=kind)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if pa.types.is_decimal(kind):
+            exponent = decimal.Decimal(1).scaleb(-kind.scale)
+            context = decimal.Context(prec=kind.precision + kind.scale)
+            values = [decimal.Decimal(value).quantize(exponent, context=context)
+                      if value is not None and decimal.Decimal(value).is_finite() else None for value in values]
+        elif pa.types.is_string(kind):
+            values = [None if value is None else str(value) for value in values]
+        else:
+            raise
+        return pa.array(values, type=kind)
+
+
+def record_batches(columns, batches):
+    """
+    Convert chunks of rows to Arrow record batches.
+
+    Every chunk is transposed into one sequence per column and converted by
+    Arrow in bulk. The schema is inferred from the values: a column that is
+    all NULL in the first chunks gets the type of its first value, so chunks
+    are held back until every column has a value or SCHEMA_ROWS rows are
+    held, and columns still without a value are written as text. Decimal
+    columns are widened to precision DECIMAL_PRECISION with at least
+    DECIMAL_SCALE digits, so sums and averages of later chunks still fit.
+
+    Args:
+        columns (list): List of column names.
+        batches (iterable): Chunks of rows from the SQL query result.
+
+    Yields:
+        pyarrow.RecordBatch: Next chunk in columnar form.
+    """
+    import pyarrow as pa
+    schema = None
+    types = [pa.null()] * len(columns)
+    held = []
+    held_rows = 0
+    for rows in batches:
+        if not rows:
+            continue
+        values = list(zip(*rows))
+        if schema is not None:
+            yield record_batch(values, schema)
+            continue
+        types = [pa.array(column).type if pa.types.is_null(kind) else kind for column, kind in zip(values, types)]
+        held.append(values)
+        held_rows += len(rows)
+        if held_rows >= SCHEMA_ROWS or not any(pa.types.is_null(kind) for kind in types):
+            schema = record_schema(columns, types)
+            for values in held:
+                yield record_batch(values, schema)
+            held = []
+    if held:
+        schema = record_schema(columns, types)
+        for values in held:
+            yield record_batch(values, schema)
+
+
+def record_batch(values, schema):
+    """Return an Arrow record batch of transposed rows converted to a schema."""
+    import pyarrow as pa
+    return pa.RecordBatch.from_arrays([column_array(column, field.type) for column, field in zip(values, schema)],
+                                      schema=schema)
+
+
+def record_schema(columns, types):
+    """Return the Arrow schema of inferred column types, see record_batches."""
+    import pyarrow as pa
+    fields = []
+    for name, kind in zip(columns, types):
+        if pa.types.is_null(kind):
+            kind = pa.string()
+        elif pa.types.is_decimal(kind):
+            kind = pa.decimal256(DECIMAL_PRECISION, max(kind.scale, DECIMAL_SCALE))
+        fields.append(pa.field(name, kind))
+    return pa.schema(fields)
+
+
+def write_parquet(columns, batches, output_file):
+    """
+    Write query results to a Parquet file, one row group per chunk.
+
+    Args:
+        columns (list): List of column names.
+        batches (iterable): Chunks of rows from the SQL query result.
+        output_file (str): Path to the output Parquet file, see open_output.
+
+    Returns:
+        int: Number of written rows.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    count = 0
+    writer = None
+    with open_output(output_file, binary=True) as sink:
+        try:
+            for batch in record_batches(columns, batches):
+                if writer is None:
+                    writer = pq.ParquetWriter(sink, batch.schema)
+                writer.write_batch(batch)
+                count += batch.num_rows
+            if writer is None:
+                pq.write_table(pa.table({name: pa.array([], pa.null()) for name in columns}), sink)
+        finally:
+            if writer is not None:
+                writer.close()
+    return count
+
+
+def write_arrow(columns, batches, output_file):
+    """
+    Write query results to an Arrow IPC file, readable with memory mapping.
+
+    Args:
+        columns (list): List of column names.
+        batches (iterable): Chunks of rows from the SQL query result.
+        output_file (str): Path to the output Arrow file, see open_output.
+
+    Returns:
+        int: Number of written rows.
+    """
+    import pyarrow as pa
+    count = 0
+    writer = None
+    with open_output(output_file, binary=True) as sink:
+        try:
+            for batch in record_batches(columns, batches):
+                if writer is None:
+                    writer = pa.ipc.new_file(sink, batch.schema)
+                writer.write_batch(batch)
+                count += batch.num_rows
+            if writer is None:
+                writer = pa.ipc.new_file(sink, pa.schema([pa.field(name, pa.null()) for name in columns]))
+        finally:
+            if writer is not None:
+                writer.close()
+    return count
+
+
+def part_file(output_file, number):
+    """
+    Return the path of a numbered part of an output file.
+
+    Args:
+        output_file (str): Path to the output file, e.g. SQLQuery1_result.xml.gz.
+        number (int): Number of the part, starting with 1.
+
+    Returns:
+        str: Path to the part, e.g. SQLQuery1_result.part-0001.xml.gz.
+    """
+    directory, name = os.path.split(output_file)
+    stem, dot, extension = name.partition('.')
+    return os.path.join(directory, f'{stem}.part-{number:04d}{dot}{extension}')
+
+
+def manifest_file(output_file):
+    """Return the path of the manifest of a split output file, e.g. SQLQuery1_result.xml.manifest.json."""
+    directory, name = os.path.split(output_file)
+    stem, _, extension = name.partition('.')
+    return os.path.join(directory, f"{stem}.{extension.partition('.')[0] or 'out'}.manifest.json")
+
+
+def output_variant(output_format, output_file, pretty=True):
+    """
+    Describe everything besides the SQL text that changes the bytes of a report.
+
+    Used in result cache keys, so a compressed or compact report is never
+    served for a plain one.
+
+    Args:
+        output_format (str): Name of the exporter.
+        output_file (str): Path to the output file.
+        pretty (bool): Pretty or compact output.
+
+    Returns:
+        str: Format name with the compression and the compact mode.
+    """
+    compression = next((name for name in COMPRESSIONS if output_file.endswith('.' + name)), None)
+    return output_format + (':' + compression if compression else '') + ('' if pretty else ':compact')
+
+
+def export_batches(exporter, columns, batches, output_file, input_file=None, pretty=True, part_size=None):
+    """
+    Write batches with an exporter, optionally rolled into parts of about part_size bytes.
+
+    Every part is a complete file of the format, so parts can be read in
+    parallel. The size on disk is checked between batches, so a part can
+    exceed part_size by one batch plus the file and compressor buffers. The
+    manifest lists the parts with their row counts and sizes.
+
+    Args:
+        exporter (Exporter): Registered exporter.
+        columns (list): List of column names.
+        batches (iterable): Chunks of rows from the SQL query result.
+        output_file (str): Path to the output file; parts are named by part_file.
+        input_file (str): Path to the file containing SQL queries.
+        pretty (bool): Pretty or compact output for formats that have both.
+        part_size (int): Maximum size of a part in bytes, None for a single file.
+
+    Returns:
+        int: Number of written rows.
+    """
+    if part_size is None:
+        return exporter.write(columns, batches, output_file, input_file=input_file, pretty=pretty)
+    batches = iter(batches)
+    pending = next(batches, None)
+    parts = []
+    while pending is not None or not parts:
+        path = part_file(output_file, len(parts) + 1)
+
+        def part():
+            nonlocal pending
+            while pending is not None:
+                yield pending
+                pending = next(batches, None)
+                if os.path.exists(path) and os.path.getsize(path) >= part_size:
+                    return
+
+        count = exporter.write(columns, part(), path, input_file=input_file, pretty=pretty)
+        parts.append({'file': os.path.basename(path), 'rows': count, 'bytes': os.path.getsize(path)})
+    manifest = {
+        'format': exporter.name,
+        'columns': list(columns),
+        'rows': sum(entry['rows'] for entry in parts),
+        'parts': parts,
+    }
+    with open(manifest_file(output_file), 'w') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest['rows']
+
+
+def register_exporter(name, write, extension=None):
+    """
+    Register an output format, replacing an exporter of the same name.
+
+    Args:
+        name (str): Format name used as output_format.
+        write (callable): Called as write(columns, batches, output_file, input_file=None, pretty=True),
+            returns the number of rows. pretty is always passed as a keyword, so a format
+            without a compact mode still has to accept it.
+        extension (str): Extension of the output file, the name by default.
+
+    Returns:
+        Exporter: Registered exporter.
+    """
+    exporter = Exporter(name, write, extension or name)
+    EXPORTERS[name] = exporter
+    return exporter
+
+
+def get_exporter(name):
+    """
+    Return the exporter of an output format.
+
+    Args:
+        name (str): Format name.
+
+    Returns:
+        Exporter: Registered exporter.
+
+    Raises:
+        ValueError: If no exporter is registered under the name.
+    """
+    try:
+        return EXPORTERS[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный формат: {name}") from None
+
+
+register_exporter('json', lambda columns, batches, output_file, input_file=None, pretty=True:
+                  write_json(columns, batches, output_file, pretty=pretty))
+register_exporter('ndjson', lambda columns, batches, output_file, input_file=None, pretty=True:
+                  write_json(columns, batches, output_file, ndjson=True, pretty=pretty))
+register_exporter('legacy', lambda columns, batches, output_file, input_file=None, pretty=True:
+                  write_legacy_text(input_file, batches, output_file), 'txt')
+register_exporter('xml', lambda columns, batches, output_file, input_file=None, pretty=True:
+                  write_xml(columns, batches, output_file, pretty=pretty))
+register_exporter('csv', lambda columns, batches, output_file, input_file=None, pretty=True:
+                  write_csv(columns, batches, output_file))
+register_exporter('parquet', lambda columns, batches, output_file, input_file=None, pretty=True:
+                  write_parquet(columns, batches, output_file))
+register_exporter('arrow', lambda columns, batches, output_file, input_file=None, pretty=True:
+                  write_arrow(columns, batches, output_file))
@@ -0,0 +1,98 @@
+import hashlib
+
+ROOM_COLUMNS = ('id', 'name')
+STUDENT_COLUMNS = ('id', 'name', 'birthday', 'room', 'sex')
+HASH_TABLE = 'row_hashes'
+# Column of each table holding the room a row belongs to, i.e. the key of its room_summary row.
+SUMMARY_KEYS = {'rooms': 'id', 'students': 'room'}
+
+
+def room_row(room):
+    """
+    Convert a room record from rooms.json to a row tuple.
+
+    Args:
+        room (dict): Room record.
+
+    Returns:
+        tuple: Values in the order of ROOM_COLUMNS.
+    """
+    return room['id'], room['name']
+
+
+def student_row(student):
+    """
+    Convert a student record from students.json to a row tuple.
+
+    Args:
+        student (dict): Student record.
+
+    Returns:
+        tuple: Values in the order of STUDENT_COLUMNS.
+    """
+    return student['id'], student['name'], student['birthday'][:10], student['room'], student['sex']
+
+
+def row_hash(row):
+    """
+    Compute the content hash of a row.
+
+    Args:
+        row (tuple): Row values.
+
+    Returns:
+        int: Signed 64-bit hash that fits a BIGINT column.
+    """
+    digest = hashlib.blake2b(repr(row).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class RowDiff:
+    """
+    Compare incoming rows of one table with the hashes of the loaded rows.
+
+    Attributes:
+        existing (dict): Hash of every loaded row by id, None for a row without a hash;
+            ids seen in the input are removed.
+        hashes (list): (id, hash) of every new or changed row.
+    """
+
+    def __init__(self, existing):
+        """
+        Initialize the comparison.
+
+        Args:
+            existing (dict): Hash of every loaded row by id, None for a row without a hash.
+        """
+        self.existing = existing
+        self.hashes = []
+
+    def changed(self, rows):
+        """
+        Filter rows down to the new and changed ones.
+
+        Args:
+            rows (iterable): Row tuples with the id first.
+
+        Yields:
+            tuple: Next row that is not loaded yet, has no hash or differs from the loaded one.
+        """
+        for row in rows:
+            digest = row_hash(row)
+            if self.existing.pop(row[0], None) != digest:
+                self.hashes.append((row[0], digest))
+                yield row
+
+    def missing(self, keep=()):
+        """
+        Return ids that are loaded but were not in the input, hashed or not.
+
+        Only valid after changed() was consumed.
+
+        Args:
+            keep (set): Ids that must not be deleted, e.g. of records rejected by the decoder.
+
+        Returns:
+            list: Ids of rows to be deleted.
+        """
+        return [row_id for row_id in self.existing if row_id not in keep]
@@ -0,0 +1,105 @@
+import json
+
+CHUNK_SIZE = 64 * 1024
+
+
+def batched(iterable, size):
+    """
+    Split an iterable into lists of at most size items.
+
+    Args:
+        iterable (iterable): Source items.
+        size (int): Maximum number of items per batch.
+
+    Yields:
+        list: Next batch of items.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_json_records(path, chunk_size=CHUNK_SIZE):
+    """
+    Read records one at a time from a JSON file without loading it whole.
+
+    The file may hold a top-level JSON array (rooms.json, students.json) or
+    NDJSON, one value per line. Array items must be separated by exactly one
+    comma and only whitespace may follow the closing bracket. Only one chunk
+    and the record being decoded are kept in memory; a record longer than a
+    chunk grows the buffer geometrically, so it is read in linear time.
+
+    Args:
+        path (str): Path to the JSON or NDJSON file.
+        chunk_size (int): Number of characters read from the file at a time.
+
+    Yields:
+        Next decoded record.
+
+    Raises:
+        json.JSONDecodeError: If the file is not a valid JSON array or NDJSON, e.g. an array cut off before ']'.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as file:
+        buffer = ''
+        pos = 0
+        eof = False
+        in_array = None
+        # 'first' and 'value' expect a record, 'separator' follows a record, 'end' follows ']'
+        state = 'first'
+        line_break = False
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                line_break = line_break or buffer[pos] == '\n'
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    if in_array and state != 'end':
+                        raise json.JSONDecodeError("Expecting ']' before the end of the file", buffer, pos)
+                    break
+                chunk = file.read(max(chunk_size, len(buffer) - pos))
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            char = buffer[pos]
+            if in_array is None:
+                in_array = char == '['
+                if in_array:
+                    pos += 1
+                continue
+            if in_array:
+                if state == 'end':
+                    raise json.JSONDecodeError("Extra data after ']'", buffer, pos)
+                if state == 'separator' and char not in ',]':
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+                if char == ']' and state != 'value':
+                    state = 'end'
+                    pos += 1
+                    continue
+                if char == ',' and state == 'separator':
+                    state = 'value'
+                    pos += 1
+                    continue
+            elif state == 'separator' and not line_break:
+                raise json.JSONDecodeError("Expecting a line break between NDJSON records", buffer, pos)
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # only an error at the end of the buffer can be a record cut off by the chunk
+                if eof or (e.pos < len(buffer) - 16 and not e.msg.startswith('Unterminated string')):
+                    raise
+                record, end = None, None
+            if end is None or (end == len(buffer) and not eof and not isinstance(record, (dict, list))):
+                chunk = file.read(max(chunk_size, len(buffer) - pos))
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            yield record
+            pos = end
+            state = 'separator'
+            line_break = False
+            if pos >= chunk_size:
+                buffer, pos = buffer[pos:], 0
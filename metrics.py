@@ -0,0 +1,245 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from exporters import manifest_file
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('parse', 'insert', 'index', 'swap', 'commit', 'execute', 'fetch', 'serialize', 'report')
+
+
+def output_size(output_file):
+    """
+    Return the size of a report on disk.
+
+    A report split into parts has no file at output_file, so the sizes of
+    the parts are summed from its manifest.
+
+    Args:
+        output_file (str): Path to the output file.
+
+    Returns:
+        int: Number of bytes, 0 if nothing was written.
+    """
+    if os.path.exists(output_file):
+        return os.path.getsize(output_file)
+    manifest = manifest_file(output_file)
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            return sum(part['bytes'] for part in json.load(f)['parts'])
+    return 0
+
+
+class TimedIterator:
+    """
+    Iterator wrapper that measures the time spent producing items.
+
+    Attributes:
+        seconds (float): Time spent inside the wrapped iterator.
+        rows (int): Number of produced rows; a list item counts as len(item) rows.
+    """
+
+    def __init__(self, iterable):
+        """
+        Wrap an iterable.
+
+        Args:
+            iterable (iterable): Items or batches of rows.
+        """
+        self._iterator = iter(iterable)
+        self.seconds = 0.0
+        self.rows = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            item = next(self._iterator)
+        finally:
+            self.seconds += time.perf_counter() - started
+        self.rows += len(item) if isinstance(item, list) else 1
+        return item
+
+
+class Metrics:
+    """
+    Per-phase timings, row counts and bytes collected by MyDatabase.
+
+    Every measurement is passed to the registered hooks, so other sinks can
+    be plugged in without touching MyDatabase. A failing hook is logged and
+    never breaks the load or report it measures.
+
+    Attributes:
+        slow_query_seconds (float): Execution time above which a query is logged with its plan, None to disable.
+        slow_queries (list): Logged slow queries with SQL text, time and plan.
+        hooks (list): Callables called as hook(phase, target, seconds, rows, size).
+    """
+
+    def __init__(self, slow_query_seconds=None):
+        """
+        Initialize empty metrics.
+
+        Args:
+            slow_query_seconds (float): Execution time above which a query is logged with its plan.
+        """
+        self.slow_query_seconds = slow_query_seconds
+        self.slow_queries = []
+        self.hooks = []
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """
+        Register a callable that receives every measurement.
+
+        Args:
+            hook (callable): Called as hook(phase, target, seconds, rows, size).
+        """
+        self.hooks.append(hook)
+
+    def record(self, phase, target, seconds, rows=0, size=0):
+        """
+        Add a measurement.
+
+        Args:
+            phase (str): One of PHASES.
+            target (str): Table or report file the measurement belongs to.
+            seconds (float): Duration.
+            rows (int): Number of processed rows.
+            size (int): Number of processed bytes.
+        """
+        with self._lock:
+            totals = self._totals.setdefault((phase, target), [0, 0.0, 0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += rows
+            totals[3] += size
+        for hook in self.hooks:
+            try:
+                hook(phase, target, seconds, rows, size)
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике метрик {hook!r}: {e}")
+
+    @contextlib.contextmanager
+    def phase(self, phase, target):
+        """
+        Measure the duration of a with block.
+
+        Yields:
+            dict: Set 'rows' and 'size' in it to record them with the duration.
+        """
+        counters = {'rows': 0, 'size': 0}
+        started = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            self.record(phase, target, time.perf_counter() - started, counters['rows'], counters['size'])
+
+    def record_load(self, target, source, seconds, size=0):
+        """
+        Split the time of a load loop into parsing and inserting.
+
+        Args:
+            target (str): Table the rows were written to.
+            source (TimedIterator): Wrapped source of the rows or row batches.
+            seconds (float): Total time of the loop.
+            size (int): Number of bytes sent to the server, if known.
+        """
+        self.record('parse', target, source.seconds, source.rows)
+        self.record('insert', target, seconds - source.seconds, source.rows, size)
+
+    def export(self, target, write, batches, output_file, started):
+        """
+        Run a report writer and record its fetch, serialize and total report time.
+
+        Args:
+            target (str): Report file.
+            write (callable): Writer called with the batches, e.g. a partial of write_json.
+            batches (iterable): Chunks of rows from the cursor.
+            output_file (str): Path to the output file written by write, or the base path of its parts.
+            started (float): time.perf_counter() at the start of the report.
+
+        Returns:
+            Result of write.
+        """
+        fetch = TimedIterator(batches)
+        write_started = time.perf_counter()
+        result = write(fetch)
+        finished = time.perf_counter()
+        size = output_size(output_file)
+        self.record('fetch', target, fetch.seconds, fetch.rows)
+        self.record('serialize', target, finished - write_started - fetch.seconds, fetch.rows, size)
+        self.record('report', target, finished - started, fetch.rows, size)
+        return result
+
+    def is_slow(self, seconds):
+        """Return True if a query that took seconds exceeds the slow query threshold."""
+        return self.slow_query_seconds is not None and seconds > self.slow_query_seconds
+
+    def slow_query(self, target, sql, seconds, plan):
+        """
+        Log a slow query together with its execution plan.
+
+        Args:
+            target (str): Report file of the query.
+            sql (str): SQL text.
+            seconds (float): Execution time.
+            plan (str): Plan returned by EXPLAIN or SHOWPLAN, None if it could not be captured.
+        """
+        logger.warning(f"Медленный запрос {target}: {seconds:.2f} с\n{sql}\n{plan or ''}")
+        with self._lock:
+            self.slow_queries.append({'target': target, 'sql': sql, 'seconds': seconds, 'plan': plan})
+
+    def summary(self):
+        """
+        Return all measurements as a JSON-serializable dict.
+
+        Returns:
+            dict: Totals per phase and target plus the slow queries.
+        """
+        with self._lock:
+            phases = [{'phase': phase, 'target': target, 'calls': calls, 'seconds': seconds, 'rows': rows, 'bytes': size}
+                      for (phase, target), (calls, seconds, rows, size) in sorted(self._totals.items())]
+            return {'phases': phases, 'slow_queries': list(self.slow_queries)}
+
+    def write_json(self, path):
+        """
+        Save the summary as a JSON file.
+
+        Args:
+            path (str): Path to the output file.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+
+    def write_prometheus(self, path, prefix='task1'):
+        """
+        Save the totals in the Prometheus text exposition format, e.g. for the node_exporter textfile collector.
+
+        Args:
+            path (str): Path to the output file.
+            prefix (str): Prefix of the metric names.
+        """
+        def label(value):
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        phases = self.summary()['phases']
+        lines = []
+        for key, unit, description in (('seconds', 'seconds', 'Time spent'), ('rows', 'rows', 'Rows processed'),
+                                       ('bytes', 'bytes', 'Bytes processed'), ('calls', 'calls', 'Number of measurements')):
+            name = f'{prefix}_phase_{unit}_total'
+            lines.append(f'# HELP {name} {description} per phase and target.')
+            lines.append(f'# TYPE {name} counter')
+            for entry in phases:
+                lines.append(f'{name}{{phase="{label(entry["phase"])}",target="{label(entry["target"])}"}} {entry[key]}')
+        name = f'{prefix}_slow_queries_total'
+        lines.append(f'# HELP {name} Queries slower than the slow query threshold.')
+        lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name} {len(self.slow_queries)}')
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,321 @@
+import argparse
+import datetime
+import difflib
+import hashlib
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+SHOWPLAN_NS = '{http://schemas.microsoft.com/sqlserver/2004/07/showplan}'
+BASELINE_VERSION = 1
+
+# Keys of a Postgres plan node that describe its strategy; costs, row counts and timings are left out.
+POSTGRES_NODE_KEYS = ('Strategy', 'Join Type', 'Relation Name', 'Index Name', 'Sort Method')
+
+
+def postgres_shape(node, depth=0):
+    """
+    Normalize a node of EXPLAIN (FORMAT JSON) to indented lines.
+
+    Args:
+        node (dict): Plan node with its 'Plans' children.
+        depth (int): Depth of the node.
+
+    Returns:
+        list: One line per node, e.g. '  Index Only Scan students_room_idx'.
+    """
+    label = ('Parallel ' if node.get('Parallel Aware') else '') + node['Node Type']
+    details = [str(node[key]) for key in POSTGRES_NODE_KEYS if key in node]
+    lines = ['  ' * depth + ' '.join([label] + details)]
+    for child in node.get('Plans', ()):
+        lines.extend(postgres_shape(child, depth + 1))
+    return lines
+
+
+def postgres_plan(connection, sql):
+    """
+    Run a query under EXPLAIN (ANALYZE, BUFFERS) and normalize the plan.
+
+    Args:
+        connection: psycopg2 connection.
+        sql (str): SQL text of the report.
+
+    Returns:
+        dict: 'shape' lines, 'seconds' of execution, 'planning_seconds', 'shared_hit' and 'shared_read' blocks.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql)
+        document = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        connection.rollback()
+    if isinstance(document, str):
+        document = json.loads(document)
+    plan = document[0]
+    return {
+        'shape': postgres_shape(plan['Plan']),
+        'seconds': plan['Execution Time'] / 1000,
+        'planning_seconds': plan.get('Planning Time', 0) / 1000,
+        'shared_hit': plan['Plan'].get('Shared Hit Blocks', 0),
+        'shared_read': plan['Plan'].get('Shared Read Blocks', 0),
+    }
+
+
+def mssql_shape(relop, depth=0):
+    """
+    Normalize a RelOp element of a showplan to indented lines.
+
+    Args:
+        relop (lxml.etree.Element): RelOp element.
+        depth (int): Depth of the operator.
+
+    Returns:
+        list: One line per operator, e.g. 'Hash Match (Aggregate)' or '  Index Seek students.students_room_idx'.
+    """
+    physical, logical = relop.get('PhysicalOp'), relop.get('LogicalOp')
+    label = physical if physical == logical else f'{physical} ({logical})'
+    for element in relop:
+        obj = element.find(SHOWPLAN_NS + 'Object')
+        if obj is not None:
+            name = obj.get('Table', '').strip('[]')
+            if obj.get('Index'):
+                name += '.' + obj.get('Index').strip('[]')
+            label += ' ' + name
+            break
+    lines = ['  ' * depth + label]
+    for child in relop.iterdescendants(SHOWPLAN_NS + 'RelOp'):
+        if next(child.iterancestors(SHOWPLAN_NS + 'RelOp')) is relop:
+            lines.extend(mssql_shape(child, depth + 1))
+    return lines
+
+
+def mssql_plan(connection, sql):
+    """
+    Run a query under SET STATISTICS XML ON and normalize the actual plan.
+
+    Args:
+        connection: pyodbc connection.
+        sql (str): SQL text of the report.
+
+    Returns:
+        dict: 'shape' lines and 'seconds' of execution, from QueryTimeStats if the server reports them.
+    """
+    from lxml import etree
+    cursor = connection.cursor()
+    cursor.execute('SET STATISTICS XML ON')
+    try:
+        started = time.perf_counter()
+        cursor.execute(sql)
+        cursor.fetchall()
+        seconds = time.perf_counter() - started
+        showplan = None
+        while cursor.nextset():
+            row = cursor.fetchone() if cursor.description else None
+            if row and isinstance(row[0], str) and 'ShowPlanXML' in row[0]:
+                showplan = row[0]
+    finally:
+        cursor.execute('SET STATISTICS XML OFF')
+        cursor.close()
+    if showplan is None:
+        raise ValueError("Сервер не вернул план выполнения")
+    root = etree.fromstring(showplan.encode('utf-8'))
+    stats = root.find(f'.//{SHOWPLAN_NS}QueryTimeStats')
+    if stats is not None:
+        seconds = int(stats.get('ElapsedTime')) / 1000
+    return {'shape': mssql_shape(root.find(f'.//{SHOWPLAN_NS}QueryPlan/{SHOWPLAN_NS}RelOp')), 'seconds': seconds}
+
+
+CAPTURE = {'postgres': postgres_plan, 'mssql': mssql_plan}
+ANALYZE = {
+    'postgres': ('ANALYZE rooms', 'ANALYZE students'),
+    'mssql': ('UPDATE STATISTICS rooms WITH FULLSCAN', 'UPDATE STATISTICS students WITH FULLSCAN'),
+}
+
+
+def shape_hash(shape):
+    """Return a short digest of normalized plan lines."""
+    return hashlib.sha1('\n'.join(shape).encode('utf-8')).hexdigest()[:16]
+
+
+def capture(db, backend, sql, runs=3):
+    """
+    Capture the plan of a report several times and keep the median timing.
+
+    Args:
+        db (MyDatabase): Connected database.
+        backend (str): 'postgres' or 'mssql'.
+        sql (str): SQL text of the report.
+        runs (int): Number of executions; the first one also warms the cache.
+
+    Returns:
+        dict: Plan of the last run with the median 'seconds' of all runs and the 'shape_hash'.
+    """
+    timings = []
+    with db.pool.connection() as connection:
+        for _ in range(runs):
+            plan = CAPTURE[backend](connection, sql)
+            timings.append(plan['seconds'])
+    plan['seconds'] = statistics.median(timings)
+    plan['shape_hash'] = shape_hash(plan['shape'])
+    return plan
+
+
+def prepare_scale(db, backend, students, directory, seed=0):
+    """
+    Fill the database with generated data of one scale and refresh the statistics.
+
+    Args:
+        db (MyDatabase): Connected database.
+        backend (str): 'postgres' or 'mssql'.
+        students (int): Number of generated students.
+        directory (str): Directory for the generated files.
+        seed (int): Seed of the data generator.
+
+    Returns:
+        int: 0 if the data was loaded, 1 otherwise.
+    """
+    from benchmark import generate_data, reset_tables
+    rooms_file, students_file = generate_data(directory, students, seed=seed)
+    reset_tables(db)
+    db.create_tables()
+    if db.load_data_from_json(rooms_file, students_file, bulk=True):
+        return 1
+    with db.pool.connection() as connection:
+        cursor = connection.cursor()
+        for statement in ANALYZE[backend]:
+            cursor.execute(statement)
+        connection.commit()
+    return 0
+
+
+def compare(entry, baseline, threshold, min_delta):
+    """
+    Compare a captured plan with its baseline.
+
+    Args:
+        entry (dict): Captured plan, see capture.
+        baseline (dict): Stored plan of the same backend, scale and report, None if there is none.
+        threshold (float): Allowed relative slowdown, e.g. 0.5 for 50%.
+        min_delta (float): Slowdowns below this many seconds are treated as noise.
+
+    Returns:
+        list: Descriptions of the regressions, empty if there are none.
+    """
+    if baseline is None:
+        return []
+    problems = []
+    if entry['shape_hash'] != baseline['shape_hash']:
+        diff = difflib.unified_diff(baseline['shape'], entry['shape'], 'baseline', 'current', lineterm='', n=1)
+        problems.append('план изменился:\n' + '\n'.join(diff))
+    slowdown = entry['seconds'] - baseline['seconds']
+    if slowdown > min_delta and entry['seconds'] > baseline['seconds'] * (1 + threshold):
+        problems.append(f"время {entry['seconds'] * 1000:.1f} мс против {baseline['seconds'] * 1000:.1f} мс "
+                        f"в базовой линии")
+    return problems
+
+
+def load_baselines(path):
+    """Read the baseline file, an empty one if it does not exist."""
+    if not os.path.exists(path):
+        return {'version': BASELINE_VERSION, 'plans': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baselines(path, baselines):
+    """Write the baseline file so that it diffs well under version control."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    """
+    Capture the plans of all reports at every scale and check them against the baselines.
+
+    Args:
+        argv (list): Command line arguments, sys.argv[1:] by default.
+
+    Returns:
+        int: 0 if no plan regressed, 1 if any did or the data could not be loaded.
+    """
+    from cli import BACKENDS, open_database, read_config
+    from reports import REPORT_FILES
+    parser = argparse.ArgumentParser(description='Check the plans of the report queries against stored baselines.')
+    parser.add_argument('--config', default='config.ini')
+    parser.add_argument('--section', default='Task_1', help='config.ini section with the connection settings')
+    parser.add_argument('--backend', choices=tuple(BACKENDS),
+                        help='database backend, the Backend key of the config section or postgres by default')
+    parser.add_argument('--scales', default='1000,100000', help='comma-separated numbers of generated students')
+    parser.add_argument('--reports', nargs='+', default=list(REPORT_FILES))
+    parser.add_argument('--runs', type=int, default=3, help='executions per report, the median time is compared')
+    parser.add_argument('--baseline', default='plan_baselines.json')
+    parser.add_argument('--update', action='store_true', help='store the captured plans as the new baselines')
+    parser.add_argument('--threshold', type=float, default=0.5, help='allowed relative slowdown, 0.5 = 50%%')
+    parser.add_argument('--min-delta', type=float, default=0.005, help='slowdowns below this many seconds are noise')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='save the captured plans and regressions as JSON')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        settings = read_config(args.config, args.section)
+    except KeyError as e:
+        logger.critical(e.args[0])
+        return 1
+    backend = args.backend or settings.get('Backend', 'postgres').lower()
+    if backend not in BACKENDS:
+        logger.critical(f"Неизвестная база данных в {args.config}: {backend}")
+        return 1
+    try:
+        db = open_database(backend, settings)
+    except ImportError as e:
+        logger.critical(f"Драйвер для {backend} не установлен: {e}")
+        return 1
+    if db is None:
+        logger.critical("Программа завершена!")
+        return 1
+
+    baselines = load_baselines(args.baseline)
+    results, regressions = [], 0
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for scale in (int(scale) for scale in args.scales.split(',')):
+                if prepare_scale(db, backend, scale, directory, args.seed):
+                    logger.critical(f"Не удалось загрузить данные для {scale} студентов")
+                    return 1
+                for input_file in args.reports:
+                    key = f'{backend}:{scale}:{os.path.basename(input_file)}'
+                    entry = capture(db, backend, db.catalog.get(input_file), args.runs)
+                    problems = compare(entry, baselines['plans'].get(key), args.threshold, args.min_delta)
+                    if key not in baselines['plans']:
+                        logger.warning(f"{key}: нет базовой линии")
+                    for problem in problems:
+                        logger.error(f"{key}: {problem}")
+                    logger.info(f"{key}: {entry['seconds'] * 1000:.1f} мс, план {entry['shape_hash']}")
+                    regressions += bool(problems)
+                    results.append({'key': key, 'plan': entry, 'regressions': problems})
+                    if args.update:
+                        recorded = datetime.datetime.now().isoformat(timespec='seconds')
+                        baselines['plans'][key] = dict(entry, recorded=recorded)
+    finally:
+        db.close()
+    if args.update:
+        save_baselines(args.baseline, baselines)
+        logger.info(f"Базовые линии сохранены в {args.baseline}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    logger.info(f"Проверено планов: {len(results)}, с регрессиями: {regressions}")
+    return 1 if regressions and not args.update else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import contextlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes free within the checkout timeout."""
+
+
+def ping(connection):
+    """
+    Check that a connection is still usable.
+
+    Args:
+        connection: DB-API connection object.
+
+    Returns:
+        bool: True if the server answered SELECT 1.
+    """
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+        cursor.close()
+        connection.rollback()
+        return True
+    except Exception:
+        return False
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections shared by both backends.
+
+    Attributes:
+        factory (callable): Function that opens a new connection.
+        min_size (int): Number of connections opened up front and kept idle.
+        max_size (int): Maximum number of connections open at the same time.
+        timeout (float): Seconds checkout waits for a free connection.
+        check (callable): Health check called with a connection, returns bool.
+        check_interval (float): Idle seconds after which a connection is checked before reuse.
+    """
+
+    def __init__(self, factory, min_size=1, max_size=5, timeout=30, check=ping, check_interval=30):
+        """
+        Initialize the pool and open min_size connections.
+
+        Args:
+            factory (callable): Function that opens a new connection.
+            min_size (int): Number of connections opened up front and kept idle.
+            max_size (int): Maximum number of connections open at the same time.
+            timeout (float): Seconds checkout waits for a free connection.
+            check (callable): Health check called with a connection, returns bool.
+            check_interval (float): Idle seconds after which a connection is checked before reuse.
+        """
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError(f"Некорректный размер пула: min={min_size}, max={max_size}")
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check = check
+        self.check_interval = check_interval
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        self._lock = threading.Condition()
+        for _ in range(min_size):
+            self._idle.append((self.factory(), time.monotonic()))
+            self._size += 1
+
+    def checkout(self):
+        """
+        Take a connection from the pool, opening a new one if none is idle.
+
+        Connections that stayed idle longer than check_interval are health
+        checked first and replaced if the check fails.
+
+        Returns:
+            Connection object.
+
+        Raises:
+            PoolTimeoutError: If no connection became free within timeout.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Пул соединений закрыт")
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    connection, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._lock.wait(remaining):
+                    raise PoolTimeoutError(f"Нет свободных соединений за {self.timeout} с")
+        try:
+            if connection is not None and time.monotonic() - last_used > self.check_interval \
+                    and not self.check(connection):
+                logger.warning("Соединение не прошло проверку, открывается новое")
+                self._discard(connection)
+                connection = None
+            if connection is None:
+                connection = self.factory()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+        return connection
+
+    def checkin(self, connection):
+        """
+        Return a connection to the pool.
+
+        Any open transaction is rolled back. Broken connections are closed
+        instead of being kept.
+
+        Args:
+            connection: Connection object taken with checkout.
+        """
+        try:
+            connection.rollback()
+            broken = False
+        except Exception:
+            broken = True
+        with self._lock:
+            if broken or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+        if broken or self._closed:
+            self._discard(connection)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of a with block.
+
+        Yields:
+            Connection object.
+        """
+        connection = self.checkout()
+        try:
+            yield connection
+        finally:
+            self.checkin(connection)
+
+    def close(self):
+        """Close all idle connections; checked out ones are closed on checkin."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._lock.notify_all()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
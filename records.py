@@ -0,0 +1,235 @@
+import collections
+import datetime
+import json
+import logging
+
+from incremental import ROOM_COLUMNS, STUDENT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+NAME_LENGTH = 255
+LOGGED_REJECTS = 10
+
+
+class Quarantine:
+    """
+    Records rejected during one load.
+
+    Every rejected record is appended to an NDJSON file together with its
+    table and the reason, so it can be fixed and loaded again; without a
+    file only the first LOGGED_REJECTS records are logged.
+
+    Attributes:
+        path (str): NDJSON file for the rejected records, None to only count them.
+        counts (collections.Counter): Number of rejected records by table.
+        ids (dict): Ids of the rejected records by table, for records with a usable id.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize an empty quarantine; the file is opened on the first reject.
+
+        Args:
+            path (str): NDJSON file for the rejected records, None to only count them.
+        """
+        self.path = path
+        self.counts = collections.Counter()
+        self.ids = collections.defaultdict(set)
+        self._file = None
+
+    def reject(self, table, record, error):
+        """
+        Put a record into the quarantine.
+
+        Args:
+            table (str): Table the record was meant for.
+            record: Decoded JSON value of the record.
+            error (str): Reason of the rejection.
+        """
+        self.counts[table] += 1
+        record_id = record.get('id') if isinstance(record, dict) else None
+        if type(record_id) is int:
+            self.ids[table].add(record_id)
+        if self.path is not None:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps({'table': table, 'error': error, 'record': record}, ensure_ascii=False,
+                                        default=str) + '\n')
+        elif sum(self.counts.values()) <= LOGGED_REJECTS:
+            logger.warning(f"{table}: запись отклонена ({error}): {record!r:.200}")
+
+    def finish(self, table):
+        """
+        Close the file and log the number of rejected records of a table.
+
+        Args:
+            table (str): Table whose records were all decoded.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.counts[table]:
+            logger.warning(f"{table}: отклонено записей: {self.counts[table]}"
+                           + (f", сохранены в {self.path}" if self.path else ''))
+
+
+def name_error(value):
+    """Return why a value is not a valid name, None if it is."""
+    if not isinstance(value, str):
+        return f"name должно быть строкой, а не {type(value).__name__}"
+    if len(value) > NAME_LENGTH:
+        return f"name длиннее {NAME_LENGTH} символов"
+    return None
+
+
+def int_error(column, value):
+    """Return why a value does not fit an INT column, None if it does."""
+    if type(value) is not int:
+        return f"{column} должно быть целым числом, а не {type(value).__name__}"
+    if not INT_MIN <= value <= INT_MAX:
+        return f"{column} вне диапазона INT: {value}"
+    return None
+
+
+class RecordDecoder:
+    """
+    Decoder of the rooms and students records of one load.
+
+    Valid records come out as row tuples in the order of ROOM_COLUMNS and
+    STUDENT_COLUMNS whose values fit the table columns, ready to be passed
+    to the driver as parameters; the rest go to the quarantine. A student
+    must refer to a room of the same load, so the rooms are decoded first.
+    The checks run as one expression per record and the reason is only
+    worked out for rejected ones; the rows stay plain tuples, as a
+    namedtuple per row would double the cost of decoding.
+
+    Attributes:
+        quarantine (Quarantine): Rejected records.
+        room_ids (set): Ids of the valid rooms decoded so far.
+        student_ids (set): Ids of the valid students decoded so far.
+    """
+
+    def __init__(self, quarantine=None):
+        """
+        Initialize the decoder.
+
+        Args:
+            quarantine (Quarantine): Rejected records, a new one without a file by default.
+        """
+        self.quarantine = quarantine or Quarantine()
+        self.room_ids = set()
+        self.student_ids = set()
+        self._dates = {}
+
+    def rooms(self, records):
+        """
+        Decode rooms records.
+
+        The number of rejected records is logged once the records run out.
+
+        Args:
+            records (iterable): Records from rooms.json.
+
+        Yields:
+            tuple: Next valid room as (id, name).
+        """
+        room_ids = self.room_ids
+        low, high = INT_MIN, INT_MAX
+        try:
+            for record in records:
+                try:
+                    room_id, name = record['id'], record['name']
+                except (KeyError, TypeError):
+                    room_id = None
+                if (type(room_id) is int and low <= room_id <= high and room_id not in room_ids
+                        and type(name) is str and len(name) <= NAME_LENGTH):
+                    room_ids.add(room_id)
+                    yield room_id, name
+                else:
+                    self.quarantine.reject('rooms', record, self.room_error(record))
+        finally:
+            self.quarantine.finish('rooms')
+
+    def students(self, records):
+        """
+        Decode students records.
+
+        Args:
+            records (iterable): Records from students.json.
+
+        Yields:
+            tuple: Next valid student in the order of STUDENT_COLUMNS with the birthday cut to YYYY-MM-DD.
+        """
+        room_ids = self.room_ids
+        student_ids = self.student_ids
+        dates = self._dates
+        low, high = INT_MIN, INT_MAX
+        try:
+            for record in records:
+                try:
+                    student_id, name, birthday, room, sex = (record['id'], record['name'], record['birthday'][:10],
+                                                             record['room'], record['sex'])
+                except (KeyError, TypeError):
+                    student_id = None
+                if (type(student_id) is int and low <= student_id <= high and student_id not in student_ids
+                        and type(name) is str and len(name) <= NAME_LENGTH
+                        and type(birthday) is str and (dates.get(birthday) or self.valid_date(birthday))
+                        and type(room) is int and room in room_ids and type(sex) is str and len(sex) == 1):
+                    student_ids.add(student_id)
+                    yield student_id, name, birthday, room, sex
+                else:
+                    self.quarantine.reject('students', record, self.student_error(record))
+        finally:
+            self.quarantine.finish('students')
+
+    def valid_date(self, value):
+        """
+        Check that a string is a date as YYYY-MM-DD and remember the answer.
+
+        Args:
+            value: Birthday cut to 10 characters.
+
+        Returns:
+            bool: True if the value is a valid date.
+        """
+        if not isinstance(value, str) or len(value) != 10:
+            return False
+        try:
+            datetime.date.fromisoformat(value)
+        except ValueError:
+            self._dates[value] = False
+            return False
+        self._dates[value] = True
+        return True
+
+    def room_error(self, record):
+        """Return why a rooms record was rejected."""
+        if not isinstance(record, dict):
+            return f"запись должна быть объектом, а не {type(record).__name__}"
+        missing = [column for column in ROOM_COLUMNS if column not in record]
+        if missing:
+            return f"нет полей: {', '.join(missing)}"
+        error = int_error('id', record['id']) or name_error(record['name'])
+        if error:
+            return error
+        return f"повторный id {record['id']}"
+
+    def student_error(self, record):
+        """Return why a students record was rejected."""
+        if not isinstance(record, dict):
+            return f"запись должна быть объектом, а не {type(record).__name__}"
+        missing = [column for column in STUDENT_COLUMNS if column not in record]
+        if missing:
+            return f"нет полей: {', '.join(missing)}"
+        error = int_error('id', record['id']) or name_error(record['name'])
+        if error:
+            return error
+        if record['id'] in self.student_ids:
+            return f"повторный id {record['id']}"
+        birthday = record['birthday']
+        if not isinstance(birthday, str) or not self.valid_date(birthday[:10]):
+            return f"некорректная дата birthday: {birthday!r}"
+        if type(record['room']) is not int or record['room'] not in self.room_ids:
+            return f"комната {record['room']!r} не найдена среди загруженных"
+        return f"sex должно быть одним символом: {record['sex']!r}"
@@ -0,0 +1,103 @@
+import collections
+import concurrent.futures
+import logging
+import os
+import time
+from exporters import COMPRESSIONS, JSON_FORMATS, get_exporter
+
+logger = logging.getLogger(__name__)
+
+REPORT_FILES = ('SQLQuery1.sql', 'SQLQuery2.sql', 'SQLQuery3.sql', 'SQLQuery4.sql')
+
+ReportResult = collections.namedtuple('ReportResult', 'input_file output_file output_format status error seconds')
+ReportResult.__doc__ = """
+Outcome of one report job.
+
+Attributes:
+    input_file (str): Path to the file containing SQL queries.
+    output_file (str): Path to the output file.
+    output_format (str): Name of a registered exporter, e.g. 'xml', 'json' or 'csv'.
+    status (int): 0 if the report was written, 1 if it failed.
+    error (str or None): Error message for failed jobs.
+    seconds (float): Wall time of the job.
+"""
+
+
+def default_jobs(output_format, compression=None, report_files=REPORT_FILES, output_dir=None):
+    """
+    Build the job list for a report set, SQLQuery1.sql-SQLQuery4.sql by default.
+
+    Args:
+        output_format (str): Output format of every report.
+        compression (str): 'gz' or 'zst' to compress the output files, None for plain files.
+        report_files (iterable): Paths to the files containing SQL queries.
+        output_dir (str): Directory for the output files, next to the SQL files if None.
+
+    Returns:
+        list: (sql file, output path, format) tuples.
+    """
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Неизвестное сжатие: {compression}")
+    extension = get_exporter(output_format).extension + ('.' + compression if compression else '')
+    jobs = []
+    for name in report_files:
+        output_file = os.path.splitext(name)[0] + '_result.' + extension
+        if output_dir is not None:
+            output_file = os.path.join(output_dir, os.path.basename(output_file))
+        jobs.append((name, output_file, output_format))
+    return jobs
+
+
+def run_report(db, input_file, output_file, output_format, **options):
+    """
+    Run one report on a MyDatabase of either backend.
+
+    Args:
+        db (MyDatabase): Database the report is run on.
+        input_file (str): Path to the file containing SQL queries.
+        output_file (str): Path to the output file.
+        output_format (str): Name of a registered exporter, e.g. 'xml', 'json' or 'csv'.
+        **options: pretty and part_size passed to the report method.
+
+    Returns:
+        ReportResult: Outcome of the job.
+    """
+    started = time.perf_counter()
+    error = None
+    try:
+        if output_format == 'xml':
+            status = db.query_processing(input_file, output_file, **options)
+        elif output_format in JSON_FORMATS:
+            status = db.execute_sql_query_json(input_file, output_file, output_format=output_format, **options)
+        else:
+            status = db.export_query(input_file, output_file, output_format=output_format, **options)
+        if status:
+            error = f"Отчет {input_file} не создан, подробности в логе"
+    except Exception as e:
+        status, error = 1, f"{type(e).__name__}: {e}"
+    return ReportResult(input_file, output_file, output_format, status, error, time.perf_counter() - started)
+
+
+def run_reports(db, jobs, max_workers=4, **options):
+    """
+    Run independent reports concurrently, each on its own pooled connection.
+
+    Args:
+        db (MyDatabase): Database the reports are run on.
+        jobs (list): (sql file, output path, format) tuples.
+        max_workers (int): Maximum number of reports running at the same time.
+        **options: pretty and part_size passed to every report.
+
+    Returns:
+        list: ReportResult for every job, in the order of jobs.
+    """
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_report, db, *job, **options) for job in jobs]
+        results = [future.result() for future in futures]
+    failed = sum(1 for result in results if result.status)
+    logger.info(f"Отчетов: {len(results)}, с ошибками: {failed}, время: {time.perf_counter() - started:.2f} с")
+    for result in results:
+        if result.status:
+            logger.error(f"{result.input_file}: {result.error}")
+    return results
@@ -0,0 +1,141 @@
+import collections
+import concurrent.futures
+import logging
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+SHARD_METHODS = ('hash', 'range')
+GOLDEN_RATIO_64 = 0x9E3779B97F4A7C15
+
+ShardResult = collections.namedtuple('ShardResult', 'shard rows status error seconds')
+ShardResult.__doc__ = """
+Outcome of one shard of a parallel load.
+
+Attributes:
+    shard (int): Index of the shard.
+    rows (int): Number of rows committed by the shard, 0 if it failed.
+    status (int): 0 if the shard was committed, 1 if it failed and was rolled back.
+    error (str or None): Error message for failed shards.
+    seconds (float): Wall time of the shard.
+"""
+
+_ABORT = object()
+
+
+class ShardAborted(Exception):
+    """Raised in shard workers when reading the input failed."""
+
+
+def shard_function(method, workers, block_size=10000):
+    """
+    Return the function that maps a row id to its shard.
+
+    'hash' spreads ids evenly whatever their pattern (Fibonacci hashing),
+    'range' keeps blocks of block_size consecutive ids together, so every
+    shard appends to its own part of the primary key index.
+
+    Args:
+        method (str): 'hash' or 'range'.
+        workers (int): Number of shards.
+        block_size (int): Number of consecutive ids in one block for 'range'.
+
+    Returns:
+        callable: Function of an integer id returning the shard index.
+    """
+    if method == 'hash':
+        return lambda row_id: (((row_id * GOLDEN_RATIO_64) & 0xFFFFFFFFFFFFFFFF) >> 32) % workers
+    if method == 'range':
+        return lambda row_id: (row_id // block_size) % workers
+    raise ValueError(f"Неизвестный способ шардирования: {method}")
+
+
+def load_shards(rows, workers, load, method='hash', batch_size=10000, queue_depth=4):
+    """
+    Split rows into shards and load every shard in its own thread.
+
+    The calling thread parses and routes the rows; each worker receives
+    batches of its shard through a bounded queue, so parsing waits for the
+    slowest shard instead of filling memory. A failed worker keeps draining
+    its queue, so the other shards still finish.
+
+    Args:
+        rows (iterable): Row tuples with the integer id first.
+        workers (int): Number of shards and worker threads.
+        load (callable): Called in the worker thread as load(shard, batches) with an iterator
+            over lists of rows; loads them on its own connection, commits and returns the row count.
+        method (str): 'hash' or 'range' with blocks of batch_size ids, see shard_function.
+        batch_size (int): Number of rows per batch passed to a worker.
+        queue_depth (int): Maximum number of batches waiting for a worker.
+
+    Returns:
+        list: ShardResult for every shard.
+
+    Raises:
+        Exception: Error raised while reading rows; every worker is aborted first.
+    """
+    shard_of = shard_function(method, workers, batch_size)
+    queues = [queue.Queue(queue_depth) for _ in range(workers)]
+
+    def batches(shard):
+        while True:
+            batch = queues[shard].get()
+            if batch is None:
+                return
+            if batch is _ABORT:
+                raise ShardAborted("Чтение входного файла прервано")
+            yield batch
+
+    def work(shard):
+        started = time.perf_counter()
+        source = batches(shard)
+        try:
+            count = load(shard, source)
+            return ShardResult(shard, count, 0, None, time.perf_counter() - started)
+        except Exception as e:
+            return ShardResult(shard, 0, 1, f"{type(e).__name__}: {e}", time.perf_counter() - started)
+        finally:
+            try:
+                for _ in source:
+                    pass
+            except ShardAborted:
+                pass
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(work, shard) for shard in range(workers)]
+        buffers = [[] for _ in range(workers)]
+        try:
+            for row in rows:
+                shard = shard_of(row[0])
+                buffers[shard].append(row)
+                if len(buffers[shard]) >= batch_size:
+                    queues[shard].put(buffers[shard])
+                    buffers[shard] = []
+        except BaseException:
+            for shard_queue in queues:
+                shard_queue.put(_ABORT)
+            raise
+        for shard, buffer in enumerate(buffers):
+            if buffer:
+                queues[shard].put(buffer)
+            queues[shard].put(None)
+        return [future.result() for future in futures]
+
+
+def log_shards(table, results, seconds):
+    """
+    Log the outcome of a parallel load with every failed shard.
+
+    Args:
+        table (str): Loaded table.
+        results (list): ShardResult for every shard.
+        seconds (float): Wall time of the whole load.
+    """
+    rows = sum(result.rows for result in results)
+    failed = [result for result in results if result.status]
+    rate = rows / seconds if seconds > 0 else float(rows)
+    logger.info(f"{table}: {rows} строк в {len(results)} потоков за {seconds:.2f} с ({rate:.0f} строк/с), "
+                f"шардов с ошибками: {len(failed)}")
+    for result in failed:
+        logger.error(f"{table}, шард {result.shard}: {result.error}")